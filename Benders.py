@@ -0,0 +1,292 @@
+# Benders decomposition of SystemBilevelModel into capacity sizing and weekly dispatch
+# The master problem chooses the capital asset sizes, the zinc stock at the start of every week and how the annual
+# renewable minimum and zinc sales are split between weeks. Each week is then a dispatch LP with those values fixed;
+# the weeks are solved in parallel on worker processes, and the reduced costs of the fixed columns give one optimality
+# cut per week. Only one week is ever held in an LP at a time, so horizons of several years can be solved.
+#
+# The weekly subproblems are made always feasible with penalized slacks on the renewable share, zinc sales and end-of-week
+# zinc stock, so only optimality cuts are needed. Gas output (png) is not linked across weeks; its ramp limit can't bind
+# (|png[t+1] - png[t]| <= NGGenSize already holds through ngMax), so this doesn't change the optimum, and the ung of the
+# last hour of each week is set from the next week's png when the weeks are joined into one solution.
+# If solve() reaches maxIterations before the tolerance, converged is False and gap says how far off it stopped;
+# SystemModel then doesn't cache the result.
+#
+#   b = BendersBilevelModel.fromFiles('Cost_Baselines/BaselineScenario.dat', 0.5, 24*7*51)
+#   outFile = b.solve()
+#   compareWithLP('Cost_Baselines/BaselineScenario.dat', 0.2)   # against MatrixModel's single LP on 4 weeks
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+import MatrixModel
+import SweepRunner
+from MatrixModel import RowBlocks, sizeVars, hourlyVars, solveLP
+
+# values each week takes from the master: the sizes, zinc stock at the start and end, renewable energy and zinc sold,
+# and (used by the last week only) the zinc sales znProdMax still allows in the last hour, which is outside the quota
+linkVars = sizeVars + ['znStartStock', 'znEndStock', 'renewableShare', 'zincShare', 'zincHeadroom']
+
+slackVars = ['slackRenewable', 'slackZincUp', 'slackZincDown', 'slackEndUp', 'slackEndDown']
+
+# column layout of a week: the link values, one block of L columns per hourly variable, then the slacks
+def weekColumns(L):
+    col = {}
+    for k, name in enumerate(linkVars):
+        col[name] = k
+    n = len(linkVars)
+    for name in hourlyVars:
+        col[name] = np.arange(n, n + L)
+        n += L
+    for name in slackVars:
+        col[name] = n
+        n += 1
+    return col, n
+
+class WeekSubproblem:
+    def __init__(self, params, profiles, w, L, penalty, last = False):
+        self.params = params
+        self.w = w
+        self.last = last
+        self.L = L
+        hours = slice(w*L, (w+1)*L)
+        self.profiles = {name: v[hours] for name, v in profiles.items()}
+        self.colIndex, self.nCols = weekColumns(L)
+        self.build(penalty)
+
+    def build(self, penalty):
+        p, col, L = self.params, self.colIndex, self.L
+        Epv, Ew, Eload = self.profiles['Epv'], self.profiles['Ew'], self.profiles['Eload']
+        inf = np.inf
+        first, rest = slice(0, L-1), slice(1, L)
+
+        r = RowBlocks()
+        r.add('renewablePVLimits', [(col['ppv'], 1), (col['PVSize'], -Epv)], -inf, 0)
+        r.add('renewableWindLimits', [(col['pw'], 1), (col['WindSize'], -Ew)], -inf, 0)
+        r.addSum('renewableWeek', np.concatenate([col['ppv'], col['pw'], [col['slackRenewable'], col['renewableShare']]]),
+            np.concatenate([np.ones(2*L), [1, -1]]), 0, inf)
+        r.add('ngMax', [(col['png'], 1), (col['NGGenSize'], -1)], -inf, 0)
+        r.add('ngTime', [(col['png'][rest], 1), (col['png'][first], -1), (col['ung'][first], -1)], 0, 0)
+        r.add('ngRampLimit', [(col['ung'], 1), (col['NGGenSize'], -1)], -inf, 0)
+        r.add('ngThrottleLimit', [(col['ung'], 1), (col['NGGenSize'], 1)], 0, inf)
+        r.add('batMin', [(col['xbat'], 1), (col['BatSize'], -0.2)], 0, inf)
+        r.add('batMax', [(col['xbat'], 1), (col['BatSize'], -1)], -inf, 0)
+        if self.w == 0:
+            r.addSum('batStart', [col['xbat'][0], col['BatSize']], [1, -0.2], 0, 0)
+            r.addSum('znSaleStart', [col['uznsold'][0]], 1, 0, 0)
+        r.add('batPower', [(col['ubatdc'], p['Bateff']), (col['ubatc'], -1), (col['pbat'], -1)], 0, 0)
+        r.add('chargeMax', [(col['ubatc'], 1), (col['BatSize'], -0.25)], -inf, 0)
+        r.add('dischargeMax', [(col['ubatdc'], 1), (col['BatSize'], -0.25)], -inf, 0)
+        # like znProdQuota, the sales in the last hour of the horizon don't count towards the quota; only znProdMax limits them
+        sold = col['uznsold'][:L-1] if self.last else col['uznsold']
+        r.addSum('zincWeek', np.concatenate([sold, [col['slackZincUp'], col['slackZincDown'], col['zincShare']]]),
+            np.concatenate([np.ones(len(sold)), [1, -1, -1]]), 0, 0)
+        if self.last:
+            r.addSum('zincLastHour', [col['uznsold'][L-1], col['zincHeadroom']], [1, -1], -inf, 0)
+        r.addSum('znStart', [col['xzn'][0], col['znStartStock']], [1, -1], 0, 0)
+        r.add('znMax', [(col['xzn'], 1), (col['ZnStorageSize'], -1)], -inf, 0)
+        r.add('znForSale', [(col['uznsold'], 1), (col['ZnStorageSize'], -1)], -inf, 0)
+        r.add('znPower', [(col['uzndc'], p['PEMeff']), (col['uznc'], -1), (col['pzn'], -1)], 0, 0)
+        r.add('ZnChargeMax', [(col['uznc'], 1), (col['ZnSize'], -1)], -inf, 0)
+        r.add('ZnDischargeMax', [(col['uzndc'], 1), (col['FCSize'], -1/p['PEMeff'])], -inf, 0)
+        r.add('znTime', [(col['xzn'][rest], 1), (col['xzn'][first], -1), (col['uzndc'][first], 1),
+            (col['uznc'][first], -p['Zneff']), (col['uznsold'][first], 1)], 0, 0)
+        # the zinc stock left after the last hour of the week is the next week's starting stock (znTime has no row for the
+        # last hour of the horizon)
+        if not self.last:
+            r.addSum('znTimeEnd', [col['znEndStock'], col['xzn'][L-1], col['uzndc'][L-1], col['uznc'][L-1], col['uznsold'][L-1],
+                col['slackEndUp'], col['slackEndDown']], [1, -1, 1, -p['Zneff'], 1, 1, -1], 0, 0)
+        r.add('meetDemand', [(col['png'], 2), (col['ppv'], 1), (col['pw'], 1), (col['pbat'], 1), (col['pzn'], 1), (col['ploss'], 1)], Eload, Eload)
+
+        self.A, self.rowLower, self.rowUpper = r.matrix(self.nCols)
+
+        self.colLower = np.zeros(self.nCols)
+        for name in MatrixModel.freeVars:
+            self.colLower[col[name]] = -inf
+        self.colUpper = np.full(self.nCols, inf)
+
+        self.c = np.zeros(self.nCols)
+        for name, cost in MatrixModel.hourlyCosts(p, self.profiles).items():
+            self.c[col[name]] = cost
+        for name in slackVars:
+            self.c[col[name]] = penalty
+
+    # dispatch cost of the week for the given master values, and its gradient with respect to them
+    def solve(self, y, options = None):
+        k = np.arange(len(linkVars))
+        self.colLower[k] = y
+        self.colUpper[k] = y
+        res = solveLP(self.c, self.A, self.rowLower, self.rowUpper, self.colLower, self.colUpper, options)
+        return res['objective'], res['colDual'][k], res['x']
+
+# one set of weekly subproblems per worker process, built on first use and reused every iteration
+workerData = {}
+workerWeeks = {}
+
+def initWorker(params, profiles, L, W, penalty, threads):
+    workerData.update(params = params, profiles = profiles, L = L, W = W, penalty = penalty, options = {'threads': threads} if MatrixModel.highspy else {})
+
+def solveWeek(w, y, returnSolution = False):
+    if w not in workerWeeks:
+        d = workerData
+        workerWeeks[w] = WeekSubproblem(d['params'], d['profiles'], w, d['L'], d['penalty'], last = w == d['W'] - 1)
+    Q, grad, x = workerWeeks[w].solve(y, workerData['options'])
+    return w, Q, grad, (x if returnSolution else None)
+
+class BendersBilevelModel:
+    def __init__(self, params, profiles, minimumRenewableElec, T, weekLength = 168, penalty = None):
+        self.params = params
+        self.profiles = profiles
+        self.renMin = minimumRenewableElec
+        if T % weekLength:
+            raise ValueError('the Benders horizon (%d hours) must be a whole number of %d hour weeks' % (T, weekLength))
+        self.L = weekLength
+        self.W = T // weekLength
+        self.T = T
+        self.penalty = params['lostLoadCost'] if penalty is None else penalty
+
+        Eload = profiles['Eload'][:self.T]
+        self.totalElecRen = (Eload[:self.T-1].sum() + (101000000 * 4.8 * self.T/8760)) * self.renMin
+
+        # master columns: sizes, zinc stock at every week boundary, renewable and zinc shares, and the weekly cost estimates
+        W = self.W
+        col = {}
+        for k, name in enumerate(sizeVars):
+            col[name] = k
+        n = len(sizeVars)
+        for name, size in [('stock', W+1), ('renewableShare', W), ('zincShare', W), ('zincHeadroom', 1), ('theta', W)]:
+            col[name] = np.arange(n, n + size)
+            n += size
+        self.colIndex = col
+        self.nCols = n
+        self.cuts = [] # (week, Q, gradient, y)
+
+    @classmethod
+    def fromFiles(cls, scenarioFile, minimumRenewableElec, T, weekLength = 168, penalty = None):
+        return cls(MatrixModel.readScenarioParams(scenarioFile), MatrixModel.loadProfiles(T), minimumRenewableElec, T, weekLength, penalty)
+
+    # the columns of the master problem that week w's link values come from, in the order of linkVars
+    def linkColumns(self, w):
+        col = self.colIndex
+        return np.array([col[name] for name in sizeVars] + [col['stock'][w], col['stock'][w+1], col['renewableShare'][w], col['zincShare'][w], col['zincHeadroom'][0]])
+
+    def solveMaster(self, thetaLower):
+        col, W, L, T = self.colIndex, self.W, self.L, self.T
+        inf = np.inf
+        weeks = np.arange(W)
+        Epv = self.profiles['Epv'][:T].reshape(W, L).sum(axis = 1)
+        Ew = self.profiles['Ew'][:T].reshape(W, L).sum(axis = 1)
+
+        r = RowBlocks()
+        r.addSum('renewableMinimum', col['renewableShare'], 1, self.totalElecRen, inf)
+        r.addSum('znProdQuota', col['zincShare'], 1, 101000000*T/8760, inf)
+        r.addSum('znProdMax', np.concatenate([col['zincShare'], col['zincHeadroom']]), 1, -inf, 200000000*T/8760)
+        r.add('znMax', [(col['stock'], 1), (col['ZnStorageSize'], -1)], -inf, 0)
+        # a week can't be given more renewable energy than its wind and solar can make, or more zinc sales than znForSale allows
+        r.add('renewableAvailable', [(col['renewableShare'], 1), (col['PVSize'], -Epv), (col['WindSize'], -Ew)], -inf, 0)
+        r.add('zincAvailable', [(col['zincShare'], 1), (col['ZnStorageSize'], -L)], -inf, 0)
+        for w, Q, grad, y in self.cuts:
+            # theta_w >= Q + grad (y_w - y)
+            r.addSum('cut', np.concatenate([[col['theta'][w]], self.linkColumns(w)]), np.concatenate([[1], -grad]), Q - grad @ y, inf)
+        A, rowLower, rowUpper = r.matrix(self.nCols)
+
+        colLower = np.zeros(self.nCols)
+        colLower[col['theta']] = thetaLower
+        colUpper = np.full(self.nCols, inf)
+        colUpper[col['stock'][0]] = 0 # zinc stored starts at zero
+
+        c = np.zeros(self.nCols)
+        c[:len(sizeVars)] = MatrixModel.firstStageCosts(self.params)
+        c[col['theta']] = 1
+        if not MatrixModel.highspy:
+            res = solveLP(c, A, rowLower, rowUpper, colLower, colUpper)
+            return res['x'], res['objective']
+        # cuts from the first, far-off iterates have coefficients from 1e-5 to 1e7 and right hand sides near 1e13; with
+        # its default scaling HiGHS's simplex then often reports this bounded LP as unbounded or ends with status Unknown
+        for options in [{'simplex_scale_strategy': 4}, {'solver': 'ipm', 'presolve': 'off'}]:
+            res = solveLP(c, A, rowLower, rowUpper, colLower, colUpper, options)
+            if res['status'] == 'Optimal':
+                break
+        else:
+            raise RuntimeError('Benders master problem: ' + res['status'])
+        return res['x'], res['objective']
+
+    # alternate between the master and the weekly subproblems until the bounds are within `tolerance` of each other;
+    # self.converged is False if maxIterations ran out first, and the solution is then only the best one found
+    def solve(self, workers = None, threads = 1, maxIterations = 100, tolerance = 1e-4, thetaLower = -1e9):
+        workers = workers or max(1, min(self.W, (os.cpu_count() or 1) // threads))
+        self.history = []
+        best = None
+        start = time.time()
+        with SweepRunner.limitThreads(threads) as ctx, ProcessPoolExecutor(max_workers = workers, mp_context = ctx, initializer = initWorker,
+                initargs = (self.params, self.profiles, self.L, self.W, self.penalty, threads)) as pool:
+            for it in range(maxIterations):
+                z, lower = self.solveMaster(thetaLower)
+                ys = [z[self.linkColumns(w)] for w in range(self.W)]
+                results = list(pool.map(solveWeek, range(self.W), ys))
+                firstStage = MatrixModel.firstStageCosts(self.params) @ z[:len(sizeVars)]
+                upper = firstStage + sum(Q for w, Q, grad, x in results)
+                if best is None or upper < best[0]:
+                    best = (upper, z)
+                for (w, Q, grad, x), y in zip(results, ys):
+                    self.cuts.append((w, Q, grad, y))
+                gap = (best[0] - lower)/max(1, abs(best[0]))
+                self.history.append({'iteration': it, 'lower': lower, 'upper': best[0], 'gap': gap, 'seconds': time.time() - start})
+                print('iteration %d: lower %.6g, upper %.6g, gap %.2e' % (it, lower, best[0], gap))
+                if gap <= tolerance:
+                    break
+            self.gap = gap
+            self.converged = gap <= tolerance
+            if not self.converged:
+                print('Benders did not converge: gap %.2e after %d iterations (tolerance %.0e)' % (gap, maxIterations, tolerance))
+
+            # dispatch of every week at the best sizes found
+            self.z = best[1]
+            self.objectiveValue = best[0]
+            ys = [self.z[self.linkColumns(w)] for w in range(self.W)]
+            self.weekResults = list(pool.map(solveWeek, range(self.W), ys, [True]*self.W))
+        return self.toSolutionDict()
+
+    # sizes and the hourly dispatch of all weeks, in the same form SystemModel saves
+    def toSolutionDict(self):
+        outFile = {}
+        for k, name in enumerate(sizeVars):
+            outFile[name] = [float(self.z[k])]
+        weekCols = weekColumns(self.L)[0]
+        for name in hourlyVars:
+            outFile[name] = np.concatenate([x[weekCols[name]] for w, Q, grad, x in sorted(self.weekResults, key = lambda r: r[0])]).tolist()
+        # each week leaves ung free in its last hour; ngTime of the full model sets it from the next week's first hour
+        for t in range(self.L - 1, self.T - 1, self.L):
+            outFile['ung'][t] = outFile['png'][t+1] - outFile['png'][t]
+        return outFile
+
+# solve the same horizon with Benders and as one LP: the objectives must agree, and the Benders solution must satisfy
+# every row of the full LP
+def compareWithLP(scenarioFile, minimumRenewableElec, T = 24*7*4, tol = 1e-4, **solveOptions):
+    m = MatrixModel.MatrixBilevelModel.fromFiles(scenarioFile, minimumRenewableElec, T)
+    m.solve()
+    b = BendersBilevelModel.fromFiles(scenarioFile, minimumRenewableElec, T)
+    outFile = b.solve(tolerance = tol/10, **solveOptions)
+
+    x = np.zeros(m.nCols)
+    for name in sizeVars + hourlyVars:
+        x[m.colIndex[name]] = outFile[name] if name in hourlyVars else outFile[name][0]
+    Ax = m.A @ x
+    scale = np.maximum(1, np.abs(np.where(np.isfinite(m.rowLower), m.rowLower, m.rowUpper)))
+    violation = np.maximum(m.rowLower - Ax, Ax - m.rowUpper) / scale
+    violation = np.maximum(violation, 0)
+    ok = b.converged
+    for name, start, n in m.rowBlocks:
+        worst = violation[start:start+n].max() if n else 0
+        if worst > 1e-6:
+            print('Benders solution violates', name, 'by', worst)
+            ok = False
+    objective = m.c @ x
+    print('Objective: LP', m.objectiveValue, 'Benders', b.objectiveValue, 'Benders solution in the LP', objective)
+    ok = ok and abs(objective - m.objectiveValue) <= tol * abs(m.objectiveValue) and abs(b.objectiveValue - m.objectiveValue) <= tol * abs(m.objectiveValue)
+    print('Benders matches the LP:', ok)
+    return ok
+
+if __name__ == '__main__':
+    compareWithLP('Cost_Baselines/BaselineScenario.dat', 0.2)
+    compareWithLP('Cost_Baselines/BaselineScenario.dat', 0.5)
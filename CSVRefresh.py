@@ -0,0 +1,146 @@
+# Incremental refresh of the csv files HourlyDemand.py and HourlyPrice.py write from EIA data
+# Instead of downloading the whole history and rewriting every file, the last timestamp already stored in each hourly
+# file is read from its final line, only newer observations are requested from the api (its start parameter), and the
+# new rows are appended. Monthly gas prices are upsampled to hours only from the last stored hour on, so a nightly
+# refresh costs time in proportion to the new data. The monthly files are newest first, like the api, so their few new
+# rows go on top and those small files are rewritten.
+# The model reads one calendar year from the *2018.csv files (ProfileStore.csvFiles), so the hourly series are not
+# extended in place: each has a *History.csv file that starts as a copy of its 2018 file, and new hours are appended there.
+#
+#   python CSVRefresh.py                                   # token from EIA_KEY
+#   EIA_BASE_URL=http://127.0.0.1:8765 python CSVRefresh.py  # against EIAStandIn.py
+import os
+import shutil
+import argparse
+import pandas as pd
+
+from EIAClient import EIAClient
+
+hourlyFormat = '%Y%m%dT%HZ' # dates of the hourly series
+monthlyFormat = '%Y%m' # dates of the monthly series
+
+demandFiles = {
+    'EBA.TEX-ALL.D.H': 'CSV_Files/HourlyTxDemandHistory.csv',
+}
+scenDemandFile = 'CSV_Files/HourlyTxScenDemandHistory-Notional.csv' # notional ERCOT SCEN demand, scaled from all of Texas
+monthlyFiles = {
+    'NG.N3045TX3.M': 'CSV_Files/MonthlyNatGasPrices.csv',
+    'ELEC.PRICE.TX-ALL.M': 'CSV_Files/MonthlyElectricityPrices.csv',
+}
+hourlyGasFile = 'CSV_Files/HourlyNatGasPricesHistory.csv' # no header: hour, price
+
+# the 2018 file each hourly history file starts from
+historySeeds = {
+    'CSV_Files/HourlyTxDemandHistory.csv': 'CSV_Files/HourlyTxDemand2018.csv',
+    'CSV_Files/HourlyTxScenDemandHistory-Notional.csv': 'CSV_Files/HourlyTxScenDemand2018-Notional.csv',
+    'CSV_Files/HourlyNatGasPricesHistory.csv': 'CSV_Files/HourlyNatGasPrices2018.csv',
+}
+
+# a history file, copied from its 2018 file the first time it is refreshed
+def historyFile(fileName):
+    if not os.path.exists(fileName):
+        shutil.copyfile(historySeeds[fileName], fileName)
+    return fileName
+
+# the last line of a file, read from its end
+def lastLine(fileName, block = 4096):
+    with open(fileName, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        while True:
+            block = min(block, size)
+            f.seek(size - block)
+            lines = f.read(block).rstrip(b'\r\n').splitlines()
+            if len(lines) > 1 or block == size:
+                return lines[-1].decode() if lines else ''
+            block *= 2
+
+# the timestamp in the first column of the last row of a csv file
+def lastTimestamp(fileName):
+    return pd.Timestamp(lastLine(fileName).split(',')[0])
+
+# append rows to a csv file without its header, starting on a new line
+def appendRows(fileName, df, index = True):
+    with open(fileName, 'rb+') as f:
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+    df.to_csv(fileName, mode = 'a', header = False, index = index)
+
+# observations of a series from start on, oldest first, indexed by DateTime
+def newObservations(client, seriesId, start, dateFormat):
+    df = client.frame([seriesId], start.strftime(dateFormat))
+    df['DateTime'] = pd.to_datetime(df.Date, format = dateFormat)
+    return df.set_index('DateTime').sort_index()
+
+# append the hours after the last stored one to the demand history of Texas and, scaled by the ratio already used for
+# the stored hours, to the notional ERCOT SCEN history
+def refreshDemand(client, seriesId = 'EBA.TEX-ALL.D.H', end = None):
+    fileName = historyFile(demandFiles[seriesId])
+    historyFile(scenDemandFile)
+    last = lastTimestamp(fileName)
+    new = newObservations(client, seriesId, last, hourlyFormat).rename(columns = {seriesId: 'demand'})
+    new = new[new.index > last]
+    if end is not None:
+        new = new[new.index <= pd.Timestamp(end)]
+    if len(new) == 0:
+        return 0
+    appendRows(fileName, new[['Date', 'demand']])
+
+    stored = pd.read_csv(fileName, nrows = 1).demand[0]
+    ratio = pd.read_csv(scenDemandFile, nrows = 1).demand[0] / stored
+    scen = new[['Date', 'demand']].copy()
+    scen['demand'] *= ratio
+    appendRows(scenDemandFile, scen)
+    return len(new)
+
+# put the months after the newest stored one on top of a monthly price file
+def refreshMonthly(client, seriesId, end = None):
+    fileName = monthlyFiles[seriesId]
+    stored = pd.read_csv(fileName, parse_dates = ['DateTime'], index_col = 'DateTime', dtype = {'Date': str})
+    last = stored.index.max()
+    new = newObservations(client, seriesId, last, monthlyFormat).rename(columns = {seriesId: 'price'})
+    new = new[new.index > last]
+    if end is not None:
+        new = new[new.index <= pd.Timestamp(end)]
+    if len(new) > 0:
+        pd.concat([new[['Date', 'price']].iloc[::-1], stored]).to_csv(fileName)
+    return len(new)
+
+# extend the hourly gas prices from the last stored hour to the newest month, forward filling each month's price the
+# way HourlyPrice.py upsamples the whole year
+def refreshHourlyGas(end = None):
+    historyFile(hourlyGasFile)
+    last = lastTimestamp(hourlyGasFile)
+    lastPrice = float(lastLine(hourlyGasFile).split(',')[1])
+    monthly = pd.read_csv(monthlyFiles['NG.N3045TX3.M'], parse_dates = ['DateTime'], index_col = 'DateTime').price.sort_index()
+    new = monthly[monthly.index > last]
+    if end is not None:
+        new = new[new.index <= pd.Timestamp(end)]
+    if len(new) == 0:
+        return 0
+    upsampled = pd.concat([pd.Series([lastPrice], index = [last]), new]).resample('h').ffill().iloc[1:]
+    upsampled.index.name = 'DateTime'
+    appendRows(hourlyGasFile, upsampled)
+    return len(upsampled)
+
+# refresh every file; returns the number of rows added to each
+def refreshAll(token, end = None, **clientOptions):
+    client = EIAClient(token, **clientOptions)
+    added = {}
+    for seriesId in demandFiles:
+        added[demandFiles[seriesId]] = added[scenDemandFile] = refreshDemand(client, seriesId, end)
+    for seriesId in monthlyFiles:
+        added[monthlyFiles[seriesId]] = refreshMonthly(client, seriesId, end)
+    added[hourlyGasFile] = refreshHourlyGas(end)
+    for fileName, n in added.items():
+        print('%s: %d new rows' % (fileName, n))
+    return added
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Append new EIA observations to the demand and price history csv files')
+    parser.add_argument('--token', default = os.environ.get('EIA_KEY'), help = 'EIA api key (default: $EIA_KEY)')
+    parser.add_argument('--end', default = None, help = 'ignore observations after this date')
+    parser.add_argument('--ttl', type = float, default = 0, help = 'seconds to reuse cached api responses (default: always ask the api)')
+    args = parser.parse_args()
+    refreshAll(args.token, args.end, ttl = args.ttl)
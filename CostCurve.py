@@ -0,0 +1,154 @@
+# Total cost and capacity mix as functions of the renewable minimum, traced with as few solves as possible
+# renMin only scales the right hand side of the renewableMinimum row, so the minimum cost is a convex, piecewise linear
+# function of renMin, and the sizes are linear in renMin between its breakpoints. Every solve gives the cost and its
+# slope (the dual of renewableMinimum times the renewable energy per unit of renMin), i.e. a tangent line. Between two
+# solved points the cost lies under their chord and above both tangents, so the next solve goes where the tangents
+# meet, in the interval where that gap (or, with mixTol, the change in the asset sizes) is largest; a solve that lands on both
+# tangents is an exact breakpoint. The hourly model has many small breakpoints, so refinement stops at a tolerance
+# rather than at every one. The LP is held in one HiGHS model and only the bound of that row changes, so each solve
+# starts from the previous optimal basis.
+#
+#   curve = CostCurve('Cost_Baselines/BaselineScenario.dat', 24*7*51)
+#   curve.trace(0.2, 0.99)                         # points between 20% and 99% renewable
+#   curve.evaluate([0.2, 0.5, 0.7, 0.8, 0.9, 0.95, 0.99])
+import time
+import json
+import numpy as np
+
+import MatrixModel
+from MatrixModel import sizeVars
+
+class CostCurve:
+    def __init__(self, scenarioFile, T, startHour = 0, timeStep = 1, threads = 1):
+        # built at renMin = 1, so the row's lower bound at any renMin is renMin times this one
+        self.m = m = MatrixModel.MatrixBilevelModel.fromFiles(scenarioFile, 1.0, T, startHour, timeStep)
+        self.row = next(start for name, start, n in m.rowBlocks if name == 'renewableMinimum')
+        self.energy = m.rowLower[self.row] # renewable energy required per unit of renMin
+        self.h = MatrixModel.highsModel(m.c, m.A, m.rowLower, m.rowUpper, m.colLower, m.colUpper, {'threads': threads})
+        self.points = {}
+        self.solves = 0
+
+    # solve at one renewable minimum, from the basis of the previous solve
+    def solveAt(self, renMin):
+        if renMin in self.points:
+            return self.points[renMin]
+        start = time.perf_counter()
+        self.h.changeRowBounds(self.row, renMin * self.energy, np.inf)
+        self.h.run()
+        sol, info = self.h.getSolution(), self.h.getInfo()
+        x = np.array(sol.col_value)
+        point = {'renMin': renMin, 'objective': info.objective_function_value,
+            'slope': sol.row_dual[self.row] * self.energy, # d objective / d renMin
+            'sizes': {name: float(x[self.m.colIndex[name]]) for name in sizeVars},
+            'status': self.h.modelStatusToString(self.h.getModelStatus()),
+            'iterations': info.simplex_iteration_count, 'seconds': time.perf_counter() - start}
+        self.solves += 1
+        self.points[renMin] = point
+        print('renMin %.4f: cost %.8g, slope %.6g, %d simplex iterations' % (renMin, point['objective'], point['slope'], point['iterations']))
+        return point
+
+    # refine [low, high] until the cost is known within tol (relative) everywhere, and, when mixTol is given, no asset
+    # size changes by more than mixTol (relative to its larger value) between neighbouring points; the interval with the
+    # largest error goes first. Between two solved points the cost lies under their chord and above both tangents, so
+    # the largest error of the chord is its gap over the tangents where they meet, and that is where the next solve goes.
+    # Intervals narrower than minWidth are not split. maxSolves defaults to 40 per unit of renMin (at least 10); if it
+    # runs out first, converged is False and the intervals still over the tolerances are printed.
+    def trace(self, low = 0.2, high = 0.99, tol = 1e-3, mixTol = None, minWidth = 1e-3, maxSolves = None):
+        if maxSolves is None:
+            maxSolves = max(10, int(np.ceil(40 * (high - low))))
+        solvesBefore = self.solves
+        self.solveAt(low)
+        self.solveAt(high)
+        self.breakpoints = [] # where two linear pieces were found to meet exactly
+        pending = [self.interval(self.points[low], self.points[high], tol, mixTol, minWidth)]
+        unresolved = [] # intervals over the tolerances but narrower than minWidth
+        while pending and self.solves - solvesBefore < maxSolves:
+            k = max(range(len(pending)), key = lambda i: pending[i]['priority'])
+            item = pending.pop(k)
+            if item['priority'] <= 1:
+                break
+            if item['b']['renMin'] - item['a']['renMin'] <= minWidth:
+                unresolved.append(item)
+                continue
+            c = self.solveAt(item['r'])
+            if item['exact'] and c['objective'] <= item['tangent'] + 1e-9 * abs(c['objective']):
+                self.breakpoints.append(item['r'])
+            if item['a']['renMin'] < c['renMin'] < item['b']['renMin']:
+                pending += [self.interval(item['a'], c, tol, mixTol, minWidth), self.interval(c, item['b'], tol, mixTol, minWidth)]
+        self.breakpoints.sort()
+        remaining = sorted(unresolved + [item for item in pending if item['priority'] > 1], key = lambda item: item['a']['renMin'])
+        self.converged = not remaining
+        if remaining:
+            print('Warning: the cost curve is not within tolerance after %d solves (maxSolves %d) in:' % (self.solves - solvesBefore, maxSolves))
+            for item in remaining:
+                print('  [%.4f, %.4f]: %.1f times the tolerance' % (item['a']['renMin'], item['b']['renMin'], item['priority']))
+        return sorted(self.points)
+
+    # the next point to solve between solved points a and b, and how far the interval is from the tolerances; the point
+    # is kept at least minWidth / 2 inside the interval, so no solve lands next to one already made
+    def interval(self, a, b, tol, mixTol, minWidth):
+        width = b['renMin'] - a['renMin']
+        chordSlope = (b['objective'] - a['objective']) / width
+        margin = min(max(0.01 * width, minWidth / 2), width / 2)
+        if b['slope'] - a['slope'] > 1e-12 * max(1.0, abs(chordSlope)):
+            # where the tangents at a and b meet
+            r = (b['objective'] - a['objective'] + a['slope'] * a['renMin'] - b['slope'] * b['renMin']) / (a['slope'] - b['slope'])
+            r = min(max(r, a['renMin'] + margin), b['renMin'] - margin)
+        else:
+            r = a['renMin'] + width / 2
+        tangent = max(a['objective'] + a['slope'] * (r - a['renMin']), b['objective'] + b['slope'] * (r - b['renMin']))
+        gap = max(0.0, a['objective'] + chordSlope * (r - a['renMin']) - tangent)
+        priority = gap / (tol * max(1.0, abs(a['objective'])))
+        if mixTol:
+            mixChange = max(abs(b['sizes'][n] - a['sizes'][n]) / max(abs(a['sizes'][n]), abs(b['sizes'][n]), 1.0) for n in sizeVars)
+            priority = max(priority, mixChange / mixTol)
+        return {'a': a, 'b': b, 'r': r, 'tangent': tangent, 'exact': gap > 0, 'priority': priority}
+
+    # cost and sizes at any renMin: solved points are exact, other points inside the traced range are interpolated
+    # along the chord (within the trace tolerance; lowerBound is the supporting tangents), points outside it are solved
+    def evaluate(self, renMins):
+        rows = []
+        solved = sorted(self.points)
+        for r in renMins:
+            if r in self.points or r < solved[0] or r > solved[-1]:
+                p = self.solveAt(r)
+                rows.append({'renMin': r, 'objective': p['objective'], 'lowerBound': p['objective'], 'sizes': p['sizes'], 'solved': True})
+                continue
+            k = np.searchsorted(solved, r)
+            a, b = self.points[solved[k-1]], self.points[solved[k]]
+            w = (r - a['renMin']) / (b['renMin'] - a['renMin'])
+            objective = float((1 - w) * a['objective'] + w * b['objective'])
+            lowerBound = float(max(a['objective'] + a['slope'] * (r - a['renMin']), b['objective'] + b['slope'] * (r - b['renMin'])))
+            sizes = {name: float((1 - w) * a['sizes'][name] + w * b['sizes'][name]) for name in sizeVars}
+            rows.append({'renMin': r, 'objective': objective, 'lowerBound': lowerBound, 'sizes': sizes, 'solved': False})
+        return rows
+
+    def save(self, fileName):
+        with open(fileName, 'w') as fp:
+            json.dump({'breakpoints': self.breakpoints, 'solves': self.solves,
+                'points': [self.points[r] for r in sorted(self.points)]}, fp, indent = 1)
+
+# trace the curve, then check it against cold solves at the penetration study's fixed points
+def compareWithFixedPoints(scenarioFile, T = 24*7*4, renMins = [0.2, 0.5, 0.7, 0.8, 0.9, 0.95, 0.99]):
+    start = time.perf_counter()
+    curve = CostCurve(scenarioFile, T)
+    curve.trace(min(renMins), max(renMins))
+    curveSeconds = time.perf_counter() - start
+    estimates = curve.evaluate(renMins)
+
+    start = time.perf_counter()
+    worst = 0.0
+    for r, e in zip(renMins, estimates):
+        m = MatrixModel.MatrixBilevelModel.fromFiles(scenarioFile, r, T)
+        cold = MatrixModel.solveLP(m.c, m.A, m.rowLower, m.rowUpper, m.colLower, m.colUpper)
+        worst = max(worst, abs(cold['objective'] - e['objective']) / abs(cold['objective']))
+        assert e['lowerBound'] <= cold['objective'] * (1 + 1e-7) <= e['objective'] * (1 + 2e-7)
+    coldSeconds = time.perf_counter() - start
+    print('solved at:', ', '.join('%.4f' % r for r in sorted(curve.points)))
+    print('curve within tolerance:', curve.converged)
+    print('%d warm-started solves in %.1f s for the whole curve; %d cold solves in %.1f s for the fixed points' % (curve.solves, curveSeconds, len(renMins), coldSeconds))
+    print('largest relative cost difference at the fixed points: %.1e' % worst)
+    return curve
+
+if __name__ == '__main__':
+    compareWithFixedPoints('Cost_Baselines/BaselineScenario.dat')
@@ -0,0 +1,248 @@
+# Rule-based hourly dispatch of many capacity mixes at once, for screening them before the LP
+# Every hour, for all candidates together (one array entry per candidate):
+# - solar and wind go first; what the load (plus zinc production) can't use is curtailed
+# - a surplus charges the battery, a deficit discharges it, within C/4 (chargeMax, dischargeMax) and 20%-100% of BatSize
+# - zinc is produced and sold in regular business hours only (ZnOT = 0; overtime costs more than anything but lost load),
+#   at the rate that meets the zinc quota by the end of the horizon, faster when there is surplus renewable power
+# - gas covers what is left, then the fuel cell from the zinc in storage, then lost load
+# The flows follow the LP's constraints (meetDemand counts png twice, as in SystemModel, and the battery state follows
+# the batTime rule SystemModel skips), so the dispatch of a candidate is a feasible point of the LP when it meets the
+# renewable minimum and the zinc quota, and costs are those of the LP objective. That makes the cost of a feasible
+# candidate an upper bound on the LP optimum, and its dispatch a starting solution for HiGHS.
+#
+#   sim = DispatchSimulator('Cost_Baselines/BaselineScenario.dat', 0.5, 24*7*51)
+#   table = sim.screen(sim.sampleSizes(4096))    # one row per candidate: sizes, costs, shortfalls
+#   sizes = sim.refine(sim.best(table))          # pattern search from the cheapest feasible one
+#   x = sim.warmStart(sizes)                     # a full column vector of MatrixBilevelModel
+import time
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+
+import MatrixModel
+from MatrixModel import sizeVars
+
+# default sampling range of each size for screen(); ZnStorageSize in kg, the others in kW
+defaultBounds = {
+    'NGGenSize': (0, 8e6),
+    'PVSize': (0, 4e7),
+    'BatSize': (0, 4e6),
+    'WindSize': (0, 4e7),
+    'ZnSize': (5e4, 5e5),
+    'ZnStorageSize': (0, 5e7),
+    'FCSize': (0, 1e6),
+}
+
+class DispatchSimulator:
+    def __init__(self, scenarioFile, minimumRenewableElec, T, startHour = 0, timeStep = 1, params = None):
+        self.params = p = params or MatrixModel.readScenarioParams(scenarioFile)
+        self.profiles = MatrixModel.loadProfiles(T, startHour, timeStep)
+        self.T, self.dt = T, timeStep
+        hours = T * timeStep
+        Eload = self.profiles['Eload']
+        self.renewableTarget = (timeStep * Eload[:T-1].sum() + 101000000 * 4.8 * hours/8760) * minimumRenewableElec
+        self.zincQuota = 101000000 * hours/8760 # kg sold in the first T-1 periods (znProdQuota)
+        self.regular = self.profiles['ZnOT'] == 0
+        self.capitalCosts = MatrixModel.firstStageCosts(p)
+        # hourly cost coefficients as arrays of T, times the period length like MatrixBilevelModel.objective
+        self.costs = {name: np.broadcast_to(timeStep * np.asarray(c, dtype = float), (T,)).copy()
+            for name, c in MatrixModel.hourlyCosts(p, self.profiles).items()}
+
+    # n candidates (n x sizeVars), Latin hypercube samples over bounds (defaultBounds for the sizes not given)
+    def sampleSizes(self, n, bounds = None, seed = 0):
+        bounds = dict(defaultBounds, **(bounds or {}))
+        low = np.array([bounds[name][0] for name in sizeVars])
+        high = np.array([bounds[name][1] for name in sizeVars])
+        return low + qmc.LatinHypercube(len(sizeVars), seed = seed).random(n) * (high - low)
+
+    # dispatch every candidate (rows of sizes, in sizeVars order) over the horizon; returns the costs, shortfalls and
+    # energy totals, and with record = True also the hourly value of every LP variable (candidates x T each)
+    def simulate(self, sizes, record = False):
+        sizes = np.atleast_2d(np.asarray(sizes, dtype = float))
+        N, T, dt, p = len(sizes), self.T, self.dt, self.params
+        NG, PV, Bat, Wind, Zn, ZnStor, FC = sizes.T
+        Epv, Ew, Eload = self.profiles['Epv'], self.profiles['Ew'], self.profiles['Eload']
+        Bateff, Zneff, PEMeff = p['Bateff'], p['Zneff'], p['PEMeff']
+        c = self.costs
+        regularLeft = np.cumsum(self.regular[::-1])[::-1] # regular hours from t to the end
+        batMax, fcMax = 0.25 * Bat, FC / PEMeff
+
+        xbat = 0.2 * Bat # batStart
+        xzn = np.zeros(N) # znStart
+        sold = np.zeros(N) # kg of zinc sold towards the quota
+        operating = np.zeros(N)
+        renewable, gas, lost = np.zeros(N), np.zeros(N), np.zeros(N)
+        hourly = {name: np.zeros((N, T)) for name in MatrixModel.hourlyVars} if record else None
+
+        for t in range(T):
+            pv, w = PV * Epv[t], Wind * Ew[t]
+            net = Eload[t] - pv - w # positive: deficit, negative: surplus
+
+            # zinc production: the rate that meets the quota in the regular hours left, or the surplus, within the
+            # plant size, the storage room and what is still needed
+            uznc = np.zeros(N)
+            if self.regular[t] and t < T-1:
+                need = np.maximum(self.zincQuota - sold - xzn, 0) / Zneff # kWh still to be turned into zinc
+                uznc = np.clip(np.maximum(need / (dt * regularLeft[t]), -net), 0, np.minimum(Zn, need / dt))
+                uznc = np.minimum(uznc, np.maximum(ZnStor - xzn, 0) / (dt * Zneff))
+            net = net + uznc
+
+            # battery: charge from a surplus, discharge into a deficit (stored energy changes by Bateff * ubatc - ubatdc)
+            ubatc = np.clip(-net, 0, np.minimum(batMax, np.maximum(Bat - xbat, 0) / (dt * Bateff)))
+            ubatdc = np.clip(net / Bateff, 0, np.minimum(batMax, np.maximum(xbat - 0.2 * Bat, 0) / dt))
+            pbat = Bateff * ubatdc - ubatc
+            net = net - pbat
+
+            # gas delivers twice its output in meetDemand, then the fuel cell, then lost load
+            png = np.clip(net / 2, 0, NG)
+            net = net - 2 * png
+            uzndc = np.clip(net / PEMeff, 0, np.minimum(fcMax, (xzn + dt * Zneff * uznc) / dt))
+            net = net - PEMeff * uzndc
+            ploss = np.maximum(net, 0)
+
+            # sell the zinc in storage up to the quota (znSaleStart: nothing in the first period)
+            uznsold = np.zeros(N)
+            if self.regular[t] and 0 < t < T-1:
+                uznsold = np.clip(np.minimum(xzn / dt + Zneff * uznc - uzndc, (self.zincQuota - sold) / dt), 0, ZnStor)
+                sold += dt * uznsold
+
+            # curtail the surplus from solar and wind in proportion to what each could give
+            used = pv + w + np.minimum(net, 0)
+            share = np.divide(pv, pv + w, out = np.zeros(N), where = pv + w > 0)
+            ppv, pw = used * share, used * (1 - share)
+            pzn = PEMeff * uzndc - uznc
+
+            operating += (c['png'][t] * png + c['uznc'][t] * uznc + c['uznsold'][t] * uznsold + c['uzndc'][t] * uzndc
+                + c['ubatc'][t] * ubatc + c['ubatdc'][t] * ubatdc + c['ploss'][t] * ploss)
+            renewable += dt * used
+            gas += dt * png
+            lost += dt * ploss
+
+            if record:
+                for name, value in [('xbat', xbat), ('xzn', xzn), ('ubatc', ubatc), ('ubatdc', ubatdc), ('uzndc', uzndc), ('uznc', uznc),
+                        ('uznsold', uznsold), ('png', png), ('ppv', ppv), ('pw', pw), ('pbat', pbat), ('pzn', pzn), ('ploss', ploss)]:
+                    hourly[name][:, t] = value
+            xbat = xbat + dt * (Bateff * ubatc - ubatdc)
+            xzn = xzn + dt * (Zneff * uznc - uzndc - uznsold)
+
+        if record:
+            hourly['ung'][:, :T-1] = np.diff(hourly['png'], axis = 1) # ngTime; the last one is free
+        capital = sizes @ self.capitalCosts
+        result = {'capitalCost': capital, 'operatingCost': operating, 'totalCost': capital + operating,
+            'renewableShortfall': np.maximum(self.renewableTarget - renewable, 0), 'zincShortfall': np.maximum(self.zincQuota - sold, 0),
+            'renewableEnergy': renewable, 'gasEnergy': gas, 'lostLoad': lost}
+        return (result, hourly) if record else result
+
+    # simulate the candidates in batches (the hourly loop costs the same per step for any batch size up to a few
+    # thousand, so larger batches are faster per candidate); one row per candidate with its sizes and results
+    # feasible: meets the renewable minimum and the zinc quota (within tol, relative), so its dispatch is an LP point
+    def screen(self, sizes, batch = 8192, tol = 1e-6):
+        sizes = np.atleast_2d(np.asarray(sizes, dtype = float))
+        start = time.perf_counter()
+        parts = [self.simulate(sizes[k:k+batch]) for k in range(0, len(sizes), batch)]
+        self.seconds = time.perf_counter() - start
+        table = pd.DataFrame(sizes, columns = sizeVars)
+        for key in parts[0]:
+            table[key] = np.concatenate([part[key] for part in parts])
+        table['feasible'] = (table.renewableShortfall <= tol * self.renewableTarget) & (table.zincShortfall <= tol * self.zincQuota)
+        print('%d candidates in %.2f s (%.0f per second), %d feasible' % (len(sizes), self.seconds, len(sizes) / self.seconds, table.feasible.sum()))
+        return table
+
+    # sizes of the cheapest feasible candidate of a screen() table
+    def best(self, table):
+        feasible = table[table.feasible]
+        if len(feasible) == 0:
+            raise ValueError('no candidate meets the renewable minimum and the zinc quota')
+        return feasible.loc[feasible.totalCost.idxmin(), sizeVars].to_numpy(dtype = float)
+
+    # improve a feasible candidate by pattern search: every round simulates, in one batch, each size moved up and down
+    # by step times its range in bounds, keeps the cheapest feasible one, and halves the step when none is cheaper
+    def refine(self, sizes, bounds = None, step = 0.1, minStep = 1e-3, maxRounds = 200, tol = 1e-6):
+        bounds = dict(defaultBounds, **(bounds or {}))
+        span = np.array([bounds[name][1] - bounds[name][0] for name in sizeVars])
+        best = np.asarray(sizes, dtype = float)
+        bestCost = self.simulate(best)['totalCost'][0]
+        for rounds in range(maxRounds):
+            if step < minStep:
+                break
+            moves = np.concatenate([np.diag(step * span), -np.diag(step * span)])
+            candidates = np.maximum(best + moves, 0)
+            result = self.simulate(candidates)
+            feasible = (result['renewableShortfall'] <= tol * self.renewableTarget) & (result['zincShortfall'] <= tol * self.zincQuota)
+            cost = np.where(feasible, result['totalCost'], np.inf)
+            k = np.argmin(cost)
+            if cost[k] < bestCost:
+                best, bestCost = candidates[k], cost[k]
+            else:
+                step /= 2
+        print('refined to cost %.8g in %d rounds' % (bestCost, rounds))
+        return best
+
+    # the dispatch of one candidate as a column vector in MatrixBilevelModel's layout
+    def warmStart(self, sizes):
+        result, hourly = self.simulate(np.asarray(sizes, dtype = float)[None, :], record = True)
+        m = MatrixModel.MatrixBilevelModel(self.params, self.profiles, 0, self.T, self.dt) # only for its column layout
+        x = np.zeros(m.nCols)
+        for k, name in enumerate(sizeVars):
+            x[m.colIndex[name]] = sizes[k]
+        for name in MatrixModel.hourlyVars:
+            x[m.colIndex[name]] = hourly[name][0]
+        return x
+
+# solve a matrix model, starting HiGHS from the given column values (e.g. DispatchSimulator.warmStart)
+def solveFrom(m, x, options = None):
+    import highspy
+    h = MatrixModel.highsModel(m.c, m.A, m.rowLower, m.rowUpper, m.colLower, m.colUpper, options)
+    solution = highspy.HighsSolution()
+    solution.col_value = list(x)
+    solution.value_valid = True
+    h.setSolution(solution)
+    h.run()
+    sol = h.getSolution()
+    return {'x': np.array(sol.col_value), 'objective': h.getInfo().objective_function_value,
+        'status': h.modelStatusToString(h.getModelStatus()), 'iterations': h.getInfo().simplex_iteration_count}
+
+# screen n candidates, check the best one's dispatch against the LP's constraints and objective, and time the LP
+# from a cold start and from that dispatch
+def compareWithLP(scenarioFile, minimumRenewableElec = 0.5, T = 24*7*4, n = 4096):
+    sim = DispatchSimulator(scenarioFile, minimumRenewableElec, T)
+    table = sim.screen(sim.sampleSizes(n))
+    start = time.perf_counter()
+    sizes = sim.refine(sim.best(table))
+    print('refinement %.2f s' % (time.perf_counter() - start))
+    x = sim.warmStart(sizes)
+
+    m = MatrixModel.MatrixBilevelModel(sim.params, sim.profiles, minimumRenewableElec, T)
+    Ax = m.A @ x
+    violation = max(np.max(m.rowLower - Ax), np.max(Ax - m.rowUpper), np.max(m.colLower - x), 0)
+    print('best candidate:', dict(zip(sizeVars, sizes.round())))
+    print('simulated cost %.8g, LP objective at its dispatch %.8g, largest constraint violation %.2e'
+        % (sim.simulate(sizes)['totalCost'][0], m.c @ x, violation / np.abs(m.rowUpper[np.isfinite(m.rowUpper)]).max()))
+
+    start = time.perf_counter()
+    cold = MatrixModel.solveLP(m.c, m.A, m.rowLower, m.rowUpper, m.colLower, m.colUpper)
+    coldSeconds = time.perf_counter() - start
+    start = time.perf_counter()
+    warm = solveFrom(m, x)
+    warmSeconds = time.perf_counter() - start
+    print('LP optimum %.8g (%.1f%% below the best candidate); %.2f s cold, %.2f s from the dispatch (%s, objective %.8g)'
+        % (cold['objective'], 100 * (1 - cold['objective'] / (m.c @ x)), coldSeconds, warmSeconds, warm['status'], warm['objective']))
+    return table
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description = 'Screen capacity mixes with a rule-based dispatch')
+    parser.add_argument('--scenario-file', default = 'Cost_Baselines/BaselineScenario.dat')
+    parser.add_argument('--renmin', type = float, default = 0.5)
+    parser.add_argument('--hours', type = int, default = 24*7*51)
+    parser.add_argument('--candidates', type = int, default = 4096)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', default = None, help = 'write the table to this csv file')
+    args = parser.parse_args()
+
+    sim = DispatchSimulator(args.scenario_file, args.renmin, args.hours)
+    table = sim.screen(sim.sampleSizes(args.candidates, seed = args.seed))
+    if args.output:
+        table.to_csv(args.output, index = False)
+    print(table[table.feasible].sort_values('totalCost').head(10).to_string())
+    print(dict(zip(sizeVars, sim.refine(sim.best(table)).round())))
\ No newline at end of file
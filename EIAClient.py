@@ -0,0 +1,149 @@
+# Shared client for the EIA series API, used by HourlyDemand.py and HourlyPrice.py
+# Series are fetched concurrently on a small thread pool, each thread keeping its HTTP connection open between requests.
+# Responses are cached on disk in EIA_Cache/ for `ttl` seconds, and failed requests (connection errors, 429 and 5xx
+# responses) are retried with exponential backoff. The base url can point at the local stand-in of EIAStandIn.py
+# (or set EIA_BASE_URL) to run the pipeline offline.
+import os
+import time
+import json
+import random
+import hashlib
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+baseUrl = os.environ.get('EIA_BASE_URL', 'http://api.eia.gov')
+
+cacheDir = 'EIA_Cache'
+
+# responses newer than this many seconds are read from the cache instead of the api
+defaultTTL = 24 * 3600
+
+class EIAError(Exception):
+    pass
+
+class EIAClient:
+    def __init__(self, token, baseUrl = baseUrl, ttl = defaultTTL, cacheDir = cacheDir, workers = 4, retries = 4, backoff = 0.5, timeout = 30):
+        self.token = token
+        self.baseUrl = baseUrl.rstrip('/')
+        self.ttl = ttl
+        self.cacheDir = cacheDir
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.local = threading.local()
+        self.stats = {'requests': 0, 'cacheHits': 0, 'retries': 0, 'connections': 0}
+        self.lock = threading.Lock()
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    # the kept-alive connection of the calling thread
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            parts = urlsplit(self.baseUrl)
+            cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+            conn = self.local.conn = cls(parts.netloc, timeout = self.timeout)
+            self.count('connections')
+        return conn
+
+    def dropConnection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    # the cache file of a series (the api key isn't part of the name)
+    def cachePath(self, seriesId, start = None):
+        name = self.baseUrl + '|' + seriesId.upper() + ('' if start is None else '|' + start)
+        key = hashlib.sha256(name.encode()).hexdigest()[:24]
+        return os.path.join(self.cacheDir, key + '.json')
+
+    def request(self, path):
+        url = urlsplit(self.baseUrl).path + path
+        for attempt in range(self.retries + 1):
+            try:
+                conn = self.connection()
+                conn.request('GET', url, headers = {'Connection': 'keep-alive'})
+                response = conn.getresponse()
+                body = response.read()
+                self.count('requests')
+                if response.status == 200:
+                    return body
+                if response.status != 429 and response.status < 500:
+                    raise EIAError('HTTP error %d for %s' % (response.status, path.split('?')[0]))
+                reason = 'HTTP %d' % response.status
+            except (OSError, http.client.HTTPException) as e:
+                self.dropConnection()
+                reason = str(e)
+            if attempt == self.retries:
+                raise EIAError('giving up on %s after %d attempts: %s' % (path.split('?')[0], attempt + 1, reason))
+            self.count('retries')
+            time.sleep(self.backoff * 2**attempt * (1 + random.random()))
+
+    # the api response (json) for one series, from the cache while it is fresh
+    # start (a date in the api's format for the series, e.g. 20190101T00Z or 201901) asks only for observations from then on
+    def raw(self, seriesId, start = None):
+        path = self.cachePath(seriesId, start)
+        if self.ttl > 0 and os.path.exists(path) and time.time() - os.path.getmtime(path) < self.ttl:
+            self.count('cacheHits')
+            with open(path, encoding = 'utf-8') as f:
+                return json.load(f)
+        query = {'api_key': self.token, 'series_id': seriesId.upper()}
+        if start is not None:
+            query['start'] = start
+        body = self.request('/series/?' + urlencode(query))
+        jso = json.loads(str(body, 'utf-8-sig'))
+        if 'series' not in jso:
+            raise EIAError('no data for %s: %s' % (seriesId, jso.get('data', {}).get('error', jso)))
+        os.makedirs(self.cacheDir, exist_ok = True)
+        tmp = path + '.tmp%d.%d' % (os.getpid(), threading.get_ident())
+        with open(tmp, 'w', encoding = 'utf-8') as f:
+            json.dump(jso, f)
+        os.replace(tmp, path)
+        return jso
+
+    # several series at once, {series id: response}
+    def fetch(self, seriesIds, start = None):
+        with ThreadPoolExecutor(max_workers = max(1, min(self.workers, len(seriesIds)))) as pool:
+            return dict(zip(seriesIds, pool.map(lambda s: self.raw(s, start), seriesIds)))
+
+    # one column per series, lined up by date (newest first, as the api returns them)
+    def frame(self, seriesIds, start = None):
+        responses = self.fetch(seriesIds, start)
+        columns = {s: dict((d, v) for d, v in responses[s]['series'][0]['data']) for s in seriesIds}
+        dates = [d for d, v in responses[seriesIds[0]]['series'][0]['data']]
+        df = pd.DataFrame({'Date': dates})
+        for s in seriesIds:
+            df[s] = [columns[s].get(d) for d in dates]
+        return df
+
+# the interface HourlyDemand.py and HourlyPrice.py have always used
+class EIAgov(object):
+    def __init__(self, token, series, **clientOptions):
+        '''
+        Purpose:
+        Initialise the EIAgov class by requesting:
+        - EIA token
+        - id code(s) of the series to be downloaded
+
+        Parameters:
+        - token: string
+        - series: string or list of strings
+        - clientOptions: settings for EIAClient (baseUrl, ttl, workers, retries, ...)
+        '''
+        self.token = token
+        self.series = [series] if isinstance(series, str) else series
+        self.client = EIAClient(token, **clientOptions)
+
+    def Raw(self, ser):
+        return self.client.raw(ser)
+
+    def GetData(self):
+        # each series is downloaded once, all of them concurrently, and the dates come from the first one
+        return self.client.frame(self.series)
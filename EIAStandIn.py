@@ -0,0 +1,183 @@
+# Local stand-in for the EIA series API, so the ingestion pipeline can be tested and benchmarked offline
+# Serves /series/?api_key=...&series_id=...[&start=...] in the same json layout as api.eia.gov, from fixture files in a directory
+# (one <SERIES_ID>.json per series) or, by default, from fixtures rebuilt out of the csv files in CSV_Files. It can add
+# latency to every response and fail a share of requests with 503, to exercise the client's retries.
+#
+#   python EIAStandIn.py --port 8765 --latency 0.2          # then EIA_BASE_URL=http://127.0.0.1:8765 python HourlyPrice.py
+#   python EIAStandIn.py --benchmark
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import pandas as pd
+
+# series rebuilt from the csv files: (csv file, value column, date format of the api)
+csvFixtures = {
+    'EBA.TEX-ALL.D.H': ('CSV_Files/HourlyTxDemand2018.csv', 'demand', '%Y%m%dT%HZ'),
+    'EBA.ERCO-SCEN.D.H': ('CSV_Files/HourlyTxScenDemand2018-Notional.csv', 'demand', '%Y%m%dT%HZ'),
+    'NG.N3045TX3.M': ('CSV_Files/MonthlyNatGasPrices.csv', 'price', '%Y%m'),
+    'ELEC.PRICE.TX-ALL.M': ('CSV_Files/MonthlyElectricityPrices.csv', 'price', '%Y%m'),
+}
+
+def seriesResponse(seriesId, data):
+    return {'request': {'command': 'series', 'series_id': seriesId}, 'series': [{'series_id': seriesId, 'data': data}]}
+
+# api responses for the csv-backed series, newest observation first like the api
+def csvSeries():
+    fixtures = {}
+    for seriesId, (fileName, column, dateFormat) in csvFixtures.items():
+        df = pd.read_csv(fileName, parse_dates = ['DateTime']).sort_values('DateTime', ascending = False)
+        data = [[d.strftime(dateFormat), None if pd.isna(v) else float(v)] for d, v in zip(df.DateTime, df[column])]
+        fixtures[seriesId] = seriesResponse(seriesId, data)
+    return fixtures
+
+def loadFixtures(fixturesDir = None):
+    if fixturesDir is None:
+        return csvSeries()
+    fixtures = {}
+    for f in os.listdir(fixturesDir):
+        if f.endswith('.json'):
+            with open(os.path.join(fixturesDir, f)) as fp:
+                fixtures[f[:-len('.json')].upper()] = json.load(fp)
+    return fixtures
+
+# write the fixtures to a directory, e.g. to edit them for a test
+def writeFixtures(fixturesDir, fixtures = None):
+    os.makedirs(fixturesDir, exist_ok = True)
+    for seriesId, jso in (fixtures or csvSeries()).items():
+        with open(os.path.join(fixturesDir, seriesId + '.json'), 'w') as fp:
+            json.dump(jso, fp)
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep connections open between requests
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        if server.failureRate and server.rng.random() < server.failureRate:
+            return self.reply(503, {'error': 'temporarily unavailable'})
+        if parts.path.rstrip('/') != '/series':
+            return self.reply(404, {'error': 'unknown path'})
+        seriesId = query.get('series_id', [''])[0].upper()
+        if seriesId not in server.fixtures:
+            # the api answers unknown series with 200 and an error message
+            return self.reply(200, {'request': {'series_id': seriesId}, 'data': {'error': 'invalid series_id'}})
+        jso = server.fixtures[seriesId]
+        if 'start' in query:
+            # dates of one series share a format, so they compare as strings
+            start = query['start'][0]
+            series = dict(jso['series'][0], data = [row for row in jso['series'][0]['data'] if row[0] >= start])
+            jso = dict(jso, series = [series])
+        self.reply(200, jso)
+
+    def reply(self, status, jso):
+        body = json.dumps(jso).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port = 0, fixtures = None, latency = 0.0, failureRate = 0.0, seed = 0):
+        super().__init__(('127.0.0.1', port), StandInHandler)
+        self.fixtures = csvSeries() if fixtures is None else fixtures
+        self.latency = latency
+        self.failureRate = failureRate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    # serve on a background thread; stop with shutdown()
+    def start(self):
+        threading.Thread(target = self.serve_forever, daemon = True).start()
+        return self
+
+# time the old one-urlopen-per-request download (every series fetched twice, one after another) against the shared
+# client, cold and then from its cache, with `latency` seconds added to every response
+def benchmark(latency = 0.2, copies = 4):
+    import shutil
+    import tempfile
+    from urllib.request import urlopen
+    import EIAClient
+
+    fixtures = csvSeries()
+    # more series than the four real ones, so concurrency shows
+    for k in range(1, copies):
+        for seriesId in csvFixtures:
+            fixtures['%s.%d' % (seriesId, k)] = seriesResponse('%s.%d' % (seriesId, k), fixtures[seriesId]['series'][0]['data'])
+    server = StandInServer(fixtures = fixtures, latency = latency).start()
+    seriesIds = list(fixtures)
+    report = {}
+    try:
+        start = time.perf_counter()
+        for s in seriesIds:
+            for repeat in range(2): # GetData used to download the first series for the dates and again for the data
+                json.loads(str(urlopen(server.url + '/series/?api_key=x&series_id=' + s).read(), 'utf-8-sig'))
+        report['sequential'] = time.perf_counter() - start
+
+        cache = tempfile.mkdtemp()
+        try:
+            client = EIAClient.EIAClient('x', baseUrl = server.url, cacheDir = cache, workers = 8)
+            start = time.perf_counter()
+            client.frame(seriesIds)
+            report['client'] = time.perf_counter() - start
+            start = time.perf_counter()
+            client.frame(seriesIds)
+            report['cached'] = time.perf_counter() - start
+            report['connections'] = client.stats['connections']
+        finally:
+            shutil.rmtree(cache, ignore_errors = True)
+
+        # retries against a server that fails a third of the requests
+        server.failureRate = 1/3
+        cache = tempfile.mkdtemp()
+        try:
+            client = EIAClient.EIAClient('x', baseUrl = server.url, cacheDir = cache, workers = 8, backoff = 0.01, retries = 8)
+            responses = client.fetch(seriesIds)
+            report['retries'] = client.stats['retries']
+            report['complete'] = all(responses[s] == fixtures[s] for s in seriesIds)
+        finally:
+            shutil.rmtree(cache, ignore_errors = True)
+    finally:
+        server.shutdown()
+
+    print('%d series, %.2f s latency' % (len(seriesIds), latency))
+    print('sequential urlopen: %.2f s' % report['sequential'])
+    print('shared client: %.2f s on %d connections, %.3f s from the cache' % (report['client'], report['connections'], report['cached']))
+    print('with 1/3 of requests failing: %d retries, all series complete: %s' % (report['retries'], report['complete']))
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Serve EIA series from local fixtures')
+    parser.add_argument('--port', type = int, default = 8765)
+    parser.add_argument('--fixtures', default = None, help = 'directory of <SERIES_ID>.json files (default: built from CSV_Files)')
+    parser.add_argument('--latency', type = float, default = 0.0, help = 'seconds added to every response')
+    parser.add_argument('--failure-rate', type = float, default = 0.0, help = 'share of requests answered with 503')
+    parser.add_argument('--benchmark', action = 'store_true', help = 'time the old download against the shared client')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.latency or 0.2)
+    else:
+        server = StandInServer(args.port, loadFixtures(args.fixtures), args.latency, args.failure_rate)
+        print('serving', len(server.fixtures), 'series at', server.url)
+        server.serve_forever()
@@ -10,8 +10,6 @@ import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import matplotlib.cbook as cbook
 import json
-from urllib.error import URLError, HTTPError
-from urllib.request import urlopen
 from datetime import datetime
 from pandas.plotting import register_matplotlib_converters
 register_matplotlib_converters()
@@ -29,74 +27,17 @@ tx_south = Series('EBA.ERCO-SCEN.D.H')
 
 print(type(tx_south))
 
-class EIAgov(object):
-    def __init__(self, token, series):
-        '''
-        Purpose:
-        Initialise the EIAgov class by requesting:
-        - EIA token
-        - id code(s) of the series to be downloaded
-
-        Parameters:
-        - token: string
-        - series: string or list of strings
-        '''
-        self.token = token
-        self.series = series
-
-    '''
-    def __repr__(self):
-        return str(self.series)
-    '''
-
-    def Raw(self, ser):
-        # Construct url
-        url = 'http://api.eia.gov/series/?api_key=' + self.token + '&series_id=' + ser.upper()
-
-        try:
-            # URL request, URL opener, read content
-            response = urlopen(url);
-            raw_byte = response.read()
-            raw_string = str(raw_byte, 'utf-8-sig')
-            jso = json.loads(raw_string)
-            return jso
-
-        except HTTPError as e:
-            print('HTTP error type.')
-            print('Error code: ', e.code)
-
-        except URLError as e:
-            print('URL type error.')
-            print('Reason: ', e.reason)
-
-    def GetData(self):
-        # Deal with the date series                       
-        date_ = self.Raw(self.series[0])        
-        date_series = date_['series'][0]['data']
-        endi = len(date_series) # or len(date_['series'][0]['data'])
-        date = []
-        for i in range (endi):
-            date.append(date_series[i][0])
-
-        # Create dataframe
-        df = pd.DataFrame(data=date)
-        df.columns = ['Date']
-
-        # Deal with data
-        lenj = len(self.series)
-        for j in range (lenj):
-            data_ = self.Raw(self.series[j])
-            data_series = data_['series'][0]['data']
-            data = []
-            endk = len(date_series)         
-            for k in range (endk):
-                data.append(data_series[k][1])
-            df[self.series[j]] = data
-        
-        return df
+# the EIA client is shared with the other download scripts (concurrent, cached, retried; see EIAClient.py)
+from EIAClient import EIAgov
 
 if __name__ == '__main__':
     tok = 'b7377dd90900cf2508b4ea504a6e535b'#'e924bc140b111249b616ec1d53a91b6a'
+
+    # --refresh appends only the hours newer than the history csv files already hold (see CSVRefresh.py)
+    if '--refresh' in sys.argv:
+        import CSVRefresh
+        CSVRefresh.refreshDemand(CSVRefresh.EIAClient(tok, ttl = 0))
+        sys.exit()
   	
   	# Texas hourly electricity demand
     tx = ['EBA.TEX-ALL.D.H']
@@ -0,0 +1,163 @@
+# Optional per-phase instrumentation for SystemBilevelModel.makeSolveAbstractModel
+# Every phase of a run (abstract model and profiles, .dat data load, create_instance, solver write/solve/read, result
+# export) is timed for wall and CPU seconds and the change in resident memory. Inside create_instance, Pyomo's own
+# construction timers give the time and number of indices of every component, summed into Param initialization,
+# variable, constraint and objective construction. Records go to a callback as each phase ends and/or to a json file.
+#
+#   SystemBilevelModel(..., instrument = 'run.phases.json')     # write a json report
+#   SystemBilevelModel(..., instrument = print)                 # call a function with every phase record
+import io
+import os
+import re
+import sys
+import json
+import time
+import logging
+import contextlib
+
+# component types are reported under these phase names
+constructionPhases = {
+    'Param': 'paramInitialization',
+    'Set': 'setConstruction',
+    'RangeSet': 'setConstruction',
+    'Var': 'variableConstruction',
+    'Constraint': 'constraintConstruction',
+    'Expression': 'expressionConstruction',
+    'Objective': 'objectiveConstruction',
+}
+
+# resident memory of this process in MB (psutil if installed, otherwise /proc, otherwise the peak from getrusage)
+def currentRSS():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024**2
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024**2
+    except (OSError, ValueError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024**2 if sys.platform == 'darwin' else rss / 1024
+
+# peak resident memory of this process in MB (ru_maxrss is in kB on Linux, bytes on macOS)
+def peakRSS():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024**2 if sys.platform == 'darwin' else rss / 1024
+
+# collects the ConstructionTimer records Pyomo logs as each component is built
+class ComponentTimes(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.components = []
+
+    def emit(self, record):
+        timer = record.msg
+        obj = getattr(timer, 'obj', None)
+        if obj is None or not hasattr(obj, 'ctype'):
+            return
+        try:
+            size = len(obj)
+        except TypeError:
+            size = 1
+        self.components.append({'name': timer.name, 'type': obj.ctype.__name__, 'seconds': timer.timer, 'indices': size})
+
+class PhaseReport:
+    # instrument: None (off), a json file name, a callable taking each phase record, or a list of those
+    def __init__(self, instrument = None, info = None):
+        targets = instrument if isinstance(instrument, list) else [instrument]
+        self.callbacks = [t for t in targets if callable(t)]
+        self.jsonFiles = [t for t in targets if isinstance(t, str)]
+        self.enabled = bool(self.callbacks or self.jsonFiles)
+        self.info = info or {}
+        self.records = []
+
+    def add(self, record):
+        self.records.append(record)
+        for f in self.callbacks:
+            f(record)
+
+    @contextlib.contextmanager
+    def phase(self, name, **extra):
+        if not self.enabled:
+            yield {}
+            return
+        record = dict(extra, phase = name)
+        rssStart = currentRSS()
+        start, cpuStart = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wallSeconds'] = time.perf_counter() - start
+            record['cpuSeconds'] = time.process_time() - cpuStart
+            record['rssMB'] = currentRSS()
+            record['memoryDeltaMB'] = record['rssMB'] - rssStart
+            self.add(record)
+
+    # model.create_instance with the time and size of every component recorded under the createInstance phase
+    def createInstance(self, model, data):
+        if not self.enabled:
+            return model.create_instance(data)
+        logger = logging.getLogger('pyomo.common.timing.construction')
+        handler = ComponentTimes()
+        oldLevel = logger.level
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        try:
+            with self.phase('createInstance') as record:
+                instance = model.create_instance(data)
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(oldLevel)
+
+        record['components'] = handler.components
+        totals = {}
+        for c in handler.components:
+            name = constructionPhases.get(c['type'], 'otherConstruction')
+            t = totals.setdefault(name, {'phase': name, 'parent': 'createInstance', 'wallSeconds': 0.0, 'components': 0, 'indices': 0})
+            t['wallSeconds'] += c['seconds']
+            t['components'] += 1
+            t['indices'] += c['indices']
+        for t in totals.values():
+            self.add(t)
+        return instance
+
+    # opt.solve with separate write, solve and read phases for solvers that run through a problem file (cplex, cbc,
+    # glpk, ...); in-memory solvers (appsi_highs) only report the whole solve
+    def solve(self, opt, instance, tee = False):
+        if not self.enabled:
+            return opt.solve(instance, tee = tee)
+        out = io.StringIO()
+        with self.phase('solverTotal') as record:
+            with contextlib.redirect_stdout(out):
+                results = opt.solve(instance, tee = tee, report_timing = True)
+        text = out.getvalue()
+        sys.stdout.write(text)
+
+        found = dict((step, float(seconds)) for seconds, step in re.findall(r'([\d.]+) seconds required for (presolve|solver|postsolve)', text))
+        for step, name in [('presolve', 'solverWrite'), ('solver', 'solverSolve'), ('postsolve', 'solverRead')]:
+            if step in found:
+                self.add({'phase': name, 'parent': 'solverTotal', 'wallSeconds': found[step]})
+        record['termination'] = str(results.solver.termination_condition)
+        return results
+
+    def summary(self):
+        return dict(self.info, phases = self.records, wallSeconds = sum(r['wallSeconds'] for r in self.records if 'parent' not in r))
+
+    def finish(self):
+        if not self.enabled:
+            return
+        for fileName in self.jsonFiles:
+            with open(fileName, 'w') as fp:
+                json.dump(self.summary(), fp, indent = 1)
+
+# count the variables, constraints and parameters of an instance, by type and component
+def componentCounts(instance):
+    from pyomo.environ import Var, Constraint, Param
+    counts = {}
+    for ctype in [Var, Constraint, Param]:
+        components = {c.name: len(c) for c in instance.component_objects(ctype, active = True)}
+        counts[ctype.__name__] = {'total': sum(components.values()), 'components': components}
+    return counts
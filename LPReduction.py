@@ -0,0 +1,230 @@
+# Reduction of the matrix LP before it goes to the solver, and the map from the reduced solution back to every column
+# The passes repeat until nothing changes:
+# - rows with one nonzero become bounds on their column (znStorMin, cantbuy, znStart, znSaleStart)
+# - inequality rows that hold for any values within the column bounds are dropped
+# - fixed columns are replaced by their value
+# - equality rows that define a free column (pbat in batPower, pzn in znPower, ung in ngTime) are solved for that
+#   column, which is substituted into the other rows and the objective; both the row and the column go
+# Each pass is a few sparse matrix products over all rows at once. The columns taken out are recovered afterwards in
+# reverse order, so solutions are saved under the original variable names as before.
+#
+#   r = ReducedLP(m.c, m.A, m.rowLower, m.rowUpper, m.colLower, m.colUpper)
+#   result = solveLP(r.c, r.A, r.rowLower, r.rowUpper, r.colLower, r.colUpper); x = r.expand(result['x'])
+import time
+import numpy as np
+import scipy.sparse as sp
+
+class ReducedLP:
+    # pivotTol: smallest coefficient, relative to the largest in its row, a defined column may have
+    # maxFill: largest (row nonzeros - 1) * (column nonzeros - 1) of a substitution, to keep the matrix sparse
+    def __init__(self, c, A, rowLower, rowUpper, colLower, colUpper, maxPasses = 10, pivotTol = 1e-3, maxFill = 4):
+        start = time.perf_counter()
+        self.nOrigRows, self.nOrigCols = A.shape
+        self.c = np.array(c, dtype = float)
+        self.A = sp.csr_matrix(A, dtype = float, copy = True)
+        self.A.eliminate_zeros() # e.g. the night hours of -Epv * PVSize
+        self.nOrigNonzeros = self.A.nnz
+        self.rowLower, self.rowUpper = np.array(rowLower, dtype = float), np.array(rowUpper, dtype = float)
+        self.colLower, self.colUpper = np.array(colLower, dtype = float), np.array(colUpper, dtype = float)
+        self.colMap = np.arange(self.nOrigCols) # original index of every remaining column
+        self.rowMap = np.arange(self.nOrigRows)
+        self.offset = 0.0 # objective constant from the columns taken out
+        self.postsolve = []
+        self.pivotTol, self.maxFill = pivotTol, maxFill
+        self.removed = {'singletonRows': 0, 'redundantRows': 0, 'fixedColumns': 0, 'substitutedColumns': 0}
+
+        for self.passes in range(1, maxPasses + 1):
+            changed = self.singletonRows() + self.redundantRows() + self.fixedColumns() + self.substitute()
+            if changed == 0:
+                break
+        self.seconds = time.perf_counter() - start
+
+    # keep the rows where keep is True
+    def dropRows(self, keep):
+        self.A = self.A[keep]
+        self.rowLower, self.rowUpper, self.rowMap = self.rowLower[keep], self.rowUpper[keep], self.rowMap[keep]
+
+    # keep the columns where keep is True
+    def dropColumns(self, keep):
+        self.A = self.A[:, keep].tocsr()
+        self.c, self.colLower, self.colUpper, self.colMap = self.c[keep], self.colLower[keep], self.colUpper[keep], self.colMap[keep]
+
+    def singletonRows(self):
+        counts = np.diff(self.A.indptr)
+        rows = np.flatnonzero(counts == 1)
+        if len(rows) == 0:
+            return 0
+        cols = self.A.indices[self.A.indptr[rows]]
+        a = self.A.data[self.A.indptr[rows]]
+        # lower <= a x <= upper gives bounds on x, swapped where a < 0
+        lo, hi = self.rowLower[rows] / a, self.rowUpper[rows] / a
+        lo, hi = np.where(a > 0, lo, hi), np.where(a > 0, hi, lo)
+        np.maximum.at(self.colLower, cols, lo)
+        np.minimum.at(self.colUpper, cols, hi)
+        keep = counts != 1
+        self.dropRows(keep)
+        self.removed['singletonRows'] += len(rows)
+        return len(rows)
+
+    # the least and greatest value of every row over the column bounds
+    def activityBounds(self):
+        A = self.A.tocoo()
+        rows = np.concatenate([[0], np.cumsum(np.bincount(A.row, minlength = A.shape[0]))])
+        low = np.where(A.data > 0, self.colLower[A.col], self.colUpper[A.col]) * A.data
+        high = np.where(A.data > 0, self.colUpper[A.col], self.colLower[A.col]) * A.data
+        def rowSums(v):
+            finite = np.where(np.isfinite(v), v, 0.0)
+            total = np.add.reduceat(np.append(finite, 0.0), rows[:-1]) * (np.diff(rows) > 0)
+            infinite = np.add.reduceat(np.append(np.isinf(v).astype(float), 0.0), rows[:-1]) * (np.diff(rows) > 0)
+            return total, infinite
+        lowTotal, lowInf = rowSums(low)
+        highTotal, highInf = rowSums(high)
+        return np.where(lowInf > 0, -np.inf, lowTotal), np.where(highInf > 0, np.inf, highTotal)
+
+    def redundantRows(self, tol = 1e-9):
+        if self.A.shape[0] == 0:
+            return 0
+        low, high = self.activityBounds()
+        redundant = (low >= self.rowLower - tol * (1 + np.abs(self.rowLower))) & (high <= self.rowUpper + tol * (1 + np.abs(self.rowUpper)))
+        n = int(redundant.sum())
+        if n:
+            self.dropRows(~redundant)
+            self.removed['redundantRows'] += n
+        return n
+
+    def fixedColumns(self):
+        fixed = (self.colLower == self.colUpper) & np.isfinite(self.colLower)
+        n = int(fixed.sum())
+        if n == 0:
+            return 0
+        value = self.colLower[fixed]
+        shift = self.A[:, fixed] @ value
+        self.rowLower, self.rowUpper = self.rowLower - shift, self.rowUpper - shift
+        self.offset += self.c[fixed] @ value
+        self.postsolve.append(('fixed', self.colMap[fixed], value))
+        self.dropColumns(~fixed)
+        self.removed['fixedColumns'] += n
+        return n
+
+    # pick (row, column) pairs where each row holds one chosen column and no chosen column is in another chosen row
+    def pivots(self):
+        A = self.A
+        equality = self.rowLower == self.rowUpper
+        free = np.isneginf(self.colLower) & np.isposinf(self.colUpper)
+        rowCounts = np.diff(A.indptr)
+        colCounts = np.bincount(A.indices, minlength = A.shape[1])
+        coo = A.tocoo()
+        rowMax = np.zeros(A.shape[0])
+        np.maximum.at(rowMax, coo.row, np.abs(coo.data))
+        candidate = equality[coo.row] & free[coo.col] & (np.abs(coo.data) >= self.pivotTol * rowMax[coo.row])
+        fill = (rowCounts[coo.row] - 1) * (colCounts[coo.col] - 1)
+        candidate &= fill <= self.maxFill
+        order = np.flatnonzero(candidate)
+        order = order[np.argsort(fill[order], kind = 'stable')]
+
+        colTaken = np.zeros(A.shape[1], dtype = bool) # chosen columns
+        colBlocked = np.zeros(A.shape[1], dtype = bool) # columns in chosen rows
+        rowTaken = np.zeros(A.shape[0], dtype = bool)
+        pivotRows, pivotCols = [], []
+        for k in order:
+            r, j = coo.row[k], coo.col[k]
+            if rowTaken[r] or colBlocked[j]:
+                continue
+            rowCols = A.indices[A.indptr[r]:A.indptr[r+1]]
+            if colTaken[rowCols].any():
+                continue
+            rowTaken[r] = True
+            colTaken[j] = True
+            colBlocked[rowCols] = True
+            pivotRows.append(r)
+            pivotCols.append(j)
+        return np.array(pivotRows, dtype = int), np.array(pivotCols, dtype = int)
+
+    # x_P = (b_R - A_RN x_N) / d for the chosen rows R and columns P, put into the other rows and the objective
+    def substitute(self):
+        R, P = self.pivots()
+        if len(R) == 0:
+            return 0
+        A = self.A
+        nRows, nCols = A.shape
+        keepRows = np.ones(nRows, dtype = bool)
+        keepRows[R] = False
+        keepCols = np.ones(nCols, dtype = bool)
+        keepCols[P] = False
+
+        d = np.asarray(A[R, P]).reshape(-1)
+        scale = sp.diags(1 / d)
+        M = (scale @ A[R][:, keepCols]).tocsr() # x_P = b/d - M x_N
+        b = self.rowLower[R] / d
+        other = A[keepRows]
+        AP = other[:, P]
+        shift = AP @ b
+        self.A = (other[:, keepCols] - AP @ M).tocsr()
+        self.A.eliminate_zeros()
+        self.rowLower, self.rowUpper = self.rowLower[keepRows] - shift, self.rowUpper[keepRows] - shift
+        self.rowMap = self.rowMap[keepRows]
+        self.offset += self.c[P] @ b
+        newCost = self.c[keepCols] - M.T @ self.c[P]
+
+        # recovered in original column numbers
+        mapped = sp.csr_matrix((M.data, self.colMap[keepCols][M.indices], M.indptr), shape = (len(P), self.nOrigCols))
+        self.postsolve.append(('substituted', self.colMap[P], b, mapped))
+        self.c, self.colLower, self.colUpper, self.colMap = newCost, self.colLower[keepCols], self.colUpper[keepCols], self.colMap[keepCols]
+        self.removed['substitutedColumns'] += len(P)
+        return len(P)
+
+    @property
+    def nRows(self):
+        return self.A.shape[0]
+
+    @property
+    def nCols(self):
+        return self.A.shape[1]
+
+    # every original column from the reduced solution, undoing the passes in reverse
+    def expand(self, x):
+        full = np.full(self.nOrigCols, np.nan)
+        full[self.colMap] = x
+        for step in reversed(self.postsolve):
+            if step[0] == 'fixed':
+                full[step[1]] = step[2]
+            else:
+                cols, b, M = step[1:]
+                full[cols] = b - M @ np.nan_to_num(full)
+        return full
+
+    def report(self):
+        return {'rows': (self.nOrigRows, self.nRows), 'columns': (self.nOrigCols, self.nCols),
+            'nonzeros': (self.nOrigNonzeros, int(self.A.nnz)), 'removed': dict(self.removed), 'passes': self.passes, 'seconds': self.seconds}
+
+    def printReport(self):
+        r = self.report()
+        for key in ['rows', 'columns', 'nonzeros']:
+            before, after = r[key]
+            print('%-9s %9d -> %9d (%.1f%% fewer)' % (key, before, after, 100 * (1 - after / max(before, 1))))
+        print(', '.join('%s %d' % item for item in r['removed'].items()), '(%d passes, %.2f s)' % (r['passes'], r['seconds']))
+
+# solve a MatrixBilevelModel with and without the reduction and compare the objective and the solutions
+def compareReduced(scenarioFile, minimumRenewableElec, T = 168*4, tol = 1e-6):
+    import MatrixModel
+    m = MatrixModel.MatrixBilevelModel.fromFiles(scenarioFile, minimumRenewableElec, T)
+    start = time.perf_counter()
+    full = MatrixModel.solveLP(m.c, m.A, m.rowLower, m.rowUpper, m.colLower, m.colUpper)
+    fullSeconds = time.perf_counter() - start
+    start = time.perf_counter()
+    r = ReducedLP(m.c, m.A, m.rowLower, m.rowUpper, m.colLower, m.colUpper)
+    reduced = MatrixModel.solveLP(r.c, r.A, r.rowLower, r.rowUpper, r.colLower, r.colUpper)
+    x = r.expand(reduced['x'])
+    reducedSeconds = time.perf_counter() - start
+    r.printReport()
+
+    objective = reduced['objective'] + r.offset
+    violation = max(np.max(m.rowLower - m.A @ x), np.max(m.A @ x - m.rowUpper), np.max(m.colLower - x), np.max(x - m.colUpper), 0)
+    print('objective: full %.8g, reduced %.8g (relative difference %.1e)' % (full['objective'], objective, abs(objective - full['objective']) / abs(full['objective'])))
+    print('largest bound or constraint violation of the expanded solution: %.2e' % violation)
+    print('c x of the expanded solution: %.8g' % (m.c @ x))
+    print('seconds: full %.2f, reduce and solve %.2f' % (fullSeconds, reducedSeconds))
+    return abs(objective - full['objective']) <= tol * abs(full['objective']) and violation <= 1e-5 * (1 + np.abs(m.rowUpper[np.isfinite(m.rowUpper)]).max())
+
+if __name__ == '__main__':
+    compareReduced('Cost_Baselines/BaselineScenario.dat', 0.5)
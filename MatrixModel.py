@@ -0,0 +1,331 @@
+# Matrix construction of the SystemBilevelModel LP
+# Builds the same LP as SystemModel.makeAbstractModel, but as sparse coefficient arrays assembled
+# directly from the hourly profile vectors, so no Python rule is called per hour.
+# The LP is passed to HiGHS in one call (scipy's linprog is used if highspy isn't installed).
+import numpy as np
+import scipy.sparse as sp
+
+import ProfileStore
+import ScenarioParams
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+# first stage (capital asset) variables, in the order they are declared in SystemModel
+sizeVars = ['NGGenSize', 'PVSize', 'BatSize', 'WindSize', 'ZnSize', 'ZnStorageSize', 'FCSize']
+
+# hourly (second stage) variables, in the order they are declared in SystemModel, and the ones without a lower bound
+hourlyVars = ['xbat', 'xzn', 'ung', 'ubatc', 'ubatdc', 'uzndc', 'uznc', 'uznsold', 'png', 'ppv', 'pw', 'pbat', 'pzn', 'ploss']
+freeVars = ['ung', 'pbat', 'pzn']
+
+# the parameters of a scenario file (.dat, .toml or .json, possibly an overlay on a base scenario), see ScenarioParams.py
+def readScenarioParams(fileName):
+    return ScenarioParams.load(fileName)
+
+# overtime labor costs for zinc production or zinc oxidation, same as initZnOT in SystemModel
+# (with start and step, the average over the hours of each period, like the other profiles)
+def znOvertime(T, start = 0, step = 1):
+    i = np.arange(start + 1, start + T*step + 1)
+    regular = (i % 168 < 144) & (i % 24 < 9)
+    return np.where(regular, 0.0, 20 * 1.5).reshape(T, step).mean(axis = 1) # time and a half
+
+# hourly arrays for the first T hours, with the same scaling and offsets as the Param initializers in SystemModel
+# (read from the cached profile store; horizons longer than the data repeat the year)
+# start and step give T periods of step hours each, beginning start hours into the year
+def loadProfiles(T, start = 0, step = 1):
+    profiles = ProfileStore.getProfiles(T, start, step)
+    profiles['ZnOT'] = znOvertime(T, start, step)
+    return profiles
+
+# FirstStageCost coefficients of the sizes, in the order of sizeVars
+def firstStageCosts(p):
+    return np.array([
+        p['NGCapEx'] + p['NGfom'],
+        p['PVCapEx'] + p['PVfom'],
+        p['BatCapEx'] + p['Batfom'],
+        p['WindCapEx'] + p['Windfom'],
+        p['ZnCapEx'] + p['ZnProdfom'] + p['ZnLaborfom'],
+        p['ZnStorCapEx'] + p['ZnStorfom'],
+        p['FCCapEx'] + p['FCfom'],
+    ])
+
+# SecondStageCost coefficients of the hourly variables that have a cost (scalars or one value per hour)
+def hourlyCosts(p, profiles):
+    ZnOT, NGPrice = profiles['ZnOT'], profiles['NGPrice']
+    return {
+        'uznc': p['elecPriceIndustrial'] + ZnOT, # electrical cost and overtime for producing refined zinc
+        'uznsold': -p['refinedZincPremium'] + ZnOT, # profits from selling SHG zinc, restricted to regular business hours
+        'uzndc': -p['PEMeff'] * (p['elecPriceWholesale'] + p['elecPricePremiumStorage']) + ZnOT, # zinc oxidation/fuel cell profits
+        'ubatc': (1/p['Bateff']) * p['elecPriceWholesale'], # electrical cost for charging batteries
+        'ubatdc': -p['Bateff'] * (p['elecPriceWholesale'] + p['elecPricePremiumStorage']), # profits from selling battery power
+        'ploss': p['lostLoadCost'],
+        'png': NGPrice + p['NGvom'], # natural gas fuel costs
+    }
+
+# solve min c x subject to rowLower <= A x <= rowUpper and colLower <= x <= colUpper, with HiGHS if highspy is
+# installed and scipy's linprog otherwise; returns x, the objective, the status, the row duals and the column
+# reduced costs (c - A'y, the change in objective per unit change of a fixed column)
+def solveLP(c, A, rowLower, rowUpper, colLower, colUpper, options = None):
+    options = options or {}
+    if highspy is not None:
+        return solveHighs(c, A, rowLower, rowUpper, colLower, colUpper, options)
+    return solveLinprog(c, A, rowLower, rowUpper, colLower, colUpper, options)
+
+def solveHighs(c, A, rowLower, rowUpper, colLower, colUpper, options):
+    h = highsModel(c, A, rowLower, rowUpper, colLower, colUpper, options)
+    h.run()
+    sol = h.getSolution()
+    return {'x': np.array(sol.col_value), 'objective': h.getInfo().objective_function_value,
+        'status': h.modelStatusToString(h.getModelStatus()),
+        'rowDual': np.array(sol.row_dual), 'colDual': np.array(sol.col_dual)}
+
+# a HiGHS object holding the LP, for callers that change costs or bounds and re-solve from the previous basis
+def highsModel(c, A, rowLower, rowUpper, colLower, colUpper, options = None):
+    h = highspy.Highs()
+    h.setOptionValue('output_flag', False)
+    for key, val in (options or {}).items():
+        h.setOptionValue(key, val)
+    A = sp.csc_matrix(A)
+    lp = highspy.HighsLp()
+    lp.num_col_ = A.shape[1]
+    lp.num_row_ = A.shape[0]
+    lp.col_cost_ = c
+    lp.col_lower_ = colLower
+    lp.col_upper_ = colUpper
+    lp.row_lower_ = rowLower
+    lp.row_upper_ = rowUpper
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = A.indptr
+    lp.a_matrix_.index_ = A.indices
+    lp.a_matrix_.value_ = A.data
+    h.passModel(lp)
+    return h
+
+def solveLinprog(c, A, rowLower, rowUpper, colLower, colUpper, options):
+    from scipy.optimize import linprog
+    A = sp.csr_matrix(A)
+    eq = rowLower == rowUpper
+    up = ~eq & np.isfinite(rowUpper)
+    lo = ~eq & np.isfinite(rowLower)
+    A_ub = sp.vstack([A[up], -A[lo]]).tocsr()
+    b_ub = np.concatenate([rowUpper[up], -rowLower[lo]])
+    res = linprog(c, A_ub = A_ub, b_ub = b_ub, A_eq = A[eq], b_eq = rowUpper[eq],
+        bounds = np.column_stack([colLower, colUpper]), method = 'highs', options = options)
+    rowDual = np.zeros(A.shape[0])
+    if res.x is not None:
+        # linprog reports d(objective)/d(b) for the A_ub x <= b_ub rows, so the >= rows flip sign
+        nUp = up.sum()
+        rowDual[eq] = res.eqlin.marginals
+        rowDual[up] += res.ineqlin.marginals[:nUp]
+        rowDual[lo] -= res.ineqlin.marginals[nUp:]
+    return {'x': res.x, 'objective': res.fun, 'status': res.message, 'rowDual': rowDual, 'colDual': c - A.T @ rowDual}
+
+# collects constraint rows as coordinate triplets, one named block at a time
+class RowBlocks:
+    def __init__(self):
+        self.rows, self.cols, self.vals = [], [], []
+        self.lower, self.upper = [], []
+        self.blocks = [] # (constraint name, first row, number of rows)
+        self.n = 0
+
+    # one row per entry of the column arrays; each term is (column indices, coefficients)
+    def add(self, name, terms, lower, upper):
+        m = len(terms[0][0])
+        r = np.arange(self.n, self.n + m)
+        for cols, coefs in terms:
+            self.rows.append(r)
+            self.cols.append(np.broadcast_to(cols, (m,)))
+            self.vals.append(np.broadcast_to(np.asarray(coefs, dtype = float), (m,)))
+        self.lower.append(np.broadcast_to(np.asarray(lower, dtype = float), (m,)))
+        self.upper.append(np.broadcast_to(np.asarray(upper, dtype = float), (m,)))
+        self.blocks.append((name, self.n, m))
+        self.n += m
+
+    # a single row summing the given columns
+    def addSum(self, name, cols, coefs, lower, upper):
+        cols = np.asarray(cols)
+        self.rows.append(np.full(len(cols), self.n))
+        self.cols.append(cols)
+        self.vals.append(np.broadcast_to(np.asarray(coefs, dtype = float), (len(cols),)))
+        self.lower.append(np.array([lower], dtype = float))
+        self.upper.append(np.array([upper], dtype = float))
+        self.blocks.append((name, self.n, 1))
+        self.n += 1
+
+    def matrix(self, nCols):
+        A = sp.coo_matrix((np.concatenate(self.vals), (np.concatenate(self.rows), np.concatenate(self.cols))), shape = (self.n, nCols))
+        return A.tocsr(), np.concatenate(self.lower), np.concatenate(self.upper)
+
+class MatrixBilevelModel:
+    # T periods of timeStep hours each; the hourly variables stay rates per hour (see SystemModel.makeAbstractModel)
+    def __init__(self, params, profiles, minimumRenewableElec, T, timeStep = 1):
+        self.params = params
+        self.profiles = profiles
+        self.renMin = minimumRenewableElec
+        self.T = T
+        self.timeStep = timeStep
+
+        # column layout: the sizes first, then one block of T columns per hourly variable
+        self.colIndex = {}
+        for k, name in enumerate(sizeVars):
+            self.colIndex[name] = k
+        for k, name in enumerate(hourlyVars):
+            self.colIndex[name] = np.arange(len(sizeVars) + k*T, len(sizeVars) + (k+1)*T)
+        self.nCols = len(sizeVars) + len(hourlyVars)*T
+
+        self.build()
+
+    @classmethod
+    def fromFiles(cls, scenarioFile, minimumRenewableElec, T, startHour = 0, timeStep = 1):
+        return cls(readScenarioParams(scenarioFile), loadProfiles(T, startHour, timeStep), minimumRenewableElec, T, timeStep)
+
+    def build(self):
+        p, T, col, dt = self.params, self.T, self.colIndex, self.timeStep
+        Epv, Ew, Eload = self.profiles['Epv'], self.profiles['Ew'], self.profiles['Eload']
+        inf = np.inf
+        first, rest = slice(0, T-1), slice(1, T)
+        hours = T * dt
+
+        L = dt * Eload[:T-1].sum()
+        self.totalElecRen = (L + (101000000 * 4.8 * hours/8760)) * self.renMin
+
+        r = RowBlocks()
+        r.add('renewablePVLimits', [(col['ppv'], 1), (col['PVSize'], -Epv)], -inf, 0)
+        r.add('renewableWindLimits', [(col['pw'], 1), (col['WindSize'], -Ew)], -inf, 0)
+        r.addSum('renewableMinimum', np.concatenate([col['ppv'], col['pw']]), dt, self.totalElecRen, inf)
+        r.add('ngMax', [(col['png'], 1), (col['NGGenSize'], -1)], -inf, 0)
+        r.add('ngTime', [(col['png'][rest], 1), (col['png'][first], -1), (col['ung'][first], -1)], 0, 0)
+        r.add('ngRampLimit', [(col['ung'], 1), (col['NGGenSize'], -dt)], -inf, 0)
+        r.add('ngThrottleLimit', [(col['ung'], 1), (col['NGGenSize'], dt)], 0, inf)
+        # batTime is skipped for every hour in SystemModel (its condition is t > T), so it adds no rows here
+        r.add('batMin', [(col['xbat'], 1), (col['BatSize'], -0.2)], 0, inf)
+        r.add('batMax', [(col['xbat'], 1), (col['BatSize'], -1)], -inf, 0)
+        r.addSum('batStart', [col['xbat'][0], col['BatSize']], [1, -0.2], 0, 0)
+        r.add('batPower', [(col['ubatdc'], p['Bateff']), (col['ubatc'], -1), (col['pbat'], -1)], 0, 0)
+        r.add('chargeMax', [(col['ubatc'], 1), (col['BatSize'], -0.25)], -inf, 0)
+        r.add('dischargeMax', [(col['ubatdc'], 1), (col['BatSize'], -0.25)], -inf, 0)
+        r.addSum('znProdQuota', col['uznsold'][:T-1], dt, 101000000*hours/8760, inf)
+        r.addSum('znProdMax', col['uznsold'], dt, -inf, 200000000*hours/8760)
+        r.addSum('znStart', [col['xzn'][0]], 1, 0, 0)
+        r.add('znStorMin', [(col['xzn'], 1)], 0, inf)
+        r.add('cantbuy', [(col['uznsold'], 1)], 0, inf)
+        r.add('znMax', [(col['xzn'], 1), (col['ZnStorageSize'], -1)], -inf, 0)
+        r.addSum('znSaleStart', [col['uznsold'][0]], 1, 0, 0)
+        r.add('znForSale', [(col['uznsold'], 1), (col['ZnStorageSize'], -1)], -inf, 0)
+        r.add('znPower', [(col['uzndc'], p['PEMeff']), (col['uznc'], -1), (col['pzn'], -1)], 0, 0)
+        r.add('ZnChargeMax', [(col['uznc'], 1), (col['ZnSize'], -1)], -inf, 0)
+        r.add('ZnDischargeMax', [(col['uzndc'], 1), (col['FCSize'], -1/p['PEMeff'])], -inf, 0)
+        r.add('znTime', [(col['xzn'][rest], 1), (col['xzn'][first], -1), (col['uzndc'][first], dt),
+            (col['uznc'][first], -dt*p['Zneff']), (col['uznsold'][first], dt)], 0, 0)
+        # png appears twice in meetDemand in SystemModel
+        r.add('meetDemand', [(col['png'], 2), (col['ppv'], 1), (col['pw'], 1), (col['pbat'], 1), (col['pzn'], 1), (col['ploss'], 1)], Eload, Eload)
+
+        self.A, self.rowLower, self.rowUpper = r.matrix(self.nCols)
+        self.rowBlocks = r.blocks
+        self.nRows = r.n
+
+        self.colLower = np.zeros(self.nCols)
+        for name in freeVars:
+            self.colLower[col[name]] = -inf
+        self.colUpper = np.full(self.nCols, inf)
+
+        self.c = self.objective()
+
+    # objective coefficients of FirstStageCost + SecondStageCost
+    def objective(self):
+        col = self.colIndex
+        c = np.zeros(self.nCols)
+        for name, cost in zip(sizeVars, firstStageCosts(self.params)):
+            c[col[name]] = cost
+        for name, cost in hourlyCosts(self.params, self.profiles).items():
+            c[col[name]] = self.timeStep * cost
+        return c
+
+    # solve the LP and return the solution in the same {variable name: list of values} form SystemModel saves
+    # reduce = True solves the LP left after LPReduction removes redundant rows and defined columns
+    def solve(self, options = None, reduce = False):
+        if reduce:
+            import LPReduction
+            self.reduced = r = LPReduction.ReducedLP(self.c, self.A, self.rowLower, self.rowUpper, self.colLower, self.colUpper)
+            r.printReport()
+            self.result = solveLP(r.c, r.A, r.rowLower, r.rowUpper, r.colLower, r.colUpper, options)
+            self.result.update(x = r.expand(self.result['x']), objective = self.result['objective'] + r.offset)
+        else:
+            self.result = solveLP(self.c, self.A, self.rowLower, self.rowUpper, self.colLower, self.colUpper, options)
+        self.x, self.objectiveValue, self.status = self.result['x'], self.result['objective'], self.result['status']
+        print('Status:', self.status, 'Objective:', self.objectiveValue)
+        return self.toSolutionDict(self.x)
+
+    def toSolutionDict(self, x):
+        outFile = {}
+        for name in sizeVars + hourlyVars:
+            outFile[name] = np.atleast_1d(x[self.colIndex[name]]).tolist()
+        return outFile
+
+# check the matrix model against the Pyomo model of SystemModel: same numbers of variables and constraints, the same
+# objective and constraint values at a random point, and (solve = True) the same optimal objective and sizes; run by
+# test_MatrixModel.py
+def compareWithPyomo(scenarioFile, minimumRenewableElec, T = 168, seed = 0, tol = 1e-6, startHour = 0, timeStep = 1, solve = True, solveTol = 1e-4):
+    import SystemModel
+    from pyomo.environ import Var, Constraint, value
+
+    s = SystemModel.SystemBilevelModel('check', scenarioFile, None, minimumRenewableElec, startHour = startHour, hours = T*timeStep, timeStep = timeStep)
+    instance = s.makeInstance()
+    m = MatrixBilevelModel.fromFiles(scenarioFile, minimumRenewableElec, T, startHour, timeStep)
+
+    nVars = sum(len(v) for v in instance.component_objects(Var, active = True))
+    nCons = sum(len(c) for c in instance.component_objects(Constraint, active = True))
+    print('Variables: pyomo', nVars, 'matrix', m.nCols)
+    print('Constraints: pyomo', nCons, 'matrix', m.nRows)
+    ok = nVars == m.nCols and nCons == m.nRows
+
+    x = np.random.default_rng(seed).uniform(0, 10, m.nCols)
+    for name in sizeVars:
+        getattr(instance, name).set_value(x[m.colIndex[name]])
+    for name in hourlyVars:
+        v = getattr(instance, name)
+        for t, k in zip(range(1, T+1), m.colIndex[name]):
+            v[t].set_value(x[k])
+
+    pyomoObj = value(instance.Total_Cost_Objective)
+    matrixObj = m.c @ x
+    print('Objective: pyomo', pyomoObj, 'matrix', matrixObj)
+    ok = ok and abs(pyomoObj - matrixObj) <= tol * max(1, abs(pyomoObj))
+
+    # Pyomo may write a row the other way round, so compare how far each row is inside its bound (negative: violated),
+    # which doesn't depend on the row's orientation; only an equality row has no inside, and is compared up to sign
+    Ax = m.A @ x
+    for name, start, n in m.rowBlocks:
+        con = getattr(instance, name)
+        rows = range(start, start + n)
+        for index, k in zip(con, rows):
+            c = con[index]
+            body = value(c.body)
+            if c.equality:
+                pyomoRes, matrixRes = abs(body - c.lb), abs(Ax[k] - m.rowLower[k])
+            else:
+                pyomoRes = body - c.lb if c.lb is not None else c.ub - body
+                matrixRes = Ax[k] - m.rowLower[k] if np.isfinite(m.rowLower[k]) else m.rowUpper[k] - Ax[k]
+            if abs(pyomoRes - matrixRes) > tol * max(1, abs(pyomoRes)):
+                print('Mismatch in', name, index, pyomoRes, matrixRes)
+                ok = False
+                break
+
+    if solve:
+        import Solvers
+        Solvers.makeSolver('auto').solve(instance)
+        m.solve()
+        pyomoObj = value(instance.Total_Cost_Objective)
+        print('Optimal objective: pyomo', pyomoObj, 'matrix', m.objectiveValue)
+        ok = ok and abs(pyomoObj - m.objectiveValue) <= solveTol * abs(pyomoObj)
+        for name in sizeVars:
+            pyomoSize, matrixSize = value(getattr(instance, name)), m.x[m.colIndex[name]]
+            print(name + ': pyomo', pyomoSize, 'matrix', matrixSize)
+            ok = ok and abs(pyomoSize - matrixSize) <= solveTol * max(1, abs(pyomoSize))
+    print('Matrix model matches Pyomo model:', ok)
+    return ok
+
+if __name__ == '__main__':
+    compareWithPyomo('Cost_Baselines/BaselineScenario.dat', 0.2)
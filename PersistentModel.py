@@ -0,0 +1,101 @@
+# Persistent version of SystemBilevelModel for sweeps over renMin and cost/price parameters
+# The instance is built once with mutable Params and kept loaded in a persistent solver,
+# so a sweep costs one build plus one solve per point instead of a rebuild per point.
+import numpy as np
+from pyomo.environ import *
+from pyomo.opt import SolverFactory
+
+import SystemModel
+import MatrixModel
+
+# constraints whose coefficients or right hand sides depend on each mutable Param
+# (only needed for the classic persistent interfaces, the appsi solvers detect Param changes themselves)
+paramConstraints = {
+    'renMin': ['renewableMinimum'],
+    'Eload': ['meetDemand', 'renewableMinimum'],
+    'Bateff': ['batPower'],
+    'PEMeff': ['znPower', 'ZnDischargeMax'],
+    'Zneff': ['znTime'],
+}
+
+class PersistentBilevelModel:
+    # T periods of timeStep hours from startHour, as in SystemBilevelModel (the default horizon when T is None)
+    def __init__(self, scenarioFile, minimumRenewableElec, solverName = 'appsi_highs', solverOptions = None, T = None, startHour = 0, timeStep = 1):
+        horizon = {} if T is None else {'hours': T * timeStep}
+        s = SystemModel.SystemBilevelModel('persistent', scenarioFile, None, minimumRenewableElec, startHour = startHour, timeStep = timeStep, **horizon)
+        self.T = s.T
+        self.instance = s.makeInstance(mutable = True)
+
+        self.opt = SolverFactory(solverName)
+        for key, val in (solverOptions or {}).items():
+            self.opt.options[key] = val
+        self.appsi = solverName.startswith('appsi_')
+        if not self.appsi:
+            self.opt.set_instance(self.instance)
+
+        # components that need to be refreshed in a classic persistent solver before the next solve
+        self.staleConstraints = set()
+        self.staleObjective = False
+
+    def markChanged(self, name):
+        self.staleConstraints.update(paramConstraints.get(name, []))
+        if name not in ('renMin', 'Eload'):
+            self.staleObjective = True
+
+    def setRenewableMinimum(self, minimumRenewableElec):
+        self.instance.renMin.set_value(minimumRenewableElec)
+        self.markChanged('renMin')
+
+    # update scalar cost, efficiency and price Params, e.g. {'NGCapEx': 0.09, 'WindCapEx': 0.25}
+    def setParams(self, params):
+        for name, val in params.items():
+            getattr(self.instance, name).set_value(val)
+            self.markChanged(name)
+
+    # switch to the cost parameters of another scenario .dat file
+    def loadScenario(self, scenarioFile):
+        self.setParams(MatrixModel.readScenarioParams(scenarioFile))
+
+    # natural gas prices in $/kWh and loads in kW, one value per time step of the horizon
+    def setNGPrice(self, values):
+        self.instance.NGPrice.store_values(dict(zip(range(1, self.T+1), np.asarray(values, dtype = float).tolist())))
+        self.markChanged('NGPrice')
+
+    def setLoad(self, values):
+        self.instance.Eload.store_values(dict(zip(range(1, self.T+1), np.asarray(values, dtype = float).tolist())))
+        self.markChanged('Eload')
+
+    def refreshSolver(self):
+        for name in self.staleConstraints:
+            con = getattr(self.instance, name)
+            for index in con:
+                self.opt.remove_constraint(con[index])
+                self.opt.add_constraint(con[index])
+        if self.staleObjective:
+            self.opt.set_objective(self.instance.Total_Cost_Objective)
+        self.staleConstraints = set()
+        self.staleObjective = False
+
+    # re-solve with the current Params, optionally saving the solution json; returns the solution dictionary
+    def solve(self, outfileName = None, tee = False):
+        if self.appsi:
+            self.results = self.opt.solve(self.instance, tee = tee)
+        else:
+            self.refreshSolver()
+            self.results = self.opt.solve(tee = tee)
+        print('solved, objective:', value(self.instance.Total_Cost_Objective))
+        outFile = SystemModel.solutionDict(self.instance)
+        if outfileName is not None:
+            SystemModel.saveSolution(outFile, outfileName)
+        return outFile
+
+# solve one scenario at several renewable minimums: one model build, then one solve per point
+def runPenetrationSweep(scenarioFile, renMins, outfilePattern, solverName = 'appsi_highs'):
+    m = PersistentBilevelModel(scenarioFile, renMins[0], solverName)
+    for r in renMins:
+        m.setRenewableMinimum(r)
+        m.solve(outfilePattern.format(int(round(r*100))))
+    return m
+
+if __name__ == '__main__':
+    runPenetrationSweep('Cost_Baselines/BaselineScenario.dat', [0.2, 0.5, 0.7, 0.8, 0.9, 0.95, 0.99], 'Cost_Baselines/Baseline{}.json')
@@ -1,95 +1,104 @@
+# Figures of the dispatch, storage and installed sizes of solved scenarios
+# Hourly series are min/max decimated to the pixel width of the axes before plotting: each pixel column keeps the
+# lowest and highest value of the hours it covers, so the saved figure looks the same as one drawn from every hour but
+# a year-long line has a few thousand points instead of 8568. Figures are drawn with the headless Agg backend, and the
+# figure sets of many scenarios (e.g. a whole sweep) are rendered across a process pool.
+#
+#   python PlotBuildAndDispatch.py                                        # the Baseline20 figures
+#   python PlotBuildAndDispatch.py json_Files/*.json --output Figures/Sweep --workers 8
+#   python PlotBuildAndDispatch.py --manifest json_Files/manifest.json --output Figures/Sweep
+#   python PlotBuildAndDispatch.py Step3.npz --time-step 3                  # a solution of 3 hour periods
+import os
+import time
+import argparse
 import numpy as np
 import pandas as pd
 import json
+import matplotlib
+matplotlib.use('Agg') # figures are only saved, so no display is needed
 import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 
-# load fixed data
-loadData = pd.read_csv('CSV_Files/HourlyTxScenDemand2018-Notional.csv')
-windData = pd.read_csv('CSV_Files/Wind1p5MW.csv')
-solarData = pd.read_csv('CSV_Files/Solar1p5MW.csv')
+import ProfileStore
+import SolutionFile
+import ScenarioKPIs
 
-# read json file with output data
+# read json file with output data (.npz solution files are read lazily, one variable at a time)
 def loadScenarioData(fileName):
-    with open(fileName) as f:
-        data = json.load(f)
-    return data
-
-# make a plot with the dispatched assets for every hour 
-def plotDispatchCurves(dispatchedAssets, figname, load):
-    plt.figure(figsize=(6,4))
-    for n in range(len(dispatchedAssets)):
-        y = data[dispatchedAssets[n]]
-        plt.plot(np.linspace(0,len(y)-1, len(y)), y)
-    yl = loadData.demand[0:len(y)]*1000
+    return SolutionFile.read(fileName)
+
+# the indices and values of y that keep the minimum and maximum of each of `bins` consecutive chunks (plus the first and
+# last point); y is returned whole when it has no more than two points per bin
+def minMaxDecimate(y, bins):
+    y = np.asarray(y, dtype = float)
+    n = len(y)
+    if bins <= 0 or n <= 2*bins:
+        return np.arange(n), y
+    size = -(-n // bins)
+    chunks = -(-n // size)
+    padded = np.pad(y, (0, chunks*size - n), mode = 'edge').reshape(chunks, size)
+    start = np.arange(chunks) * size
+    idx = np.concatenate([[0], start + padded.argmin(axis = 1), start + padded.argmax(axis = 1), [n - 1]])
+    idx = np.unique(np.minimum(idx, n - 1))
+    return idx, y[idx]
+
+# width of the axes in pixels when the figure is saved at dpi
+def pixelWidth(ax, dpi):
+    return int(np.ceil(ax.get_position().width * ax.figure.get_figwidth() * dpi))
+
+# plot a series of timeStep hour periods from startHour against its hours, decimated to bins
+def plotSteps(ax, y, bins, timeStep = 1, startHour = 0, *style):
+    i, v = minMaxDecimate(y, bins)
+    ax.plot(startHour + np.asarray(i)*timeStep, v, *style)
+
+# make a plot with the dispatched assets for every time step; a solution of timeStep hour periods from startHour is drawn
+# against its hours, with the load averaged over the same periods as the model used
+def plotDispatchCurves(data, dispatchedAssets, figname, load, dpi = 300, decimate = True, timeStep = 1, startHour = 0):
+    fig, ax = plt.subplots(figsize=(6,4))
+    bins = pixelWidth(ax, dpi) if decimate else 0
+    for name in dispatchedAssets:
+        y = data[name]
+        plotSteps(ax, y, bins, timeStep, startHour)
+    legend = list(dispatchedAssets)
     if load == 1:
-        plt.plot(np.linspace(0, len(y)-1, len(y)), -yl, '-k')
-        dispatchedAssets.append('Load')
-        plt.legend(dispatchedAssets)
-    else:
-        plt.legend(dispatchedAssets)
-    plt.xlabel('Time [hrs]')
-    plt.ylabel('kW')
-    plt.savefig(figname, dpi=300)
+        yl = ProfileStore.getProfiles(len(y), startHour, timeStep)['Eload']
+        plotSteps(ax, -yl, bins, timeStep, startHour, '-k')
+        legend.append('Load')
+    ax.legend(legend)
+    ax.set_xlabel('Time [hrs]')
+    ax.set_ylabel('kW')
+    fig.savefig(figname, dpi=dpi)
+    plt.close(fig)
 
 # plot the installed capacity of different system assets
-def plotInstalledSizes(assets, figname):
-    plt.figure(figsize=(6,4))
+def plotInstalledSizes(data, assets, figname, dpi = 300):
+    fig, ax = plt.subplots(figsize=(6,4))
     for n in range(len(assets)):
-        y = data[assets[n]]
-        plt.bar(n, y)
-    plt.xticks(np.linspace(0, n, n+1), assets)
-    plt.ylabel('kW')
-    plt.savefig(figname, dpi=300)
-
-# plot the energy stored
-def plotStorage(dispatchedAssets, figname):
-    plt.figure(figsize=(6,4))
-    for n in range(len(dispatchedAssets)):
-        y = data[dispatchedAssets[n]]
-        plt.plot(np.linspace(0, len(y)-1, len(y)), y)
-    plt.legend(dispatchedAssets)
-    plt.xlabel('Time [hrs]')
-    plt.ylabel('kW')
-    plt.savefig(figname, dpi=300)
+        ax.bar(n, data[assets[n]])
+    ax.set_xticks(np.linspace(0, n, n+1))
+    ax.set_xticklabels(assets)
+    ax.set_ylabel('kW')
+    fig.savefig(figname, dpi=dpi)
+    plt.close(fig)
+
+# plot the energy stored, against hours like plotDispatchCurves
+def plotStorage(data, dispatchedAssets, figname, dpi = 300, decimate = True, timeStep = 1, startHour = 0):
+    fig, ax = plt.subplots(figsize=(6,4))
+    bins = pixelWidth(ax, dpi) if decimate else 0
+    for name in dispatchedAssets:
+        plotSteps(ax, data[name], bins, timeStep, startHour)
+    ax.legend(dispatchedAssets)
+    ax.set_xlabel('Time [hrs]')
+    ax.set_ylabel('kW')
+    fig.savefig(figname, dpi=dpi)
+    plt.close(fig)
 
 # make a plot of total energy from different sources in different scenarios, along with how much wind/solar end up curtailed
-def plotElecByType(scenarios, figname):
-    allP = ['png','pbat', 'ppv', 'pw', 'pzn', 'ploss']
-    df = pd.DataFrame({'Scenario': scenarios})
-    df['Natural Gas'] = np.zeros(len(scenarios))
-    df['Battery'] = np.zeros(len(scenarios))
-    df['Solar'] = np.zeros(len(scenarios))
-    df['Wind'] = np.zeros(len(scenarios))  
-    df['Zinc Discharged'] = np.zeros(len(scenarios))
-    df['Zinc Production'] = np.zeros(len(scenarios))
-    df['Lost Load'] = np.zeros(len(scenarios))
-    df['Curtailed Solar'] = np.zeros(len(scenarios)) 
-    df['Curtailed Wind'] = np.zeros(len(scenarios))
-    xlabels = []
-
-    for m in range(len(scenarios)):
-        data = loadScenarioData(scenarios[m])
-        df['Wind'].iloc[m] = sum(data['pw'])
-        df['Natural Gas'].iloc[m] = sum(data['png'])
-        df['Battery'].iloc[m] = sum(data['pbat'])
-        df['Solar'].iloc[m] = sum(data['ppv'])
-
-        df['Zinc Discharged'] = sum([num for num in data['pzn'] if num >= 0])
-        df['Zinc Production'] = sum([num for num in data['pzn'] if num < 0])
-
-        df['Lost Load'] = sum(data['ploss'])
-
-        df = solarData[0:len(data['ppv'])]
-        d1 = (d['System Power Generated | (k)W']/1500) * data['PVSize'] - data['ppv']
-        df['Curtailed Solar'].iloc[m] = sum(d1)
-
-        d = windData[0:len(data['pw'])]
-        d1 = (d['System Power Generated | (kW)']/1500) * data['WindSize'] - data['pw']
-        df['Curtailed Wind'].iloc[m] = sum(d1)
-
-        s = scenarios[m].strip('.json')
-        xlabels.append(s)
-        del data
+def plotElecByType(scenarios, figname, scenarioFile = None):
+    # energy by source and curtailment of every scenario, from the KPI table (see ScenarioKPIs.py)
+    table = ScenarioKPIs.kpiTable(scenarios, scenarioFile)
+    df = ScenarioKPIs.pivot(table, 'energy').join(ScenarioKPIs.pivot(table, 'curtailment')).reset_index()
+    xlabels = list(df.scenario)
 
     print(df)
 
@@ -104,16 +113,16 @@ def plotElecByType(scenarios, figname):
     plt.xlim(-0.5, len(scenarios) + 0.5)
 
     p1 = ax1.bar(df.index, df['Natural Gas'])
-    plt.text(len(scenarios) - 0.5, df['Natural Gas'].iloc[-1]/2, 'Natural Gas', fontsize = fs, verticalAlignment = 'center')
+    plt.text(len(scenarios) - 0.5, df['Natural Gas'].iloc[-1]/2, 'Natural Gas', fontsize = fs, verticalalignment = 'center')
     p2 = ax1.bar(df.index, df['Wind'], bottom = df['Natural Gas'])
-    plt.text(len(scenarios) - 0.5, df['Natural Gas'].iloc[-1] + df['Wind'].iloc[-1]/2, 'Wind', fontsize = fs, verticalAlignment = 'center')
+    plt.text(len(scenarios) - 0.5, df['Natural Gas'].iloc[-1] + df['Wind'].iloc[-1]/2, 'Wind', fontsize = fs, verticalalignment = 'center')
     p3 = ax1.bar(df.index, df['Solar'], bottom = df['Natural Gas'] + df['Wind'])
-    plt.text(len(scenarios) - 0.5, df['Natural Gas'].iloc[-1] + df['Wind'].iloc[-1] + df['Solar'].iloc[-1]/2, 'Solar', fontsize = fs, verticalAlignment = 'center')
+    plt.text(len(scenarios) - 0.5, df['Natural Gas'].iloc[-1] + df['Wind'].iloc[-1] + df['Solar'].iloc[-1]/2, 'Solar', fontsize = fs, verticalalignment = 'center')
     p4 = ax1.bar(df.index, df['Zinc Discharged'], bottom = df['Natural Gas'] + df['Wind'] + df['Solar'])
-    plt.text(len(scenarios) - 0.5, df['Natural Gas'].iloc[-1] + df['Wind'].iloc[-1] + df['[Solar'].iloc[-1] + df['Zinc Discharged'].iloc[-1], 'Zinc', fontsize = fs, verticalAlignment = 'center')
+    plt.text(len(scenarios) - 0.5, df['Natural Gas'].iloc[-1] + df['Wind'].iloc[-1] + df['Solar'].iloc[-1] + df['Zinc Discharged'].iloc[-1], 'Zinc', fontsize = fs, verticalalignment = 'center')
     p5 = ax1.bar(df.index, df['Zinc Production'])
-    plt.text(len(scenarios) - 0.5, df['Zinc Production'].iloc[-1]/2, 'Zinc Production', fontsize = fs, verticalAlignment = 'center')
-    plt.xticks(df,index, labels = xlabels, fontsize = fs)
+    plt.text(len(scenarios) - 0.5, df['Zinc Production'].iloc[-1]/2, 'Zinc Production', fontsize = fs, verticalalignment = 'center')
+    plt.xticks(df.index, labels = xlabels, fontsize = fs)
 
     plt.plot([-5, 10], [0, 0], '-k')
 
@@ -121,46 +130,104 @@ def plotElecByType(scenarios, figname):
     plt.xlim(-0.5, len(scenarios) + 0.5)
 
     p21 = ax2.bar(df.index, df['Curtailed Wind'])
-    plt.text(len(scenarios) - 0.5, df['Curtailed Wind'].iloc[-1]/2, 'Curtailed Wind', fontsize = fs, verticalAlignment = 'center')
+    plt.text(len(scenarios) - 0.5, df['Curtailed Wind'].iloc[-1]/2, 'Curtailed Wind', fontsize = fs, verticalalignment = 'center')
     p22 = ax2.bar(df.index, df['Curtailed Solar'], bottom = df['Curtailed Wind'])
-    plt.xticks(df,index, labels = xlabels, fontsize = fs)
+    plt.xticks(df.index, labels = xlabels, fontsize = fs)
 
     plt.savefig(figname, dpi=300)
+    plt.close()
+
+# the figures drawn for each scenario: (file name prefix, plot function, variables, extra arguments)
+figureSet = [
+    ('PowerFlows', plotDispatchCurves, ['pw', 'pbat', 'ppv', 'png', 'pzn', 'ploss'], [1]),
+    ('BatteriesCharging', plotDispatchCurves, ['ubatdc', 'ubatc'], [0]),
+    ('ZincCharging', plotDispatchCurves, ['uzndc', 'uznc', 'uznsold', 'xzn'], [0]),
+    ('StoredEnergy', plotStorage, ['xbat', 'xzn'], []),
+    ('CapitalAssets', plotInstalledSizes, ['NGGenSize', 'PVSize', 'BatSize', 'WindSize', 'ZnSize', 'FCSize', 'ZnStorageSize'], []),
+]
+
+# all figures of one solution file, saved as <outputDir>/<prefix><scenario name>.png
+def scenarioFigures(fileName, outputDir, dpi = 300, decimate = True, timeStep = 1, startHour = 0):
+    data = loadScenarioData(fileName)
+    name = os.path.splitext(os.path.basename(fileName))[0]
+    figures = []
+    for prefix, plot, names, args in figureSet:
+        figname = os.path.join(outputDir, prefix + name + '.png')
+        options = {'dpi': dpi}
+        if plot is not plotInstalledSizes:
+            options.update(decimate = decimate, timeStep = timeStep, startHour = startHour)
+        plot(data, names, figname, *args, **options)
+        figures.append(figname)
+    return figures
+
+# the figure sets of many scenarios, one scenario per task on a process pool (in this process for one worker)
+def renderFigures(fileNames, outputDir = 'Figures', workers = None, dpi = 300, decimate = True, timeStep = 1, startHour = 0):
+    os.makedirs(outputDir, exist_ok = True)
+    workers = workers or max(1, min(len(fileNames), os.cpu_count() or 1))
+    if workers == 1:
+        return [scenarioFigures(f, outputDir, dpi, decimate, timeStep, startHour) for f in fileNames]
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        futures = [pool.submit(scenarioFigures, f, outputDir, dpi, decimate, timeStep, startHour) for f in fileNames]
+        return [f.result() for f in futures]
+
+# the solution files of the runs in a SweepRunner manifest that finished
+def manifestFiles(manifestFile):
+    with open(manifestFile) as fp:
+        manifest = json.load(fp)
+    return [r['outfileName'] for r in manifest['scenarios'] if r['status'] == 'ok']
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Draw the dispatch, storage and size figures of solved scenarios')
+    parser.add_argument('files', nargs = '*', help = 'solution files (.json or .npz)')
+    parser.add_argument('--manifest', default = None, help = 'plot the finished runs of a sweep manifest')
+    parser.add_argument('--output', default = 'Figures')
+    parser.add_argument('--workers', type = int, default = None, help = 'processes (default: one per core)')
+    parser.add_argument('--dpi', type = int, default = 300)
+    parser.add_argument('--no-decimate', action = 'store_true', help = 'plot every hour')
+    parser.add_argument('--time-step', type = int, default = 1, help = 'hours per period of the solutions (as solved)')
+    parser.add_argument('--start-hour', type = int, default = 0, help = 'first hour of the solutions (as solved)')
+    args = parser.parse_args()
+
+    files = args.files + (manifestFiles(args.manifest) if args.manifest else [])
+    if files:
+        start = time.time()
+        figures = renderFigures(files, args.output, args.workers, args.dpi, not args.no_decimate, args.time_step, args.start_hour)
+        print('%d figures for %d scenarios in %.1f s' % (sum(len(f) for f in figures), len(files), time.time() - start))
+    else:
+        data = loadScenarioData('Baseline20.json')
+        a = ['pw', 'pbat', 'ppv', 'png', 'pzn', 'ploss']
+        plotDispatchCurves(data, a, 'Figures/PowerFlowsBaseline20.png', 1)
 
-data = loadScenarioData('Baseline20.json')
-a = ['pw', 'pbat', 'ppv', 'png', 'pzn', 'ploss']
-plotDispatchCurves(a, 'Figures/PowerFlowsBaseline20.png', 1)
-
-# batteries and zinc
-b = ['ubatdc', 'ubatc']
-plotDispatchCurves(b, 'Figures/BatteriesCharging.png', 0)
+        # batteries and zinc
+        b = ['ubatdc', 'ubatc']
+        plotDispatchCurves(data, b, 'Figures/BatteriesCharging.png', 0)
 
-b = ['uzndc', 'uznc', 'uznsold', 'xzn']
-plotDispatchCurves(b, 'Figures/ZincCharging.png', 0)
+        b = ['uzndc', 'uznc', 'uznsold', 'xzn']
+        plotDispatchCurves(data, b, 'Figures/ZincCharging.png', 0)
 
-print(sum(data['uznsold']))
+        print(sum(data['uznsold']))
 
 
-c = ['xbat', 'xzn']
-plotStorage(c, 'Figures/StoredEnergy.png')
+        c = ['xbat', 'xzn']
+        plotStorage(data, c, 'Figures/StoredEnergy.png')
 
-c = ['NGGenSize', 'PVSize', 'BatSize', 'WindSize', 'ZnSize', 'FCSize', 'ZnStorageSize']
-plotInstalledSizes(c, 'Figures/CapitalAssets.png')
+        c = ['NGGenSize', 'PVSize', 'BatSize', 'WindSize', 'ZnSize', 'FCSize', 'ZnStorageSize']
+        plotInstalledSizes(data, c, 'Figures/CapitalAssets.png')
 
-#s = ['LGHW20.json', 'Penetration_Scenarios/Baseline99.json']
+        #s = ['LGHW20.json', 'Penetration_Scenarios/Baseline99.json']
 
-#s = ['Penetration_Scenarios/Baseline20.json', 'Penetration_Scenarios/Baseline50.json', 'Penetration_Scenarios/Baseline70.json', 'Penetration_Scenarios/Baseline80.json', 'Penetration_Scenarios/Baseline90.json', 'Penetration_Scenarios/Baseline95.json', 'Penetration_Scenarios/Baseline99.json']
-#plotElecByType(s, 'Figures/ElecByType_Baseline.png')
+        #s = ['Penetration_Scenarios/Baseline20.json', 'Penetration_Scenarios/Baseline50.json', 'Penetration_Scenarios/Baseline70.json', 'Penetration_Scenarios/Baseline80.json', 'Penetration_Scenarios/Baseline90.json', 'Penetration_Scenarios/Baseline95.json', 'Penetration_Scenarios/Baseline99.json']
+        #plotElecByType(s, 'Figures/ElecByType_Baseline.png')
 
-#data = loadScenarioData('Penetration_Scenarios/Baseline99.json')
-#a = ['pw', 'pbat', 'ppv', 'png', 'pzn', 'ploss']
-#plotDispatchCurves(a, 'Figures/PowerFlowsBaseline99.png', 1)
+        #data = loadScenarioData('Penetration_Scenarios/Baseline99.json')
+        #a = ['pw', 'pbat', 'ppv', 'png', 'pzn', 'ploss']
+        #plotDispatchCurves(data, a, 'Figures/PowerFlowsBaseline99.png', 1)
 
-#s = ['Penetration_Scenarios/LGHW20.json', 'Penetration_Scenarios/LGHW50.json', 'Penetration_Scenarios/LGHW70.json', 'Penetration_Scenarios/LGHW80.json', 'Penetration_Scenarios/LGHW90.json', 'Penetration_Scenarios/LGHW95.json', 'Penetration_Scenarios/LGHW99.json']
-#plotElecByType(s, 'Figures/ElecByType_LGHW.png')
+        #s = ['Penetration_Scenarios/LGHW20.json', 'Penetration_Scenarios/LGHW50.json', 'Penetration_Scenarios/LGHW70.json', 'Penetration_Scenarios/LGHW80.json', 'Penetration_Scenarios/LGHW90.json', 'Penetration_Scenarios/LGHW95.json', 'Penetration_Scenarios/LGHW99.json']
+        #plotElecByType(s, 'Figures/ElecByType_LGHW.png')
 
-#s = ['Penetration_Scenarios/Low20.json', 'Penetration_Scenarios/Low50.json', 'Penetration_Scenarios/Low70.json', 'Penetration_Scenarios/Low80.json', 'Penetration_Scenarios/Low90.json', 'Penetration_Scenarios/Low95.json', 'Penetration_Scenarios/Low99.json']
-#plotElecByType(s, 'Figures/ElecByType_Low.png')
+        #s = ['Penetration_Scenarios/Low20.json', 'Penetration_Scenarios/Low50.json', 'Penetration_Scenarios/Low70.json', 'Penetration_Scenarios/Low80.json', 'Penetration_Scenarios/Low90.json', 'Penetration_Scenarios/Low95.json', 'Penetration_Scenarios/Low99.json']
+        #plotElecByType(s, 'Figures/ElecByType_Low.png')
 
-#s = ['Penetration_Scenarios/High20.json', 'Penetration_Scenarios/High50.json', 'Penetration_Scenarios/High70.json', 'Penetration_Scenarios/High80.json', 'Penetration_Scenarios/High90.json', 'Penetration_Scenarios/High95.json', 'Penetration_Scenarios/High99.json']
-#plotElecByType(s, 'Figures/ElecByType_High.png')
+        #s = ['Penetration_Scenarios/High20.json', 'Penetration_Scenarios/High50.json', 'Penetration_Scenarios/High70.json', 'Penetration_Scenarios/High80.json', 'Penetration_Scenarios/High90.json', 'Penetration_Scenarios/High95.json', 'Penetration_Scenarios/High99.json']
+        #plotElecByType(s, 'Figures/ElecByType_High.png')
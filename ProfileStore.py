@@ -0,0 +1,112 @@
+# Cached binary store of the hourly input profiles
+# The input csv files are parsed once into aligned, hour-indexed arrays (already scaled the way the model uses them)
+# and saved as .npy files under Profile_Cache/<hash of the csv contents>/. Later runs memory-map those files instead of
+# parsing the csv files again, and editing any csv file changes the hash, so stale arrays are never read.
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+csvFiles = {
+    'solar': 'CSV_Files/Solar1p5MW.csv',
+    'wind': 'CSV_Files/Wind1p5MW.csv',
+    'load': 'CSV_Files/HourlyTxScenDemand2018-Notional.csv',
+    'ngPrice': 'CSV_Files/HourlyNatGasPrices2018.csv',
+}
+
+cacheDir = 'Profile_Cache'
+
+# bump when the conversion below changes, so existing caches are rebuilt
+formatVersion = 2
+
+# the files don't all hold the same number of hours (the demand file stops 47 hours short of a year), so every profile is
+# cut to the shortest of them, and at most one year, so that hour t of each profile is the same hour of the year and
+# horizons that wrap around the end of the data wrap every profile at the same point
+yearHours = 8760
+
+# arrays already opened by this process, keyed by content hash, and hashes already computed, keyed by file size and mtime
+opened = {}
+hashed = {}
+
+def contentHash():
+    stamp = tuple((os.stat(f).st_size, os.stat(f).st_mtime_ns) for f in sorted(csvFiles.values()))
+    if stamp not in hashed:
+        hashed[stamp] = hashFiles()
+    return hashed[stamp]
+
+def hashFiles():
+    h = hashlib.sha256(str(formatVersion).encode())
+    for name in sorted(csvFiles):
+        with open(csvFiles[name], 'rb') as f:
+            h.update(name.encode())
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+# parse the csv files with the same scaling and offsets as the Param initializers in SystemModel
+def parseProfiles():
+    solarData = pd.read_csv(csvFiles['solar'])
+    windData = pd.read_csv(csvFiles['wind'])
+    loadData = pd.read_csv(csvFiles['load'])
+    ngPrice = pd.read_csv(csvFiles['ngPrice'])
+    profiles = {
+        'Epv': solarData['System power generated | (kW)'].to_numpy(dtype = float)/1500, # per kW of installed solar capacity
+        'Ew': windData['System power generated | (kW)'].to_numpy(dtype = float)/1500, # per kW of installed wind capacity
+        'Eload': loadData.demand.to_numpy(dtype = float)*1000, # converts from MW to kW
+        'NGPrice': ngPrice.iloc[:, 1].to_numpy(dtype = float)/297.395, # converts $/cu ft to $/kWh (the file has no header, so its first hour is skipped)
+    }
+    hours = min([yearHours] + [len(arr) for arr in profiles.values()])
+    return {name: arr[:hours] for name, arr in profiles.items()}
+
+# write the arrays to a temporary directory and move it into place, so parallel runs never see a half-written store
+def buildStore(key):
+    target = os.path.join(cacheDir, key)
+    tmp = target + '.tmp%d' % os.getpid()
+    os.makedirs(tmp, exist_ok = True)
+    profiles = parseProfiles()
+    for name, arr in profiles.items():
+        np.save(os.path.join(tmp, name + '.npy'), arr)
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as fp:
+        json.dump({'hash': key, 'formatVersion': formatVersion, 'files': csvFiles, 'hours': {n: len(a) for n, a in profiles.items()}}, fp, indent = 1)
+    try:
+        os.rename(tmp, target)
+    except OSError:
+        # another process built the same store first
+        shutil.rmtree(tmp, ignore_errors = True)
+
+# the hourly profiles {'Epv', 'Ew', 'Eload', 'NGPrice'} as read-only memory-mapped arrays; with T, the first T hours
+# (views, nothing is copied) or, for horizons longer than the data, the year repeated
+# start skips the first hours, and step > 1 gives T periods that are each the average of step hours
+def getProfiles(T = None, start = 0, step = 1):
+    key = contentHash()
+    if key not in opened:
+        d = os.path.join(cacheDir, key)
+        if not os.path.exists(os.path.join(d, 'manifest.json')):
+            buildStore(key)
+        opened[key] = {name: np.load(os.path.join(d, name + '.npy'), mmap_mode = 'r') for name in ['Epv', 'Ew', 'Eload', 'NGPrice']}
+        assert len(set(len(arr) for arr in opened[key].values())) == 1, 'profiles in %s have different lengths' % d
+    profiles = opened[key]
+    if T is None:
+        return dict(profiles)
+    if start == 0 and step == 1:
+        return {name: (arr[:T] if len(arr) >= T else np.resize(arr, T)) for name, arr in profiles.items()}
+    return {name: aggregate(arr, T, start, step) for name, arr in profiles.items()}
+
+# T averages of step consecutive hours of arr, starting at hour start (wrapping around the end of the year)
+def aggregate(arr, T, start, step):
+    hours = np.arange(start, start + T*step)
+    return np.take(arr, hours, mode = 'wrap').reshape(T, step).mean(axis = 1)
+
+# remove cached stores that no longer match the csv files
+def clean():
+    key = contentHash()
+    if os.path.isdir(cacheDir):
+        for d in os.listdir(cacheDir):
+            if d != key:
+                shutil.rmtree(os.path.join(cacheDir, d), ignore_errors = True)
+
+if __name__ == '__main__':
+    clean()
+    for name, arr in getProfiles().items():
+        print(name, len(arr), 'hours')
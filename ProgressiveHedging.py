@@ -0,0 +1,227 @@
+# Progressive hedging for the stochastic model with many scenarios
+# Instead of one extensive-form LP (StochasticModel.py), every scenario is solved as its own sizing plus dispatch LP, and
+# the capital asset sizes are pulled towards their probability-weighted average between iterations by a price on each
+# size (w) and a proximal penalty on the distance from the average. HiGHS only has an active-set QP solver, which
+# fails on these models, so the quadratic penalty rho/2 (y - ybar)^2 is replaced by a piecewise linear one with the
+# same slope at the middle of each segment, and every subproblem stays an LP.
+#
+# The scenarios are split between worker processes, one per core by default. Each worker keeps a HiGHS model per
+# scenario for the whole run and only changes costs and bounds between iterations, so every re-solve starts from the
+# previous basis. When the sizes agree, each scenario's dispatch is evaluated at one common design.
+# A re-solve often takes 0 simplex iterations: the sizes sit on a breakpoint of the piecewise linear penalty, and the new
+# prices leave the previous basis optimal (solving those LPs from scratch gives the same objectives).
+# If maxIterations runs out before the sizes agree within tolerance, converged is False and the common design is only
+# the average of sizes that still differ; SystemModel then doesn't cache the result. A subproblem that isn't Optimal,
+# in any iteration or at the common design, raises a RuntimeError naming the scenarios.
+import os
+import time
+import multiprocessing
+import numpy as np
+import scipy.sparse as sp
+
+import MatrixModel
+import StochasticModel
+from MatrixModel import sizeVars, hourlyVars
+
+class ScenarioSubproblem:
+    def __init__(self, params, profiles, minimumRenewableElec, T, timeStep, segments, threads):
+        m = MatrixModel.MatrixBilevelModel(params, profiles, minimumRenewableElec, T, timeStep)
+        self.m = m
+        self.segments = K = segments
+        nS = len(sizeVars)
+
+        # penalty columns: K segments above and K below the average of each size, in rows y - up + down = ybar
+        self.upCols = m.nCols + np.arange(nS*K).reshape(nS, K)
+        self.downCols = m.nCols + nS*K + np.arange(nS*K).reshape(nS, K)
+        self.proxRows = m.nRows + np.arange(nS)
+        nCols = m.nCols + 2*nS*K
+        rows = np.concatenate([np.arange(nS), np.repeat(np.arange(nS), K), np.repeat(np.arange(nS), K)])
+        cols = np.concatenate([np.arange(nS), self.upCols.reshape(-1), self.downCols.reshape(-1)])
+        vals = np.concatenate([np.ones(nS), -np.ones(nS*K), np.ones(nS*K)])
+        B = sp.csr_matrix((vals, (rows, cols)), shape = (nS, nCols))
+        A = sp.vstack([sp.hstack([m.A, sp.csr_matrix((m.nRows, 2*nS*K))]), B])
+
+        # no penalty at first: free penalty rows and columns
+        c = np.concatenate([m.c, np.zeros(2*nS*K)])
+        colLower = np.concatenate([m.colLower, np.zeros(2*nS*K)])
+        colUpper = np.concatenate([m.colUpper, np.full(2*nS*K, np.inf)])
+        rowLower = np.concatenate([m.rowLower, np.full(nS, -np.inf)])
+        rowUpper = np.concatenate([m.rowUpper, np.full(nS, np.inf)])
+        self.h = MatrixModel.highsModel(c, A, rowLower, rowUpper, colLower, colUpper, {'threads': threads})
+        self.sizeCosts = m.c[:nS]
+
+    def change(self, cols, cost = None, lower = None, upper = None):
+        cols = np.asarray(cols, dtype = np.int32).reshape(-1)
+        if cost is not None:
+            self.h.changeColsCost(len(cols), cols, np.broadcast_to(np.asarray(cost, dtype = float).reshape(-1), cols.shape).copy())
+        if lower is not None:
+            self.h.changeColsBounds(len(cols), cols, np.broadcast_to(np.asarray(lower, dtype = float).reshape(-1), cols.shape).copy(),
+                np.broadcast_to(np.asarray(upper, dtype = float).reshape(-1), cols.shape).copy())
+
+    # price w on the sizes and a penalty of slope rho*(k + 1/2)*width on the k-th segment of width `width` away from ybar
+    def setPenalty(self, ybar, w, rho, width):
+        nS, K = len(sizeVars), self.segments
+        self.change(np.arange(nS), cost = self.sizeCosts + w)
+        slopes = rho[:, None] * (np.arange(K) + 0.5)[None, :] * width[:, None]
+        upper = np.repeat(width[:, None], K, axis = 1)
+        upper[:, -1] = np.inf # the last segment continues linearly
+        for cols in [self.upCols, self.downCols]:
+            self.change(cols, cost = slopes, lower = 0, upper = upper)
+        self.h.changeRowsBounds(nS, self.proxRows.astype(np.int32), ybar.astype(float), ybar.astype(float))
+
+    def run(self):
+        self.h.run()
+        x = np.array(self.h.getSolution().col_value)
+        info = self.h.getInfo()
+        return {'x': x[:self.m.nCols], 'y': x[:len(sizeVars)], 'objective': float(self.m.c @ x[:self.m.nCols]),
+            'status': self.h.modelStatusToString(self.h.getModelStatus()), 'iterations': info.simplex_iteration_count}
+
+    # dispatch with the sizes at least `lower` (and at most `upper`), without prices or penalties
+    def evaluate(self, lower, upper):
+        nS, K = len(sizeVars), self.segments
+        self.change(np.arange(nS), cost = self.sizeCosts, lower = lower, upper = upper)
+        for cols in [self.upCols, self.downCols]:
+            self.change(cols, cost = 0, lower = 0, upper = np.inf)
+        self.h.changeRowsBounds(nS, self.proxRows.astype(np.int32), np.full(nS, -np.inf), np.full(nS, np.inf))
+        return self.run()
+
+# worker process: builds its scenarios' subproblems once, then answers requests from the master until told to stop
+def workerLoop(conn, params, scenarios, minimumRenewableElec, T, timeStep, segments, threads):
+    subproblems = {s: ScenarioSubproblem(params, profiles, minimumRenewableElec, T, timeStep, segments, threads) for s, profiles in scenarios.items()}
+    while True:
+        command, args = conn.recv()
+        if command == 'stop':
+            break
+        results = {}
+        for s, sub in subproblems.items():
+            if command == 'solve':
+                if args is not None:
+                    ybar, W, rho, width = args
+                    sub.setPenalty(ybar, W[s], rho, width)
+                results[s] = sub.run()
+            elif command == 'evaluate':
+                results[s] = sub.evaluate(*args)
+            if command != 'evaluate':
+                results[s].pop('x') # only the final dispatch is sent back
+        conn.send(results)
+    conn.close()
+
+# raise if any scenario's subproblem isn't Optimal, naming the scenarios and their statuses
+def checkOptimal(results, when):
+    failed = ['%d (%s)' % (s, r['status']) for s, r in enumerate(results) if r['status'] != 'Optimal']
+    if failed:
+        raise RuntimeError('scenario subproblems not solved %s: %s' % (when, ', '.join(failed)))
+
+class ProgressiveHedgingModel:
+    def __init__(self, params, scenarios, weights, minimumRenewableElec, T, timeStep = 1):
+        self.params = params
+        self.scenarios = scenarios
+        self.N = len(scenarios)
+        weights = np.ones(self.N) if weights is None else np.asarray(weights, dtype = float)
+        self.weights = weights / weights.sum()
+        self.renMin = minimumRenewableElec
+        self.T = T
+        self.timeStep = timeStep
+
+    @classmethod
+    def fromFiles(cls, scenarioFile, minimumRenewableElec, T, startHour = 0, timeStep = 1, shifts = None, weights = None, loadSigma = 0.0, priceSigma = 0.0, seed = 0):
+        scenarios = StochasticModel.makeScenarios(T, shifts, loadSigma, priceSigma, seed, startHour, timeStep)
+        return cls(MatrixModel.readScenarioParams(scenarioFile), scenarios, weights, minimumRenewableElec, T, timeStep)
+
+    # send a command to every worker and collect the per-scenario results, in scenario order
+    def request(self, command, args = None):
+        for conn in self.conns:
+            conn.send((command, args))
+        results = {}
+        for conn in self.conns:
+            results.update(conn.recv())
+        return [results[s] for s in range(self.N)]
+
+    def solve(self, workers = None, threads = 1, rhoFactor = 1.0, maxIterations = 50, tolerance = 1e-3, segments = 8):
+        workers = workers or max(1, min(self.N, (os.cpu_count() or 1) // threads))
+        ctx = multiprocessing.get_context('spawn')
+        self.conns, processes = [], []
+        for k in range(workers):
+            mine = {s: self.scenarios[s] for s in range(k, self.N, workers)}
+            parent, child = ctx.Pipe()
+            p = ctx.Process(target = workerLoop, args = (child, self.params, mine, self.renMin, self.T, self.timeStep, segments, threads), daemon = True)
+            p.start()
+            self.conns.append(parent)
+            processes.append(p)
+
+        start = time.time()
+        p = self.weights
+        try:
+            # iteration 0: every scenario sized on its own; the weighted average of those optima is a lower bound
+            results = self.request('solve')
+            checkOptimal(results, 'on their own')
+            Y = np.array([r['y'] for r in results])
+            self.lowerBound = p @ np.array([r['objective'] for r in results])
+            ybar = p @ Y
+
+            # rho per size from its cost and the spread of the scenario optima, and penalty segments covering that spread
+            c1 = MatrixModel.firstStageCosts(self.params)
+            c1 = np.where(c1 > 0, c1, c1[c1 > 0].mean() if (c1 > 0).any() else 1.0)
+            spread = np.abs(Y - ybar).max(axis = 0)
+            rho = rhoFactor * c1 / np.maximum(spread, 1)
+            width = np.maximum(2 * spread / segments, np.maximum(1e-3 * np.abs(ybar), 1))
+            W = rho * (Y - ybar)
+
+            self.history = []
+            for it in range(1, maxIterations + 1):
+                results = self.request('solve', (ybar, W, rho, width))
+                checkOptimal(results, 'in iteration %d' % it)
+                Y = np.array([r['y'] for r in results])
+                ybar = p @ Y
+                W = W + rho * (Y - ybar)
+                # weighted distance of the scenario sizes from their average, relative to the average
+                convergence = float(p @ np.abs(Y - ybar).sum(axis = 1)) / max(1, np.abs(ybar).sum())
+                self.history.append({'iteration': it, 'convergence': convergence, 'ybar': ybar.tolist(),
+                    'expectedObjective': float(p @ np.array([r['objective'] for r in results])),
+                    'simplexIterations': int(sum(r['iterations'] for r in results)), 'seconds': time.time() - start})
+                print('iteration %d: convergence %.2e, expected cost %.6g, %d simplex iterations' % (it, convergence,
+                    self.history[-1]['expectedObjective'], self.history[-1]['simplexIterations']))
+                if convergence <= tolerance:
+                    break
+            self.convergence = convergence
+            self.converged = convergence <= tolerance
+            if not self.converged:
+                print('progressive hedging did not converge: %.2e after %d iterations (tolerance %.0e)' % (convergence, maxIterations, tolerance))
+
+            # one design for every scenario: the average sizes, or where a scenario can't be dispatched with those, the
+            # largest sizes any scenario needs at or above the average; then each scenario's dispatch with the design fixed
+            self.design = ybar
+            self.final = self.request('evaluate', (ybar, ybar))
+            if any(r['status'] != 'Optimal' for r in self.final):
+                results = self.request('evaluate', (ybar, np.full(len(sizeVars), np.inf)))
+                checkOptimal(results, 'with the sizes at or above the average')
+                self.design = np.max([r['y'] for r in results], axis = 0)
+                self.final = self.request('evaluate', (self.design, self.design))
+            checkOptimal(self.final, 'at the common design')
+            self.objectiveValue = float(p @ np.array([r['objective'] for r in self.final]))
+            print('expected cost %.6g at the common design, lower bound %.6g' % (self.objectiveValue, self.lowerBound))
+        finally:
+            for conn in self.conns:
+                try:
+                    conn.send(('stop', None))
+                except OSError:
+                    pass # the worker already exited
+            for proc in processes:
+                proc.join()
+        return self.toSolutionDict()
+
+    # the common design and every scenario's dispatch, named like StochasticModel.toSolutionDict
+    def toSolutionDict(self):
+        outFile = {}
+        for k, name in enumerate(sizeVars):
+            outFile[name] = [float(self.design[k])]
+        for s, r in enumerate(self.final):
+            suffix = '' if s == 0 else '_s%d' % s
+            for k, name in enumerate(hourlyVars):
+                start = len(sizeVars) + k*self.T
+                outFile[name + suffix] = r['x'][start:start + self.T].tolist()
+        return outFile
+
+if __name__ == '__main__':
+    ph = ProgressiveHedgingModel.fromFiles('Cost_Baselines/BaselineScenario.dat', 0.5, 24*7*4, shifts = [168*k for k in range(16)])
+    ph.solve()
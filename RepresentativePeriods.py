@@ -0,0 +1,292 @@
+# Representative-period (clustered days or weeks) version of the matrix model for fast screening runs
+# The hourly demand, solar and wind profiles are cut into days or weeks and clustered into k representative periods
+# (k-means or k-medoids). Dispatch is only modeled for the representative periods, with each one weighted by the number
+# of periods it stands for. Zinc storage is linked across the year by a state for every original period that moves by
+# the net change of its representative period (intra/inter-period storage), so seasonal zinc stock can still build up.
+# xbat has no time coupling in the full model (batTime adds no rows), so the reduced model keeps only its hourly bounds.
+# The period with the highest net load and the one with the least wind and solar are always kept as extra representatives.
+#
+# Expected error against the full year (BaselineScenario, renMin 0.2; 0.9 is within a few points), from compareWithFullYear
+# with k = 12 or 48 days or 8 weeks, plus the two extremes:
+#   12 days, kmedoids   objective -6.9%   NGGenSize -14.5%  WindSize -14.6%  PVSize -31%
+#   48 days, kmedoids   objective -1.3%   NGGenSize  -1.9%  WindSize  +2.7%  PVSize -14%
+#    8 weeks, kmedoids  objective -2.9%   NGGenSize  -1.9%  WindSize  +9.0%  PVSize -22%
+#   12 days, kmeans     objective -14.5%  NGGenSize -14.0%  WindSize -16.7%  PVSize -100%
+# The error is almost all in gas fuel and the renewable sizes: averaging smooths out the low-wind hours that gas covers,
+# and k-means centers (the average of many days) more so than k-medoids (one actual day), so k-medoids is the default.
+# Zinc sizes are within 0.1%. Use it to screen scenarios, not to size them.
+import time
+import numpy as np
+
+import MatrixModel
+from MatrixModel import RowBlocks, sizeVars, hourlyVars
+
+# cluster the rows of `features` with k-means (Lloyd's algorithm with k-means++ seeding); returns labels and centers
+def kMeans(features, k, seed = 0, iterations = 100):
+    rng = np.random.default_rng(seed)
+    centers = kMeansPlusPlus(features, k, rng)
+    labels = np.zeros(len(features), dtype = int)
+    for it in range(iterations):
+        d = ((features[:, None, :] - centers[None, :, :])**2).sum(axis = 2)
+        newLabels = d.argmin(axis = 1)
+        if it > 0 and (newLabels == labels).all():
+            break
+        labels = newLabels
+        for c in range(k):
+            members = features[labels == c]
+            if len(members):
+                centers[c] = members.mean(axis = 0)
+            else:
+                # restart an empty cluster at the period furthest from its center
+                far = d.min(axis = 1).argmax()
+                centers[c] = features[far]
+    return labels, centers
+
+# cluster with k-medoids (alternating assignment and medoid update); returns labels and the medoid period of each cluster
+def kMedoids(features, k, seed = 0, iterations = 100):
+    rng = np.random.default_rng(seed)
+    dist = np.sqrt(((features[:, None, :] - features[None, :, :])**2).sum(axis = 2))
+    centers = kMeansPlusPlus(features, k, rng)
+    medoids = np.array([((features - c)**2).sum(axis = 1).argmin() for c in centers])
+    for it in range(iterations):
+        labels = dist[:, medoids].argmin(axis = 1)
+        newMedoids = medoids.copy()
+        for c in range(k):
+            members = np.flatnonzero(labels == c)
+            if len(members):
+                newMedoids[c] = members[dist[np.ix_(members, members)].sum(axis = 1).argmin()]
+        if (newMedoids == medoids).all():
+            break
+        medoids = newMedoids
+    return dist[:, medoids].argmin(axis = 1), medoids
+
+def kMeansPlusPlus(features, k, rng):
+    centers = [features[rng.integers(len(features))]]
+    for c in range(1, k):
+        d = np.min([((features - x)**2).sum(axis = 1) for x in centers], axis = 0)
+        centers.append(features[rng.choice(len(features), p = d/d.sum())] if d.sum() > 0 else features[rng.integers(len(features))])
+    return np.array(centers, dtype = float)
+
+# split k clusters between groups of the given sizes, in proportion to size, with at least one per group
+def splitClusters(k, counts):
+    kGroup = np.maximum(1, np.floor(k * counts / counts.sum())).astype(int)
+    remainder = k * counts / counts.sum() - kGroup
+    for g in np.argsort(-remainder):
+        if kGroup.sum() >= k:
+            break
+        kGroup[g] += 1
+    return np.minimum(kGroup, counts)
+
+# the periods that size the firm capacity, which averaging into a cluster would smooth away: the one with the highest
+# hourly net load (with wind and solar scaled to supply the total demand) and the one with the least renewable output
+def extremePeriods(shaped):
+    renewable = shaped['Epv'] + shaped['Ew']
+    netLoad = shaped['Eload'] - renewable * shaped['Eload'].sum() / max(renewable.sum(), 1e-12)
+    return list(dict.fromkeys([int(netLoad.max(axis = 1).argmax()), int(renewable.sum(axis = 1).argmin())]))
+
+# cluster the periods of the horizon; returns the cluster of every original period and the representative profiles
+# (k periods of periodLength hours each, concatenated) in the same form as MatrixModel.loadProfiles
+# with extremes = True, the periods of extremePeriods are kept as representatives of their own, in addition to the k
+def clusterPeriods(profiles, T, k, periodLength = 24, method = 'kmedoids', seed = 0, extremes = True):
+    nPeriods = T // periodLength
+    shaped = {name: np.asarray(v[:nPeriods*periodLength]).reshape(nPeriods, periodLength) for name, v in profiles.items()}
+    extreme = extremePeriods(shaped) if extremes else []
+    clustered = np.ones(nPeriods, dtype = bool)
+    clustered[extreme] = False
+
+    # demand, solar and wind define the clusters, each scaled to [0, 1] so they count equally
+    features = []
+    for name in ['Eload', 'Epv', 'Ew']:
+        x = shaped[name]
+        span = x.max() - x.min()
+        features.append((x - x.min())/(span if span > 0 else 1))
+    features = np.hstack(features)
+
+    if method not in ['kmeans', 'kmedoids']:
+        raise ValueError('unknown clustering method ' + method)
+
+    # periods with different zinc overtime hours (weekdays and weekends) are clustered separately, so every
+    # representative period has exactly the overtime hours of its members; k is split between them by size
+    patterns, group = np.unique(shaped['ZnOT'], axis = 0, return_inverse = True)
+    group = group.reshape(-1)
+    counts = np.bincount(group[clustered], minlength = len(patterns))
+    kGroup = splitClusters(k, counts)
+
+    labels = np.zeros(nPeriods, dtype = int)
+    medoids = []
+    offset = 0
+    for g in range(len(counts)):
+        members = np.flatnonzero((group == g) & clustered)
+        if len(members) == 0:
+            continue
+        if method == 'kmeans':
+            local, centers = kMeans(features[members], kGroup[g], seed)
+        else:
+            local, m = kMedoids(features[members], kGroup[g], seed)
+            medoids.extend(members[m])
+        labels[members] = offset + local
+        offset += kGroup[g]
+    for period in extreme:
+        labels[period] = offset
+        medoids.append(period)
+        offset += 1
+    medoids = np.array(medoids, dtype = int)
+
+    # drop clusters that ended up empty
+    used = np.unique(labels)
+    labels = np.searchsorted(used, labels)
+    k = len(used)
+
+    rep = {}
+    for name, x in shaped.items():
+        if method == 'kmedoids' and name in ['Eload', 'Epv', 'Ew']:
+            rep[name] = x[medoids[used]].reshape(-1)
+        else:
+            # k-means centers, and for both methods the cost coefficients (NGPrice, ZnOT), are cluster averages so the
+            # weighted cost of a representative period equals the summed cost of its members for the same dispatch
+            rep[name] = np.array([x[labels == c].mean(axis = 0) for c in range(k)]).reshape(-1)
+    return labels, rep
+
+class ReducedBilevelModel(MatrixModel.MatrixBilevelModel):
+    def __init__(self, params, profiles, minimumRenewableElec, T, k = 12, periodLength = 24, method = 'kmedoids', seed = 0, extremes = True):
+        self.fullProfiles = profiles
+        self.fullT = T
+        self.periodLength = periodLength
+        self.labels, rep = clusterPeriods(profiles, T, k, periodLength, method, seed, extremes)
+        self.k = int(self.labels.max()) + 1
+        self.nPeriods = len(self.labels)
+        self.weights = np.bincount(self.labels, minlength = self.k).astype(float)
+        super().__init__(params, rep, minimumRenewableElec, self.k * periodLength)
+
+    @classmethod
+    def fromFiles(cls, scenarioFile, minimumRenewableElec, T, k = 12, periodLength = 24, method = 'kmedoids', seed = 0, extremes = True):
+        return cls(MatrixModel.readScenarioParams(scenarioFile), MatrixModel.loadProfiles(T), minimumRenewableElec, T, k, periodLength, method, seed, extremes)
+
+    def build(self):
+        p, col = self.params, self.colIndex
+        n, L, k, D = self.T, self.periodLength, self.k, self.nPeriods
+        Epv, Ew, Eload = self.profiles['Epv'], self.profiles['Ew'], self.profiles['Eload']
+        inf = np.inf
+
+        # extra columns for zinc storage: end-of-period intra state, intra min/max per cluster, and the state at the
+        # start of every original period (plus one for the end of the horizon)
+        nextCol = self.nCols
+        for name, size in [('xznEnd', k), ('znMin', k), ('znMax', k), ('znInter', D+1)]:
+            col[name] = np.arange(nextCol, nextCol + size)
+            nextCol += size
+        self.nCols = nextCol
+
+        hour = np.arange(n)
+        cluster = hour // L
+        inner = hour[hour % L != L-1] # hours followed by another hour of the same period
+        last = hour[hour % L == L-1]
+        hourWeight = self.weights[cluster]
+        FT = self.fullT
+
+        L_total = self.fullProfiles['Eload'][:FT-1].sum()
+        self.totalElecRen = (L_total + (101000000 * 4.8 * FT/8760)) * self.renMin
+
+        r = RowBlocks()
+        r.add('renewablePVLimits', [(col['ppv'], 1), (col['PVSize'], -Epv)], -inf, 0)
+        r.add('renewableWindLimits', [(col['pw'], 1), (col['WindSize'], -Ew)], -inf, 0)
+        r.addSum('renewableMinimum', np.concatenate([col['ppv'], col['pw']]), np.concatenate([hourWeight, hourWeight]), self.totalElecRen, inf)
+        r.add('ngMax', [(col['png'], 1), (col['NGGenSize'], -1)], -inf, 0)
+        r.add('ngTime', [(col['png'][inner+1], 1), (col['png'][inner], -1), (col['ung'][inner], -1)], 0, 0)
+        r.add('ngRampLimit', [(col['ung'], 1), (col['NGGenSize'], -1)], -inf, 0)
+        r.add('ngThrottleLimit', [(col['ung'], 1), (col['NGGenSize'], 1)], 0, inf)
+        r.add('batMin', [(col['xbat'], 1), (col['BatSize'], -0.2)], 0, inf)
+        r.add('batMax', [(col['xbat'], 1), (col['BatSize'], -1)], -inf, 0)
+        r.add('batPower', [(col['ubatdc'], p['Bateff']), (col['ubatc'], -1), (col['pbat'], -1)], 0, 0)
+        r.add('chargeMax', [(col['ubatc'], 1), (col['BatSize'], -0.25)], -inf, 0)
+        r.add('dischargeMax', [(col['ubatdc'], 1), (col['BatSize'], -0.25)], -inf, 0)
+        # like the full model's znProdQuota, the sales in the last hour of the horizon don't count towards the quota
+        quotaWeight = hourWeight.copy()
+        if D * L == FT:
+            quotaWeight[self.labels[-1]*L + L-1] -= 1
+        r.addSum('znProdQuota', col['uznsold'], quotaWeight, 101000000*FT/8760, inf)
+        r.addSum('znProdMax', col['uznsold'], hourWeight, -inf, 200000000*FT/8760)
+
+        # intra-period zinc state starts each representative period at zero and is bounded through its min/max
+        r.add('znStart', [(col['xzn'][hour % L == 0], 1)], 0, 0)
+        r.add('znIntraMin', [(col['xzn'], 1), (col['znMin'][cluster], -1)], 0, inf)
+        r.add('znIntraMax', [(col['xzn'], 1), (col['znMax'][cluster], -1)], -inf, 0)
+        r.add('znEndMin', [(col['xznEnd'], 1), (col['znMin'], -1)], 0, inf)
+        r.add('znEndMax', [(col['xznEnd'], 1), (col['znMax'], -1)], -inf, 0)
+        r.add('znTime', [(col['xzn'][inner+1], 1), (col['xzn'][inner], -1), (col['uzndc'][inner], 1),
+            (col['uznc'][inner], -p['Zneff']), (col['uznsold'][inner], 1)], 0, 0)
+        r.add('znTimeEnd', [(col['xznEnd'], 1), (col['xzn'][last], -1), (col['uzndc'][last], 1),
+            (col['uznc'][last], -p['Zneff']), (col['uznsold'][last], 1)], 0, 0)
+
+        # inter-period zinc state: starts at zero, moves by the net change of each period's representative,
+        # and stays within [0, ZnStorageSize] through the period's intra min/max
+        periods = np.arange(D)
+        r.addSum('znInterStart', [col['znInter'][0]], 1, 0, 0)
+        r.add('znInterTime', [(col['znInter'][periods+1], 1), (col['znInter'][periods], -1), (col['xznEnd'][self.labels], -1)], 0, 0)
+        r.add('znInterMin', [(col['znInter'][periods], 1), (col['znMin'][self.labels], 1)], 0, inf)
+        r.add('znInterMax', [(col['znInter'][periods], 1), (col['znMax'][self.labels], 1), (col['ZnStorageSize'], -1)], -inf, 0)
+
+        r.add('cantbuy', [(col['uznsold'], 1)], 0, inf)
+        r.add('znForSale', [(col['uznsold'], 1), (col['ZnStorageSize'], -1)], -inf, 0)
+        r.add('znPower', [(col['uzndc'], p['PEMeff']), (col['uznc'], -1), (col['pzn'], -1)], 0, 0)
+        r.add('ZnChargeMax', [(col['uznc'], 1), (col['ZnSize'], -1)], -inf, 0)
+        r.add('ZnDischargeMax', [(col['uzndc'], 1), (col['FCSize'], -1/p['PEMeff'])], -inf, 0)
+        r.add('meetDemand', [(col['png'], 2), (col['ppv'], 1), (col['pw'], 1), (col['pbat'], 1), (col['pzn'], 1), (col['ploss'], 1)], Eload, Eload)
+
+        self.A, self.rowLower, self.rowUpper = r.matrix(self.nCols)
+        self.rowBlocks = r.blocks
+        self.nRows = r.n
+
+        self.colLower = np.zeros(self.nCols)
+        for name in MatrixModel.freeVars + ['xzn', 'xznEnd', 'znMin', 'znMax']:
+            self.colLower[col[name]] = -inf
+        self.colUpper = np.full(self.nCols, inf)
+
+        # hourly costs count once for every period a representative period stands for
+        self.c = self.objective()
+        for name in hourlyVars:
+            self.c[col[name]] *= hourWeight
+
+    # map the representative-period dispatch back onto every hour of the horizon, in the same form SystemModel saves
+    def toSolutionDict(self, x):
+        L, col = self.periodLength, self.colIndex
+        outFile = {}
+        for name in sizeVars:
+            outFile[name] = [float(x[col[name]])]
+        for name in hourlyVars:
+            rep = x[col[name]].reshape(self.k, L)
+            series = rep[self.labels]
+            if name == 'xzn':
+                series = series + x[col['znInter']][:-1, None]
+            outFile[name] = series.reshape(-1).tolist()
+        return outFile
+
+# solve the full-year matrix model and a representative-period model, and report the error in the capacity results
+def compareWithFullYear(scenarioFile, minimumRenewableElec, k = 12, periodLength = 24, method = 'kmedoids', T = 24*7*51, seed = 0, extremes = True):
+    params = MatrixModel.readScenarioParams(scenarioFile)
+    profiles = MatrixModel.loadProfiles(T)
+
+    start = time.time()
+    full = MatrixModel.MatrixBilevelModel(params, profiles, minimumRenewableElec, T)
+    fullOut = full.solve()
+    fullSeconds = time.time() - start
+
+    start = time.time()
+    reduced = ReducedBilevelModel(params, profiles, minimumRenewableElec, T, k, periodLength, method, seed, extremes)
+    reducedOut = reduced.solve()
+    reducedSeconds = time.time() - start
+
+    report = {'k': reduced.k, 'periodLength': periodLength, 'method': method,
+        'fullSeconds': fullSeconds, 'reducedSeconds': reducedSeconds,
+        'fullObjective': full.objectiveValue, 'reducedObjective': reduced.objectiveValue,
+        'objectiveError': (reduced.objectiveValue - full.objectiveValue)/abs(full.objectiveValue), 'sizes': {}}
+    print('%-14s %14s %14s %10s' % ('asset', 'full year', 'reduced', 'error'))
+    for name in sizeVars:
+        a, b = fullOut[name][0], reducedOut[name][0]
+        err = (b - a)/abs(a) if abs(a) > 1e-6 else b - a
+        report['sizes'][name] = {'full': a, 'reduced': b, 'error': err}
+        print('%-14s %14.1f %14.1f %9.1f%%' % (name, a, b, 100*err))
+    print('objective error %.2f%%, solve time %.1f s (full) vs %.1f s (reduced)' % (100*report['objectiveError'], fullSeconds, reducedSeconds))
+    return report
+
+if __name__ == '__main__':
+    compareWithFullYear('Cost_Baselines/BaselineScenario.dat', 0.2)
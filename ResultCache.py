@@ -0,0 +1,157 @@
+# Content-addressed cache of scenario solutions
+# A solve is keyed by the contents of its scenario file (and of the base scenarios of an overlay), the hash of the input
+# csv files, renMin, the horizon T (with its start hour and time step), the model formulation version and the
+# construction mode. When the key is already in Result_Cache/ the stored
+# solution is copied to the output file instead of solving again. The cache is kept under a size limit by evicting
+# the least recently used entries.
+#
+#   python ResultCache.py list
+#   python ResultCache.py prune [--max-bytes N]
+#   python ResultCache.py clear
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import numpy as np
+
+import ProfileStore
+import ScenarioParams
+import SolutionFile
+
+cacheDir = 'Result_Cache'
+
+# bump whenever the constraints or objective of a construction change, so older solutions are no longer reused
+# 2: the clustered zinc quota weights and extreme periods, and the Benders last-hour zinc sales
+formulationVersion = 2
+
+# default size limit, can be set with RESULT_CACHE_MAX_BYTES
+maxBytes = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 2 * 1024**3))
+
+def scenarioKey(scenarioFile, minimumRenewableElec, T, construction = 'pyomo', constructionOptions = None, startHour = 0, timeStep = 1):
+    h = hashlib.sha256()
+    for fileName in ScenarioParams.sourceFiles(scenarioFile): # an overlay and every scenario under it
+        with open(fileName, 'rb') as f:
+            h.update(f.read())
+    # the pyomo and matrix constructions build the same LP, so they share entries
+    kind = 'full' if construction in ['pyomo', 'matrix'] else construction
+    h.update(json.dumps({'profiles': ProfileStore.contentHash(), 'renMin': float(minimumRenewableElec), 'T': int(T),
+        'formulation': formulationVersion, 'construction': kind, 'options': plainValues(constructionOptions or {}),
+        'startHour': int(startHour), 'timeStep': int(timeStep)}, sort_keys = True).encode())
+    return h.hexdigest()[:24]
+
+# constructionOptions with numpy numbers or arrays (e.g. the shifts of a stochastic run) as the json types they stand for
+def plainValues(value):
+    if isinstance(value, dict):
+        return {str(k): plainValues(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plainValues(v) for v in value]
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    return value
+
+def entryPath(key):
+    return os.path.join(cacheDir, key + '.npz')
+
+# copy a cached solution to outfileName (json or npz); returns False if the key isn't cached
+# another process may prune the entry at any moment, so it is opened rather than checked for first; once open, it can
+# still be read after a prune. Errors writing outfileName are raised, not taken for a miss.
+def fetch(key, outfileName):
+    path = entryPath(key)
+    npz = outfileName.endswith('.npz')
+    try:
+        os.utime(path) # mark as recently used
+        entry = open(path, 'rb') if npz else SolutionFile.SolutionFile(path)
+    except FileNotFoundError:
+        return False
+    if npz:
+        with entry, open(outfileName, 'wb') as fp:
+            shutil.copyfileobj(entry, fp)
+    else:
+        try:
+            outFile = {name: entry[name].tolist() for name in entry.keys()}
+        finally:
+            entry.close()
+        with open(outfileName, 'w') as fp:
+            json.dump(outFile, fp)
+    print('Using cached solution', key)
+    return True
+
+# add a solution to the cache, with `info` (scenario file, renMin, ...) kept as metadata, then enforce the size limit
+def store(key, outFile, info = None):
+    os.makedirs(cacheDir, exist_ok = True)
+    tmp = os.path.join(cacheDir, key + '.tmp%d.npz' % os.getpid())
+    SolutionFile.write(tmp, outFile, metadata = dict(info or {}, key = key, stored = time.time()))
+    os.replace(tmp, entryPath(key))
+    if sum(size for name, size, lastUsed in entryStats()) > maxBytes:
+        prune()
+
+# (key, bytes, last used) of every entry, from the directory listing alone; entries removed meanwhile are skipped
+def entryStats():
+    stats = []
+    if not os.path.isdir(cacheDir):
+        return stats
+    for e in os.scandir(cacheDir):
+        if not e.name.endswith('.npz') or '.tmp' in e.name:
+            continue
+        try:
+            st = e.stat()
+        except FileNotFoundError:
+            continue
+        stats.append((e.name[:-len('.npz')], st.st_size, st.st_mtime))
+    return stats
+
+def listEntries():
+    entries = []
+    if not os.path.isdir(cacheDir):
+        return entries
+    for f in os.listdir(cacheDir):
+        if not f.endswith('.npz') or '.tmp' in f:
+            continue
+        path = os.path.join(cacheDir, f)
+        try:
+            sol = SolutionFile.SolutionFile(path)
+            entries.append(dict(sol.metadata, bytes = os.path.getsize(path), lastUsed = os.path.getmtime(path)))
+            sol.close()
+        except FileNotFoundError: # pruned by another process
+            continue
+    return sorted(entries, key = lambda e: e['lastUsed'], reverse = True)
+
+# drop least recently used entries until the cache fits in limit bytes; parallel runs may prune at the same time, so an
+# entry that is already gone counts as removed
+def prune(limit = None):
+    limit = maxBytes if limit is None else limit
+    entries = sorted(entryStats(), key = lambda e: e[2], reverse = True)
+    total = sum(size for key, size, lastUsed in entries)
+    removed = []
+    while entries and total > limit:
+        key, size, lastUsed = entries.pop()
+        try:
+            os.remove(entryPath(key))
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed.append(key)
+    return removed
+
+def clear():
+    shutil.rmtree(cacheDir, ignore_errors = True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'List or prune the scenario result cache')
+    parser.add_argument('command', choices = ['list', 'prune', 'clear'])
+    parser.add_argument('--max-bytes', type = int, default = None)
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        entries = listEntries()
+        for e in entries:
+            print('%s  %8.1f kB  %s  renMin %s  T %s  %s' % (e['key'], e['bytes']/1024, time.strftime('%Y-%m-%d %H:%M', time.localtime(e['lastUsed'])),
+                e.get('renMin'), e.get('T'), e.get('scenarioFile')))
+        print(len(entries), 'entries,', '%.1f MB' % (sum(e['bytes'] for e in entries)/1024**2))
+    elif args.command == 'prune':
+        removed = prune(args.max_bytes)
+        print('removed', len(removed), 'entries')
+    else:
+        clear()
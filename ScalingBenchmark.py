@@ -0,0 +1,160 @@
+# Horizon-scaling benchmark for SystemBilevelModel
+# Every cost baseline is built and solved at horizons of a week, a month, a quarter and the full year. For each run the
+# report records the profile load time (ProfileStore.getProfiles, as the model reads them), instance construction time,
+# solve time, export time, peak memory (RSS) and the LP size, as json (and csv) so successive reports can be compared to
+# catch regressions in time, memory or LP size. The phases are timed with Instrumentation.PhaseReport.
+#
+#   python ScalingBenchmark.py --output benchmark.json
+#   python ScalingBenchmark.py --output new.json --compare benchmark.json
+import os
+import csv
+import json
+import time
+import argparse
+import platform
+import tempfile
+import traceback
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import SweepRunner
+import Instrumentation
+
+horizons = {
+    'week': 168,
+    'month': 24*30,
+    'quarter': 24*7*13,
+    'year': 24*7*51, # the full horizon SystemModel uses
+}
+
+# the timed phases, in the order they run
+phases = ['profileLoad', 'construction', 'solve', 'export']
+
+# the LP size of a run, which should only change when the model does
+sizeMeasures = ['variables', 'constraints', 'nonzeros']
+
+# one benchmark run, executed in a fresh process so peak RSS belongs to this run alone
+def runOne(label, scenarioFile, horizon, T, minimumRenewableElec, solver, threads):
+    import ProfileStore
+    import MatrixModel
+    import SystemModel
+    import Solvers
+    from pyomo.environ import Var, Constraint
+
+    record = {'baseline': label, 'scenarioFile': scenarioFile, 'horizon': horizon, 'T': T, 'renMin': minimumRenewableElec, 'solver': solver}
+
+    # every phase's wall and CPU seconds go into the run's record
+    def keep(phase):
+        record[phase['phase'] + 'Seconds'] = phase['wallSeconds']
+        record[phase['phase'] + 'CpuSeconds'] = phase['cpuSeconds']
+    report = Instrumentation.PhaseReport(keep)
+    try:
+        # opening (and in a fresh Profile_Cache, building) the cached arrays the model reads
+        with report.phase('profileLoad'):
+            ProfileStore.getProfiles(T)
+
+        s = SystemModel.SystemBilevelModel('benchmark', scenarioFile, None, minimumRenewableElec, solver = solver, threads = threads)
+        s.T = T
+        with report.phase('construction'):
+            instance = s.makeInstance()
+        record['variables'] = sum(len(v) for v in instance.component_objects(Var, active = True))
+        record['constraints'] = sum(len(c) for c in instance.component_objects(Constraint, active = True))
+        # the matrix construction builds the same LP (python MatrixModel.py checks this) and counts nonzeros cheaply
+        record['nonzeros'] = int(MatrixModel.MatrixBilevelModel.fromFiles(scenarioFile, minimumRenewableElec, T).A.nnz)
+
+        opt = Solvers.makeSolver(solver, threads = threads)
+        with report.phase('solve'):
+            results = opt.solve(instance)
+        record['termination'] = str(results.solver.termination_condition)
+
+        with tempfile.TemporaryDirectory() as d:
+            with report.phase('export'):
+                SystemModel.saveSolution(SystemModel.solutionDict(instance), os.path.join(d, 'solution.json'))
+        record['status'] = 'ok'
+    except Exception:
+        record['status'] = 'failed'
+        record['error'] = traceback.format_exc()
+    record['peakRSSMB'] = Instrumentation.peakRSS()
+    return record
+
+def gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output = True, text = True).stdout.strip()
+    except OSError:
+        return None
+
+def runBenchmark(baselines = SweepRunner.baselines, horizonNames = list(horizons), minimumRenewableElec = 0.5, solver = 'auto', threads = 1, outputFile = 'benchmark.json'):
+    report = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': gitCommit(),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'runs': [],
+    }
+    for horizon in horizonNames:
+        for label, scenarioFile in baselines.items():
+            # a new spawned process per run, so imports, caches and memory start from scratch every time
+            with SweepRunner.limitThreads(threads) as ctx, ProcessPoolExecutor(max_workers = 1, mp_context = ctx) as pool:
+                record = pool.submit(runOne, label, scenarioFile, horizon, horizons[horizon], minimumRenewableElec, solver, threads).result()
+            report['runs'].append(record)
+            if record['status'] == 'ok':
+                print('%-9s %-8s T=%5d  profiles %.2f s  build %.2f s  solve %.2f s  export %.2f s  %.0f MB  %d x %d' % (label, horizon, record['T'],
+                    record['profileLoadSeconds'], record['constructionSeconds'], record['solveSeconds'], record['exportSeconds'], record['peakRSSMB'],
+                    record['constraints'], record['variables']))
+            else:
+                print(label, horizon, 'failed')
+            writeReport(report, outputFile)
+    return report
+
+# json report, plus a flat csv of the runs next to it
+def writeReport(report, outputFile):
+    with open(outputFile, 'w') as fp:
+        json.dump(report, fp, indent = 1)
+    columns = ['baseline', 'horizon', 'T', 'status'] + [p + 'Seconds' for p in phases] + ['peakRSSMB'] + sizeMeasures
+    with open(os.path.splitext(outputFile)[0] + '.csv', 'w', newline = '') as fp:
+        w = csv.DictWriter(fp, columns, extrasaction = 'ignore')
+        w.writeheader()
+        w.writerows(report['runs'])
+
+# runs in `new` that take more than (1 + tolerance) times as long, or as much memory, as the same run in `old`, or
+# whose LP has more variables, constraints or nonzeros
+def compareReports(oldFile, newFile, tolerance = 0.25, minSeconds = 0.5):
+    with open(oldFile) as f:
+        old = {(r['baseline'], r['horizon']): r for r in json.load(f)['runs'] if r['status'] == 'ok'}
+    with open(newFile) as f:
+        new = [r for r in json.load(f)['runs'] if r['status'] == 'ok']
+
+    regressions = []
+    for r in new:
+        before = old.get((r['baseline'], r['horizon']))
+        if before is None:
+            continue
+        for key in [p + 'Seconds' for p in phases] + ['peakRSSMB'] + sizeMeasures:
+            # reports from before a measure was added don't have it
+            if key not in r or key not in before:
+                continue
+            # very short phases are mostly noise
+            if key.endswith('Seconds') and max(r[key], before[key]) < minSeconds:
+                continue
+            # the LP size is exact, so any growth counts
+            if r[key] > (before[key] if key in sizeMeasures else (1 + tolerance) * before[key]):
+                regressions.append({'baseline': r['baseline'], 'horizon': r['horizon'], 'measure': key, 'old': before[key], 'new': r[key]})
+                print('Regression: %s %s %s %.2f -> %.2f' % (r['baseline'], r['horizon'], key, before[key], r[key]))
+    if not regressions:
+        print('No regressions against', oldFile)
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Time SystemBilevelModel at increasing horizons for every cost baseline')
+    parser.add_argument('--baselines', nargs = '+', default = list(SweepRunner.baselines), choices = list(SweepRunner.baselines))
+    parser.add_argument('--horizons', nargs = '+', default = list(horizons), choices = list(horizons))
+    parser.add_argument('--renmin', type = float, default = 0.5)
+    parser.add_argument('--solver', default = 'auto')
+    parser.add_argument('--threads', type = int, default = 1)
+    parser.add_argument('--output', default = 'benchmark.json')
+    parser.add_argument('--compare', default = None, help = 'earlier report to check the new one against')
+    args = parser.parse_args()
+
+    chosen = {label: SweepRunner.baselines[label] for label in args.baselines}
+    runBenchmark(chosen, args.horizons, args.renmin, args.solver, args.threads, args.output)
+    if args.compare:
+        compareReports(args.compare, args.output)
@@ -0,0 +1,194 @@
+# Key performance indicators of many solved scenarios, in one tidy table
+# The solution files (json or npz) are read on a process pool, padded to a common horizon and stacked into one
+# scenarios x variables x hours array, and every indicator is computed for all scenarios at once with array operations:
+# energy by source, zinc production and discharge, lost load, curtailed solar and wind, capacity factors and, when the
+# cost baseline of a scenario is known, the capital and operating costs that make up its objective.
+# The table has one row per scenario and indicator: scenario, renMin, category, item, value, unit.
+#
+#   table = kpiTable(['json_Files/Baseline20.json', ...], scenarioFiles = 'Cost_Baselines/BaselineScenario.dat')
+#   table = kpiTable(manifest = 'json_Files/manifest.json')   # files, baselines and renMin of a SweepRunner sweep
+#   energy = pivot(table, 'energy')                           # scenarios x sources
+import os
+import json
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import MatrixModel
+import SolutionFile
+from MatrixModel import sizeVars
+
+# hourly variables the indicators use, in the order of the stacked array
+kpiVars = ['png', 'ppv', 'pw', 'pbat', 'pzn', 'ploss', 'uznc', 'uzndc', 'uznsold', 'ubatc', 'ubatdc']
+
+# energy by source: (item, variable, part of the variable: all, positive or negative hours, kWh per unit)
+# meetDemand counts png twice (png[t] + png[t] + ppv[t] + ...), so gas is counted the same way here and the sources add
+# up to Load; fuel cost and the gas capacity factor use png itself, as ngMax and the objective do
+energyItems = [
+    ('Natural Gas', 'png', 'all', 2),
+    ('Battery', 'pbat', 'all', 1),
+    ('Solar', 'ppv', 'all', 1),
+    ('Wind', 'pw', 'all', 1),
+    ('Zinc Discharged', 'pzn', 'positive', 1),
+    ('Zinc Production', 'pzn', 'negative', 1),
+    ('Lost Load', 'ploss', 'all', 1),
+]
+
+# operating cost items, from the coefficients of MatrixModel.hourlyCosts
+costItems = {
+    'png': 'Natural Gas Fuel',
+    'uznc': 'Zinc Production',
+    'uznsold': 'Zinc Sales',
+    'uzndc': 'Fuel Cell Sales',
+    'ubatc': 'Battery Charging',
+    'ubatdc': 'Battery Sales',
+    'ploss': 'Lost Load',
+}
+
+# the sizes and the kpiVars series of one solution file, as plain arrays (memory-mapped npz series are copied)
+def readSolution(fileName):
+    data = SolutionFile.read(fileName)
+    sizes = np.array([float(data[name][0]) for name in sizeVars])
+    series = [np.array(data[name], dtype = float) if name in data else None for name in kpiVars]
+    if hasattr(data, 'close'):
+        data.close()
+    return sizes, series
+
+# read the files on a process pool (in this process for one worker), in the order given
+def loadSolutions(fileNames, workers = None):
+    workers = workers or max(1, min(len(fileNames), os.cpu_count() or 1))
+    if workers == 1:
+        return [readSolution(f) for f in fileNames]
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        return list(pool.map(readSolution, fileNames))
+
+# sizes (scenarios x sizeVars), hourly values (scenarios x kpiVars x hours, zero past each horizon) and horizons
+def stackSolutions(solutions):
+    T = np.array([max(len(s) for s in series if s is not None) for sizes, series in solutions])
+    X = np.zeros((len(solutions), len(kpiVars), T.max()))
+    for k, (sizes, series) in enumerate(solutions):
+        for v, s in enumerate(series):
+            if s is not None:
+                X[k, v, :len(s)] = np.nan_to_num(s)
+    return np.array([sizes for sizes, series in solutions]), X, T
+
+# a unique row label for every solution file: its name, or where two files share a name, its path relative to the
+# working directory (and a count for a file given more than once)
+def scenarioLabels(fileNames):
+    names = [os.path.splitext(os.path.basename(f))[0] for f in fileNames]
+    if len(set(names)) < len(names):
+        names = [os.path.splitext(os.path.relpath(f))[0] for f in fileNames]
+    seen = {}
+    labels = []
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        labels.append(name if seen[name] == 1 else '%s (%d)' % (name, seen[name]))
+    return labels
+
+# divide, with NaN where the denominator is zero
+def ratio(a, b):
+    return np.divide(a, b, out = np.full(np.broadcast(a, b).shape, np.nan), where = b != 0)
+
+# the table for a list of solution files; scenarioFiles (one .dat file for all, or one per solution) adds the costs and
+# the fuel cell capacity factor; renMins labels the rows
+def kpiTable(fileNames = None, scenarioFiles = None, renMins = None, manifest = None, workers = None, startHour = 0, timeStep = 1):
+    fileNames = list(fileNames or [])
+    scenarioFiles = [scenarioFiles] * len(fileNames) if isinstance(scenarioFiles, str) or scenarioFiles is None else list(scenarioFiles)
+    renMins = [np.nan] * len(fileNames) if renMins is None else list(renMins)
+    if manifest is not None:
+        with open(manifest) as fp:
+            runs = [r for r in json.load(fp)['scenarios'] if r['status'] == 'ok']
+        fileNames += [r['outfileName'] for r in runs]
+        scenarioFiles += [r['scenarioFile'] for r in runs]
+        renMins += [r['renMin'] for r in runs]
+
+    sizes, X, T = stackSolutions(loadSolutions(fileNames, workers))
+    S, Tmax = len(fileNames), X.shape[2]
+    var = {name: X[:, v] for v, name in enumerate(kpiVars)}
+    size = {name: sizes[:, k] for k, name in enumerate(sizeVars)}
+    live = np.arange(Tmax)[None, :] < T[:, None] # the time steps inside each scenario's horizon
+    profiles = MatrixModel.loadProfiles(Tmax, startHour, timeStep)
+
+    columns = {}
+    units = {}
+    def add(category, item, values, unit):
+        columns[(category, item)] = values
+        units[(category, item)] = unit
+
+    # energy over the horizon (kWh): every variable is a rate held for timeStep hours
+    for item, name, part, factor in energyItems:
+        x = var[name] if part == 'all' else np.clip(var[name], 0, None) if part == 'positive' else np.clip(var[name], None, 0)
+        add('energy', item, factor * x.sum(axis = 1) * timeStep, 'kWh')
+    add('energy', 'Load', (profiles['Eload'][None, :] * live).sum(axis = 1) * timeStep, 'kWh')
+
+    # renewable energy available but not used
+    available = {'Solar': profiles['Epv'][None, :] * size['PVSize'][:, None] * live, 'Wind': profiles['Ew'][None, :] * size['WindSize'][:, None] * live}
+    for item, name in [('Solar', 'ppv'), ('Wind', 'pw')]:
+        add('curtailment', 'Curtailed ' + item, (available[item] - var[name]).sum(axis = 1) * timeStep, 'kWh')
+        add('curtailment', 'Curtailed ' + item + ' Share', ratio((available[item] - var[name]).sum(axis = 1), available[item].sum(axis = 1)), 'fraction')
+
+    # average output over installed capacity (the mean of the per-step rates, so T steps rather than hours)
+    for item, name, sizeName in [('Natural Gas', 'png', 'NGGenSize'), ('Solar', 'ppv', 'PVSize'), ('Wind', 'pw', 'WindSize'), ('Zinc Production', 'uznc', 'ZnSize')]:
+        add('capacityFactor', item, ratio(var[name].sum(axis = 1), size[sizeName] * T), 'fraction')
+
+    for k, name in enumerate(sizeVars):
+        add('size', name, size[name], 'kW, kg/hr or kg')
+
+    # costs from each scenario's .dat parameters; the hourly parts of the coefficients (gas price, zinc overtime) are
+    # the same for every scenario, the constant parts differ
+    if any(f is not None for f in scenarioFiles):
+        params = {f: MatrixModel.readScenarioParams(f) for f in set(scenarioFiles) if f is not None}
+        zeros = {'ZnOT': 0.0, 'NGPrice': 0.0}
+        someParams = next(iter(params.values()))
+        hourly = {name: np.asarray(c) - MatrixModel.hourlyCosts(someParams, zeros)[name] for name, c in MatrixModel.hourlyCosts(someParams, profiles).items()}
+        nanRow = {name: np.nan for name in costItems}
+        constant = np.array([[MatrixModel.hourlyCosts(params[f], zeros)[name] if f else nanRow[name] for name in costItems] for f in scenarioFiles])
+        c1 = np.array([MatrixModel.firstStageCosts(params[f]) if f else np.full(len(sizeVars), np.nan) for f in scenarioFiles])
+
+        capital = sizes * c1
+        for k, name in enumerate(sizeVars):
+            add('capitalCost', name, capital[:, k], '$')
+        operating = np.zeros(S)
+        for j, name in enumerate(costItems):
+            cost = (constant[:, j] * var[name].sum(axis = 1) + var[name] @ np.broadcast_to(hourly[name], (Tmax,))) * timeStep
+            add('operatingCost', costItems[name], cost, '$')
+            operating = operating + cost
+        add('cost', 'Capital', capital.sum(axis = 1), '$')
+        add('cost', 'Operating', operating, '$')
+        add('cost', 'Total', capital.sum(axis = 1) + operating, '$')
+
+        PEMeff = np.array([params[f]['PEMeff'] if f else np.nan for f in scenarioFiles])
+        add('capacityFactor', 'Fuel Cell', ratio(PEMeff * var['uzndc'].sum(axis = 1), size['FCSize'] * T), 'fraction')
+
+    # one row per scenario and indicator
+    names = scenarioLabels(fileNames)
+    keys = list(columns)
+    return pd.DataFrame({
+        'scenario': np.repeat(names, len(keys)),
+        'renMin': np.repeat(renMins, len(keys)),
+        'category': np.tile([k[0] for k in keys], S),
+        'item': np.tile([k[1] for k in keys], S),
+        'value': np.column_stack([columns[k] for k in keys]).reshape(-1),
+        'unit': np.tile([units[k] for k in keys], S),
+    })
+
+# scenarios x items for one category, in the order the scenarios were given
+def pivot(table, category):
+    rows = table[table.category == category]
+    return rows.pivot(index = 'scenario', columns = 'item', values = 'value').reindex(index = rows.scenario.unique(), columns = rows.item.unique())
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description = 'Tabulate energy, curtailment, capacity factors and costs of solved scenarios')
+    parser.add_argument('files', nargs = '*', help = 'solution files (.json or .npz)')
+    parser.add_argument('--scenario-file', default = None, help = 'cost baseline .dat of the files, for the costs')
+    parser.add_argument('--manifest', default = None, help = 'the finished runs of a sweep manifest')
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--output', default = None, help = 'write the table to this csv file')
+    args = parser.parse_args()
+
+    table = kpiTable(args.files, args.scenario_file, manifest = args.manifest, workers = args.workers)
+    if args.output:
+        table.to_csv(args.output, index = False)
+    for category in table.category.unique():
+        print(pivot(table, category))
@@ -0,0 +1,161 @@
+# Scenario cost parameters from .dat, TOML or JSON files, without Pyomo's DataPortal
+# A scenario file is either a complete set of the scalar parameters SystemModel declares, or an overlay that names a
+# base scenario and overrides a few of them:
+#
+#   # HighWind.toml                                 HighWind.json
+#   base = "BaselineScenario.dat"                   {"base": "BaselineScenario.dat", "WindCapEx": 0.15}
+#   WindCapEx = 0.15
+#
+# The base path is relative to the overlay, and a base may itself be an overlay. Values may be numbers or arithmetic
+# like the .dat files use ("24*20"). Every file is parsed once per process and kept until it changes on disk, so sweeps
+# that load the same baseline for every run only read it once.
+#
+#   params = load('Cost_Baselines/BaselineScenario.dat')
+#   params = load('Cost_Baselines/BaselineScenario.dat', overrides = {'NGCapEx': 0.09})
+#   python ScenarioParams.py Cost_Baselines/BaselineScenario.dat --to toml   # convert a .dat file
+import os
+import ast
+import json
+import operator
+
+try:
+    import tomllib
+except ImportError: # Python < 3.11
+    tomllib = None
+
+# the scalar Params of SystemModel.makeAbstractModel that a scenario sets
+paramNames = ['NGCapEx', 'PVCapEx', 'BatCapEx', 'ZnCapEx', 'ZnStorCapEx', 'FCCapEx', 'WindCapEx',
+    'NGeff', 'Bateff', 'Zneff', 'PEMeff',
+    'NGfom', 'PVfom', 'Windfom', 'ZnProdfom', 'ZnStorfom', 'ZnLaborfom', 'Batfom', 'FCfom',
+    'elecPriceWholesale', 'elecPriceIndustrial', 'elecPricePremiumStorage', 'refinedZincPremium',
+    'lostLoadCost', 'NGvom', 'FCvom', 'Batvom']
+
+# parsed files: absolute path -> ((modification time, size), {'base': path or None, 'params': {...}})
+parsedFiles = {}
+
+# evaluate the right hand side of a .dat parameter, e.g. "0.138" or "24*20"
+def evalNumber(text):
+    def ev(node):
+        if isinstance(node, ast.Expression):
+            return ev(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -ev(node.operand)
+        if isinstance(node, ast.BinOp):
+            ops = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+            if type(node.op) in ops:
+                return ops[type(node.op)](ev(node.left), ev(node.right))
+        raise ValueError('unsupported parameter value: ' + text)
+    return float(ev(ast.parse(text.strip(), mode = 'eval')))
+
+# the scalar "param X := v ;" statements of a .dat file
+def parseDat(text):
+    text = ' '.join(line.split('#')[0] for line in text.splitlines())
+    params = {}
+    for statement in text.split(';'):
+        words = statement.split(':=')
+        if len(words) != 2 or not words[0].split() or words[0].split()[0] != 'param':
+            continue
+        params[words[0].split()[1]] = evalNumber(words[1])
+    return params
+
+# the base (if any) and the parameters of one TOML or JSON file
+def parseMapping(data, fileName):
+    data = dict(data)
+    base = data.pop('base', None)
+    params = {}
+    for name, value in data.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError('%s: %s must be a number' % (fileName, name))
+        params[name] = evalNumber(value) if isinstance(value, str) else float(value)
+    return base, params
+
+# one file, parsed or from parsedFiles
+def parseFile(fileName):
+    path = os.path.abspath(fileName)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if path in parsedFiles and parsedFiles[path][0] == stamp:
+        return parsedFiles[path][1]
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.dat':
+        with open(path) as f:
+            base, params = None, parseDat(f.read())
+    elif ext == '.json':
+        with open(path) as f:
+            base, params = parseMapping(json.load(f), fileName)
+    elif ext == '.toml':
+        if tomllib is None:
+            raise ImportError('reading TOML scenario files needs Python 3.11 or later')
+        with open(path, 'rb') as f:
+            base, params = parseMapping(tomllib.load(f), fileName)
+    else:
+        raise ValueError('unknown scenario file type: ' + fileName)
+
+    unknown = sorted(set(params) - set(paramNames))
+    if unknown:
+        raise ValueError('%s: unknown parameters %s' % (fileName, ', '.join(unknown)))
+    if base is not None:
+        base = os.path.join(os.path.dirname(path), base)
+    parsed = {'base': base, 'params': params}
+    parsedFiles[path] = (stamp, parsed)
+    return parsed
+
+# a file and its bases, the base scenario first
+def sourceFiles(fileName):
+    chain = [os.path.abspath(fileName)]
+    while parseFile(chain[0])['base'] is not None:
+        base = os.path.abspath(parseFile(chain[0])['base'])
+        if base in chain:
+            raise ValueError('%s: overlays form a cycle' % fileName)
+        chain.insert(0, base)
+    return chain
+
+# every parameter of a scenario: its bases, then the file itself, then overrides, each replacing earlier values
+def load(fileName, overrides = None):
+    params = {}
+    for f in sourceFiles(fileName):
+        params.update(parseFile(f)['params'])
+    unknown = sorted(set(overrides or {}) - set(paramNames))
+    if unknown:
+        raise ValueError('unknown parameters %s' % ', '.join(unknown))
+    params.update(overrides or {})
+    missing = [name for name in paramNames if name not in params]
+    if missing:
+        raise ValueError('%s: missing parameters %s' % (fileName, ', '.join(missing)))
+    return params
+
+# the parameters as Pyomo instance data, for model.create_instance
+def pyomoData(params):
+    return {None: {name: {None: value} for name, value in params.items()}}
+
+# write a complete scenario (or only some parameters over a base) as TOML or JSON, by the extension of fileName
+def write(params, fileName, base = None):
+    values = {name: params[name] for name in paramNames if name in params}
+    if fileName.endswith('.json'):
+        with open(fileName, 'w') as fp:
+            json.dump(dict({'base': base} if base else {}, **values), fp, indent = 1)
+    else:
+        with open(fileName, 'w') as fp:
+            if base:
+                fp.write('base = "%s"\n' % base)
+            for name, value in values.items():
+                fp.write('%s = %r\n' % (name, value))
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description = 'Print or convert the parameters of scenario files')
+    parser.add_argument('files', nargs = '+', help = '.dat, .toml or .json scenario files')
+    parser.add_argument('--to', choices = ['toml', 'json'], default = None, help = 'write each file next to it in this format')
+    args = parser.parse_args()
+
+    for fileName in args.files:
+        params = load(fileName)
+        if args.to:
+            outName = os.path.splitext(fileName)[0] + '.' + args.to
+            write(params, outName)
+            print(fileName, '->', outName)
+        else:
+            print(fileName + ':', ' '.join('%s=%g' % item for item in params.items()))
\ No newline at end of file
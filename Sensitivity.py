@@ -0,0 +1,146 @@
+# Cost-parameter sensitivity study: one constraint matrix, many cost vectors
+# The capital, O&M and price parameters of the .dat baselines only enter the objective (FirstStageCost and
+# SecondStageCost), so the LP is built and loaded into HiGHS once and every sample only changes the column costs. The
+# previous optimal basis stays primal feasible after a cost change, so each sample is re-solved from it, usually in a
+# small fraction of the iterations of a cold solve. Samples are drawn by Latin hypercube or Sobol sampling over the
+# range each parameter spans across the .dat files (widened by `spread` for parameters all the files share), and are
+# visited in nearest-neighbour order so consecutive cost vectors are close.
+#
+#   python Sensitivity.py --samples 256 --method sobol --output sensitivity.csv
+import time
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+
+import MatrixModel
+from MatrixModel import sizeVars
+
+# parameters that also appear in constraints (batPower, znPower, ZnDischargeMax, znTime) and so can't be sampled here
+constraintParams = ['Bateff', 'PEMeff', 'Zneff']
+
+# parameters that don't appear in the model at all
+unusedParams = ['NGeff', 'Batvom', 'FCvom']
+
+# [low, high] of every objective parameter over the .dat files; parameters with one value in all of them get
+# value * (1 -/+ spread)
+def datRanges(scenarioFiles = None, spread = 0.2):
+    scenarioFiles = scenarioFiles or sorted(glob.glob('Cost_Baselines/*.dat'))
+    values = pd.DataFrame([MatrixModel.readScenarioParams(f) for f in scenarioFiles])
+    ranges = {}
+    for name in values.columns:
+        if name in constraintParams or name in unusedParams:
+            continue
+        low, high = values[name].min(), values[name].max()
+        if low == high:
+            low, high = sorted([low * (1 - spread), low * (1 + spread)])
+        if low < high: # a parameter that is zero everywhere (ZnProdfom) stays at zero
+            ranges[name] = (low, high)
+    return ranges
+
+# n parameter sets, one dictionary each, from a Latin hypercube or a scrambled Sobol sequence over the ranges
+def sampleParams(ranges, n, method = 'lhs', seed = 0):
+    names = sorted(ranges)
+    if method == 'sobol':
+        unit = qmc.Sobol(len(names), seed = seed).random(n)
+    else:
+        unit = qmc.LatinHypercube(len(names), seed = seed).random(n)
+    low = np.array([ranges[k][0] for k in names])
+    high = np.array([ranges[k][1] for k in names])
+    values = low + unit * (high - low)
+    return [dict(zip(names, row)) for row in values], unit
+
+# visiting order that starts at the first sample and always moves to the closest unvisited one
+def nearestNeighbourOrder(unit):
+    n = len(unit)
+    left = np.ones(n, dtype = bool)
+    order = [0]
+    left[0] = False
+    for k in range(1, n):
+        d = np.abs(unit[left] - unit[order[-1]]).sum(axis = 1)
+        order.append(np.flatnonzero(left)[np.argmin(d)])
+        left[order[-1]] = False
+    return order
+
+class SensitivityModel:
+    def __init__(self, scenarioFile, minimumRenewableElec, T, startHour = 0, timeStep = 1, threads = 1):
+        self.m = m = MatrixModel.MatrixBilevelModel.fromFiles(scenarioFile, minimumRenewableElec, T, startHour, timeStep)
+        self.baseParams = dict(m.params)
+        self.h = MatrixModel.highsModel(m.c, m.A, m.rowLower, m.rowUpper, m.colLower, m.colUpper, {'threads': threads})
+        self.cols = np.arange(m.nCols, dtype = np.int32)
+
+    # objective coefficients for the base parameters overridden by params
+    def costVector(self, params):
+        self.m.params = dict(self.baseParams, **params)
+        return self.m.objective()
+
+    # change only the costs and solve from the current basis
+    def solveWith(self, params):
+        start = time.perf_counter()
+        c = self.costVector(params)
+        self.h.changeColsCost(len(self.cols), self.cols, c)
+        self.h.run()
+        info = self.h.getInfo()
+        x = np.array(self.h.getSolution().col_value)
+        record = dict(params, objective = info.objective_function_value, status = self.h.modelStatusToString(self.h.getModelStatus()),
+            iterations = info.simplex_iteration_count, seconds = time.perf_counter() - start)
+        for name in sizeVars:
+            record[name] = float(x[self.m.colIndex[name]])
+        return record
+
+    # solve every sample (in nearest-neighbour order when unit coordinates are given); one row per sample
+    def run(self, samples, unit = None):
+        self.h.run() # the base costs first, so the first sample starts from an optimal basis too
+        order = nearestNeighbourOrder(unit) if unit is not None else range(len(samples))
+        rows = {}
+        for k in order:
+            rows[k] = self.solveWith(samples[k])
+            rows[k]['sample'] = k
+        return pd.DataFrame([rows[k] for k in range(len(samples))])
+
+# rank correlation of every sampled parameter with the total cost and the asset sizes
+def summary(table, ranges):
+    outputs = ['objective'] + sizeVars
+    corr = table[sorted(ranges) + outputs].corr(method = 'spearman')
+    return corr.loc[sorted(ranges), outputs]
+
+# time warm re-solves of the samples against cold builds and solves of the first few
+def compareWithCold(scenarioFile, minimumRenewableElec = 0.5, T = 24*7*4, n = 32, cold = 4, method = 'lhs'):
+    ranges = datRanges()
+    samples, unit = sampleParams(ranges, n, method)
+    start = time.perf_counter()
+    model = SensitivityModel(scenarioFile, minimumRenewableElec, T)
+    table = model.run(samples, unit)
+    warmSeconds = time.perf_counter() - start
+
+    worst = 0.0
+    start = time.perf_counter()
+    for k in range(cold):
+        m = MatrixModel.MatrixBilevelModel(dict(model.baseParams, **samples[k]), MatrixModel.loadProfiles(T), minimumRenewableElec, T)
+        result = MatrixModel.solveLP(m.c, m.A, m.rowLower, m.rowUpper, m.colLower, m.colUpper)
+        worst = max(worst, abs(result['objective'] - table.objective[k]) / abs(result['objective']))
+    coldSeconds = (time.perf_counter() - start) / cold
+
+    print('%d samples: %.1f s in all (%.2f s and %d simplex iterations per solve on average), %.2f s per cold build and solve'
+        % (n, warmSeconds, table.seconds.mean(), table.iterations.mean(), coldSeconds))
+    print('largest relative objective difference from the cold solves: %.1e' % worst)
+    return table
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Solve one scenario for many sampled cost and price parameters')
+    parser.add_argument('--scenario-file', default = 'Cost_Baselines/BaselineScenario.dat', help = 'the non-sampled parameters')
+    parser.add_argument('--renmin', type = float, default = 0.5)
+    parser.add_argument('--hours', type = int, default = 24*7*51)
+    parser.add_argument('--samples', type = int, default = 64)
+    parser.add_argument('--method', default = 'lhs', choices = ['lhs', 'sobol'])
+    parser.add_argument('--spread', type = float, default = 0.2, help = 'relative range of parameters the .dat files agree on')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', default = 'sensitivity.csv')
+    args = parser.parse_args()
+
+    ranges = datRanges(spread = args.spread)
+    samples, unit = sampleParams(ranges, args.samples, args.method, args.seed)
+    table = SensitivityModel(args.scenario_file, args.renmin, args.hours).run(samples, unit)
+    table.to_csv(args.output, index = False)
+    print(summary(table, ranges).round(2))
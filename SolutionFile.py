@@ -0,0 +1,109 @@
+# Columnar solution files (.npz) as an alternative to the per-variable json lists SystemModel saves
+# Every hourly variable is its own array in an uncompressed .npz (float64 or float32). Series that are all zero (ploss,
+# often pbat) are stored as just their length, and mostly-zero series as indices and values. The sizes go into a json
+# metadata entry together with any run information. Readers only load the variables they ask for, and dense series are
+# memory-mapped straight out of the .npz instead of being read into memory.
+import json
+import struct
+import zipfile
+import numpy as np
+
+# series with fewer than this share of nonzero hours are stored as indices and values
+sparseShare = 0.25
+
+def write(fileName, outFile, dtype = np.float64, metadata = None, compress = False):
+    meta = {'sizes': {}, 'zeros': {}, 'sparse': {}, 'dense': [], 'metadata': metadata or {}}
+    arrays = {}
+    for name, values in outFile.items():
+        values = np.asarray([np.nan if v is None else v for v in values], dtype = np.float64)
+        if len(values) == 1:
+            meta['sizes'][name] = float(values[0])
+            continue
+        nz = np.flatnonzero(values)
+        if len(nz) == 0:
+            meta['zeros'][name] = len(values)
+        elif len(nz) < sparseShare * len(values):
+            meta['sparse'][name] = len(values)
+            arrays[name + '.idx'] = nz.astype(np.int32)
+            arrays[name + '.val'] = values[nz].astype(dtype)
+        else:
+            meta['dense'].append(name)
+            arrays[name] = values.astype(dtype)
+    arrays['__meta__'] = np.frombuffer(json.dumps(meta).encode(), dtype = np.uint8)
+    # compressed files are smaller but can't be memory-mapped
+    (np.savez_compressed if compress else np.savez)(fileName, **arrays)
+
+class SolutionFile:
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.npz = np.load(fileName)
+        self.zip = zipfile.ZipFile(fileName)
+        self.meta = json.loads(self.npz['__meta__'].tobytes().decode())
+        self.metadata = self.meta['metadata']
+
+    def keys(self):
+        return list(self.meta['sizes']) + list(self.meta['zeros']) + list(self.meta['sparse']) + self.meta['dense']
+
+    def __contains__(self, name):
+        return name in self.keys()
+
+    # sizes come back as one-element arrays, like the one-element lists in the json files
+    def __getitem__(self, name):
+        m = self.meta
+        if name in m['sizes']:
+            return np.array([m['sizes'][name]])
+        if name in m['zeros']:
+            return np.zeros(m['zeros'][name])
+        if name in m['sparse']:
+            values = np.zeros(m['sparse'][name])
+            values[self.npz[name + '.idx']] = self.npz[name + '.val']
+            return values
+        if name in m['dense']:
+            return self.memmap(name)
+        raise KeyError(name)
+
+    # map a dense member of the .npz without reading it; falls back to a normal read for compressed files
+    def memmap(self, name):
+        info = self.zip.getinfo(name + '.npy')
+        if info.compress_type != zipfile.ZIP_STORED:
+            return self.npz[name]
+        with open(self.fileName, 'rb') as f:
+            f.seek(info.header_offset)
+            header = f.read(30)
+            nameLength, extraLength = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + nameLength + extraLength)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            offset = f.tell()
+        return np.memmap(self.fileName, dtype = dtype, mode = 'r', offset = offset, shape = shape, order = 'F' if fortran else 'C')
+
+    # just the requested variables, e.g. load(['pw', 'ppv', 'PVSize'])
+    def load(self, names):
+        return {name: self[name] for name in names}
+
+    def close(self):
+        self.zip.close()
+        self.npz.close()
+
+# read a solution in either format; .npz files are read lazily
+def read(fileName):
+    if fileName.endswith('.npz'):
+        return SolutionFile(fileName)
+    with open(fileName) as f:
+        return json.load(f)
+
+# convert an existing json solution, e.g. convertJson('Cost_Baselines/Baseline20.json')
+def convertJson(jsonFile, dtype = np.float64):
+    with open(jsonFile) as f:
+        outFile = json.load(f)
+    npzFile = jsonFile[:-len('.json')] + '.npz'
+    write(npzFile, outFile, dtype)
+    return npzFile
+
+if __name__ == '__main__':
+    import sys
+    for f in sys.argv[1:]:
+        print(f, '->', convertJson(f))
@@ -0,0 +1,129 @@
+# Solver backends for SystemBilevelModel
+# Maps a backend name and a few generic settings (threads, LP method, tolerances, time limit) to the option names
+# each solver understands, and times the backends against each other on the same instance.
+import os
+import json
+import time
+from pyomo.environ import value
+from pyomo.opt import SolverFactory
+
+# the CPLEX install the model was first solved with, used if it exists and CPLEX_EXECUTABLE isn't set
+macCplex = '/Applications/CPLEX_Studio129/cplex/bin/x86-64_osx/cplex'
+
+# pyomo solver name and option names for each backend; 'methods' maps a generic LP method to the solver's value
+backends = {
+    'highs': {
+        'solver': 'appsi_highs',
+        'threads': 'threads', 'method': 'solver', 'feasTol': 'primal_feasibility_tolerance',
+        'optTol': 'dual_feasibility_tolerance', 'timeLimit': 'time_limit',
+        'methods': {'simplex': 'simplex', 'dual': 'simplex', 'barrier': 'ipm', 'ipm': 'ipm', 'pdlp': 'pdlp'},
+    },
+    'cbc': {
+        'solver': 'cbc',
+        'threads': 'threads', 'method': None, 'feasTol': 'primalTolerance', 'optTol': 'dualTolerance', 'timeLimit': 'sec',
+        # cbc selects the LP algorithm with a flag rather than an option value
+        'methods': {'dual': 'dualSimplex', 'primal': 'primalSimplex', 'barrier': 'barrier', 'simplex': 'dualSimplex'},
+    },
+    'glpk': {
+        'solver': 'glpk',
+        'threads': None, 'method': None, 'feasTol': 'tolbnd', 'optTol': 'toldj', 'timeLimit': 'tmlim',
+        'methods': {'simplex': 'simplex', 'dual': 'dual', 'primal': 'primal', 'barrier': 'interior', 'ipm': 'interior'},
+    },
+    'cplex': {
+        'solver': 'cplex',
+        'threads': 'threads', 'method': 'lpmethod', 'feasTol': 'simplex_tolerances_feasibility',
+        'optTol': 'simplex_tolerances_optimality', 'timeLimit': 'timelimit',
+        'methods': {'primal': 1, 'dual': 2, 'simplex': 2, 'barrier': 4, 'concurrent': 6},
+    },
+    'gurobi': {
+        'solver': 'gurobi',
+        'threads': 'Threads', 'method': 'Method', 'feasTol': 'FeasibilityTol', 'optTol': 'OptimalityTol', 'timeLimit': 'TimeLimit',
+        'methods': {'primal': 0, 'dual': 1, 'simplex': 1, 'barrier': 2, 'concurrent': 3},
+    },
+}
+
+# order tried by backend = 'auto'
+preference = ['cplex', 'gurobi', 'highs', 'cbc', 'glpk']
+
+# solver specific options for the generic settings; settings the backend has no option for are left out
+def optionsFor(backend, threads = None, method = None, feasTol = None, optTol = None, timeLimit = None):
+    b = backends[backend]
+    options = {}
+    for key, val in [('threads', threads), ('feasTol', feasTol), ('optTol', optTol), ('timeLimit', timeLimit)]:
+        if val is not None and b[key] is not None:
+            options[b[key]] = val
+    if method is not None:
+        if method not in b['methods']:
+            raise ValueError('LP method ' + method + ' is not available for ' + backend)
+        if b['method'] is None:
+            options[b['methods'][method]] = '' # passed as a flag on the command line
+        else:
+            options[b['method']] = b['methods'][method]
+    return options
+
+def makeSolverFactory(backend):
+    name = backends[backend]['solver']
+    if backend == 'cplex':
+        executable = os.environ.get('CPLEX_EXECUTABLE', macCplex if os.path.exists(macCplex) else None)
+        if executable is not None:
+            return SolverFactory(name, executable = executable)
+    return SolverFactory(name)
+
+def isAvailable(backend):
+    try:
+        return bool(makeSolverFactory(backend).available(exception_flag = False))
+    except Exception:
+        return False
+
+def availableBackends():
+    return [b for b in preference if isAvailable(b)]
+
+# a pyomo solver for the backend with its options set; backend = 'auto' picks the first available one in `preference`
+def makeSolver(backend = 'auto', **settings):
+    if backend == 'auto':
+        found = availableBackends()
+        if not found:
+            raise RuntimeError('none of the solvers ' + ', '.join(preference) + ' is available')
+        backend = found[0]
+    if backend not in backends:
+        raise ValueError('unknown solver backend ' + backend + ', choose from ' + ', '.join(backends))
+    opt = makeSolverFactory(backend)
+    for key, val in optionsFor(backend, **settings).items():
+        opt.options[key] = val
+    print('Solver:', backend)
+    return opt
+
+# solve one instance with each backend (all available ones by default) and report the time each takes
+def compareBackends(scenarioFile, minimumRenewableElec, backendNames = None, T = None, reportFile = None, **settings):
+    import SystemModel
+    s = SystemModel.SystemBilevelModel('timing', scenarioFile, None, minimumRenewableElec)
+    if T is not None:
+        s.T = T
+    start = time.time()
+    instance = s.makeInstance()
+    buildSeconds = time.time() - start
+
+    report = []
+    for backend in backendNames or availableBackends():
+        record = {'backend': backend, 'buildSeconds': buildSeconds}
+        try:
+            opt = makeSolver(backend, **settings)
+            start = time.time()
+            results = opt.solve(instance, tee = False)
+            record['solveSeconds'] = time.time() - start
+            record['status'] = str(results.solver.termination_condition)
+            record['objective'] = value(instance.Total_Cost_Objective)
+        except Exception as e:
+            record['status'] = 'error: ' + str(e)
+        report.append(record)
+
+    print('%-8s %12s %16s  %s' % ('backend', 'solve [s]', 'objective', 'status'))
+    for r in sorted(report, key = lambda r: r.get('solveSeconds', float('inf'))):
+        print('%-8s %12.2f %16.2f  %s' % (r['backend'], r.get('solveSeconds', float('nan')), r.get('objective', float('nan')), r['status']))
+    if reportFile is not None:
+        with open(reportFile, 'w') as fp:
+            json.dump(report, fp, indent = 1)
+    return report
+
+if __name__ == '__main__':
+    compareBackends('Cost_Baselines/BaselineScenario.dat', 0.2, threads = 4, reportFile = 'solverTiming.json')
@@ -0,0 +1,126 @@
+# Extensive form of the two-stage stochastic model: one set of capital asset sizes shared by N weighted scenarios
+# Each scenario has its own solar, wind, demand and gas price profiles and its own dispatch. The dispatch blocks are the
+# matrix model of MatrixModel.py, built with array operations once per scenario and stacked block-diagonally beside the
+# shared size columns, so the LP grows linearly with N. The objective is the capital cost plus the weighted operating
+# cost of the scenarios; the renewable minimum and zinc quota have to be met in every scenario.
+import numpy as np
+import scipy.sparse as sp
+
+import MatrixModel
+import ProfileStore
+from MatrixModel import sizeVars, hourlyVars, solveLP
+
+# scenario profiles for a horizon of T periods: the weather, demand and price year started `shift` hours later (the
+# zinc overtime calendar stays in place), with the daily demand and gas price optionally scaled by random factors
+def makeScenarios(T, shifts = None, loadSigma = 0.0, priceSigma = 0.0, seed = 0, startHour = 0, timeStep = 1):
+    # by default the year started at each quarter, which pairs every week's weather with another season's demand and prices
+    shifts = [0, 24*7*13, 24*7*26, 24*7*39] if shifts is None else shifts
+    rng = np.random.default_rng(seed)
+    znOT = MatrixModel.znOvertime(T, startHour, timeStep)
+    periodsPerDay = max(1, 24 // timeStep)
+    scenarios = []
+    for shift in shifts:
+        profiles = {name: np.array(v) for name, v in ProfileStore.getProfiles(T, startHour + shift, timeStep).items()}
+        days = np.arange(T) // periodsPerDay
+        for name, sigma in [('Eload', loadSigma), ('NGPrice', priceSigma)]:
+            if sigma > 0:
+                profiles[name] = profiles[name] * np.maximum(0, 1 + sigma * rng.standard_normal(days[-1] + 1))[days]
+        profiles['ZnOT'] = znOT
+        scenarios.append(profiles)
+    return scenarios
+
+class StochasticBilevelModel:
+    def __init__(self, params, scenarios, weights, minimumRenewableElec, T, timeStep = 1):
+        self.params = params
+        self.scenarios = scenarios
+        self.N = len(scenarios)
+        weights = np.ones(self.N) if weights is None else np.asarray(weights, dtype = float)
+        self.weights = weights / weights.sum()
+        self.renMin = minimumRenewableElec
+        self.T = T
+        self.timeStep = timeStep
+
+        # column layout: the sizes, then the hourly variables of scenario 0, of scenario 1, ...
+        nS = len(sizeVars)
+        self.blockCols = len(hourlyVars) * T
+        self.colIndex = {name: k for k, name in enumerate(sizeVars)}
+        self.scenarioIndex = []
+        for s in range(self.N):
+            offset = nS + s * self.blockCols
+            self.scenarioIndex.append({name: offset + np.arange(k*T, (k+1)*T) for k, name in enumerate(hourlyVars)})
+        self.nCols = nS + self.N * self.blockCols
+
+        self.build()
+
+    @classmethod
+    def fromFiles(cls, scenarioFile, minimumRenewableElec, T, startHour = 0, timeStep = 1, shifts = None, weights = None, loadSigma = 0.0, priceSigma = 0.0, seed = 0):
+        scenarios = makeScenarios(T, shifts, loadSigma, priceSigma, seed, startHour, timeStep)
+        return cls(MatrixModel.readScenarioParams(scenarioFile), scenarios, weights, minimumRenewableElec, T, timeStep)
+
+    def build(self):
+        nS = len(sizeVars)
+        sizeParts, dispatchParts = [], []
+        rowLower, rowUpper, colLower, colUpper = [], [], [], []
+        c = [MatrixModel.firstStageCosts(self.params)]
+        for profiles, w in zip(self.scenarios, self.weights):
+            m = MatrixModel.MatrixBilevelModel(self.params, profiles, self.renMin, self.T, self.timeStep)
+            sizeParts.append(m.A[:, :nS])
+            dispatchParts.append(m.A[:, nS:])
+            rowLower.append(m.rowLower)
+            rowUpper.append(m.rowUpper)
+            colLower.append(m.colLower[nS:])
+            colUpper.append(m.colUpper[nS:])
+            c.append(w * m.c[nS:])
+            self.rowsPerScenario = m.nRows
+        sizeLower, sizeUpper = m.colLower[:nS], m.colUpper[:nS]
+
+        self.A = sp.hstack([sp.vstack(sizeParts), sp.block_diag(dispatchParts)]).tocsr()
+        self.rowLower, self.rowUpper = np.concatenate(rowLower), np.concatenate(rowUpper)
+        self.colLower = np.concatenate([sizeLower] + colLower)
+        self.colUpper = np.concatenate([sizeUpper] + colUpper)
+        self.c = np.concatenate(c)
+        self.nRows = self.A.shape[0]
+
+    def solve(self, options = None):
+        self.result = solveLP(self.c, self.A, self.rowLower, self.rowUpper, self.colLower, self.colUpper, options)
+        self.x, self.objectiveValue, self.status = self.result['x'], self.result['objective'], self.result['status']
+        print('Status:', self.status, 'Objective:', self.objectiveValue)
+        return self.toSolutionDict(self.x)
+
+    # weighted operating cost of each scenario at the solution
+    def scenarioCosts(self, x):
+        nS = len(sizeVars)
+        costs = []
+        for s, w in enumerate(self.weights):
+            block = slice(nS + s*self.blockCols, nS + (s+1)*self.blockCols)
+            costs.append(self.c[block] @ x[block] / w)
+        return np.array(costs)
+
+    # the sizes and the dispatch of every scenario, in the same form SystemModel saves: scenario 0 under the usual
+    # variable names (so the plotting scripts read it unchanged) and scenario s as e.g. 'png_s1'
+    def toSolutionDict(self, x):
+        outFile = {}
+        for name in sizeVars:
+            outFile[name] = [float(x[self.colIndex[name]])]
+        for s, col in enumerate(self.scenarioIndex):
+            suffix = '' if s == 0 else '_s%d' % s
+            for name in hourlyVars:
+                outFile[name + suffix] = x[col[name]].tolist()
+        return outFile
+
+# solve every scenario on its own and the extensive form, and print the sizes each chooses
+def compareWithDeterministic(scenarioFile, minimumRenewableElec, T = 24*7*4, **scenarioOptions):
+    params = MatrixModel.readScenarioParams(scenarioFile)
+    model = StochasticBilevelModel.fromFiles(scenarioFile, minimumRenewableElec, T, **scenarioOptions)
+    columns = {}
+    for s, profiles in enumerate(model.scenarios):
+        columns['scenario %d' % s] = MatrixModel.MatrixBilevelModel(params, profiles, minimumRenewableElec, T, model.timeStep).solve()
+    columns['stochastic'] = model.solve()
+    print('%-14s' % 'asset' + ''.join('%14s' % name for name in columns))
+    for name in sizeVars:
+        print('%-14s' % name + ''.join('%14.1f' % out[name][0] for out in columns.values()))
+    print('LP size: %d rows x %d columns for %d scenarios' % (model.nRows, model.nCols, model.N))
+    return columns
+
+if __name__ == '__main__':
+    compareWithDeterministic('Cost_Baselines/BaselineScenario.dat', 0.5)
@@ -0,0 +1,93 @@
+# Run a sweep of SystemBilevelModel scenarios (cost baselines x renewable minimums) across a process pool
+# Each worker gets a fixed solver thread budget, and a manifest json records the output, timing and status of every run.
+import os
+import json
+import time
+import itertools
+import traceback
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# the cost baselines in Cost_Baselines, keyed by the label used in the output file names
+baselines = {
+    'Baseline': 'Cost_Baselines/BaselineScenario.dat',
+    'Low': 'Cost_Baselines/LowBaselineScenario.dat',
+    'High': 'Cost_Baselines/HighBaselineScenario.dat',
+    'LGHW': 'Cost_Baselines/LowGasHighWindBaselineScenario.dat',
+}
+
+renMins = [0.2, 0.5, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+# cross product of baselines and renewable minimums, one job per scenario, e.g. json_Files/Low95.json
+# (fileFormat = 'npz' saves the columnar format of SolutionFile.py)
+def makeSpec(baselines = baselines, renMins = renMins, outputDir = 'json_Files', fileFormat = 'json'):
+    jobs = []
+    for (label, scenarioFile), r in itertools.product(baselines.items(), renMins):
+        name = label + str(int(round(r*100)))
+        jobs.append({'name': name, 'scenarioFile': scenarioFile, 'renMin': r, 'outfileName': os.path.join(outputDir, name + '.' + fileFormat)})
+    return jobs
+
+threadVars = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']
+
+# keep numerical libraries in pool workers from starting more threads than their budget. The libraries read these
+# variables once, when they load, and a forked worker inherits the parent's already loaded ones, so the variables are
+# set before the pool starts and the workers are spawned as fresh interpreters from the returned context:
+#   with limitThreads(threads) as ctx, ProcessPoolExecutor(max_workers = workers, mp_context = ctx) as pool:
+@contextlib.contextmanager
+def limitThreads(threads):
+    saved = {var: os.environ.get(var) for var in threadVars}
+    os.environ.update({var: str(threads) for var in threadVars})
+    try:
+        yield multiprocessing.get_context('spawn')
+    finally:
+        for var, val in saved.items():
+            if val is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = val
+
+def runScenario(job, threads, construction, solver, useCache, profile = False):
+    import SystemModel
+    record = dict(job, pid = os.getpid(), threads = threads, solver = solver)
+    start, cpuStart = time.time(), time.process_time()
+    # with profile, the phase timings of the run go to <output file>.phases.json (see Instrumentation.py)
+    instrument = None
+    if profile:
+        instrument = record['phasesFile'] = os.path.splitext(job['outfileName'])[0] + '.phases.json'
+    try:
+        s = SystemModel.SystemBilevelModel(job['name'], job['scenarioFile'], job['outfileName'], job['renMin'], construction = construction, threads = threads, solver = solver, useCache = useCache, instrument = instrument)
+        s.makeSolveAbstractModel()
+        record['status'] = 'ok'
+    except Exception:
+        record['status'] = 'failed'
+        record['error'] = traceback.format_exc()
+    record['wallSeconds'] = time.time() - start
+    record['cpuSeconds'] = time.process_time() - cpuStart
+    return record
+
+def writeManifest(manifestFile, records, sweepStart, workers, threads):
+    manifest = {'workers': workers, 'threadsPerWorker': threads, 'wallSeconds': time.time() - sweepStart,
+        'scenarios': sorted(records, key = lambda r: r['name'])}
+    with open(manifestFile, 'w') as fp:
+        json.dump(manifest, fp, indent = 1)
+
+# run the jobs on a process pool; by default the cores are split evenly into workers of `threads` solver threads each
+def runSweep(jobs, workers = None, threads = 1, manifestFile = 'json_Files/manifest.json', construction = 'pyomo', solver = 'auto', useCache = True, profile = False):
+    if workers is None:
+        workers = max(1, min(len(jobs), (os.cpu_count() or 1) // threads))
+    for d in set(os.path.dirname(p) for p in [manifestFile] + [j['outfileName'] for j in jobs]):
+        if d:
+            os.makedirs(d, exist_ok = True)
+
+    sweepStart = time.time()
+    records = []
+    with limitThreads(threads) as ctx, ProcessPoolExecutor(max_workers = workers, mp_context = ctx) as pool:
+        futures = [pool.submit(runScenario, job, threads, construction, solver, useCache, profile) for job in jobs]
+        for f in as_completed(futures):
+            record = f.result()
+            records.append(record)
+            print(record['name'], record['status'], '%.1f s' % record['wallSeconds'])
+            # rewrite the manifest as runs finish so an interrupted sweep still records what completed
+            writeManifest(manifestFile, records, sweepStart, workers, threads)
+    return records
@@ -6,53 +6,111 @@ import pandas as pd
 from pyomo.environ import *
 from pyomo.core import *
 from pyomo.opt import SolverFactory
+from pyomo.core.expr.numeric_expr import LinearExpression
 import json
 import random
 
+import Benders
+import Instrumentation
+import MatrixModel
+import ProfileStore
+import ProgressiveHedging
+import RepresentativePeriods
+import ResultCache
+import ScenarioParams
+import SolutionFile
+import Solvers
+import StochasticModel
+
 class SystemBilevelModel:
-    def __init__(self, name, scenarioFile, outfileName, minimumRenewableElec):
+    def __init__(self, name, scenarioFile, outfileName, minimumRenewableElec, construction = 'pyomo', threads = None, solver = 'auto', solverOptions = None, constructionOptions = None, useCache = True, instrument = None, startHour = 0, hours = 24*7*51, timeStep = 1):
         self.user = name
         global inputfile, savefile, renMin
         inputfile = scenarioFile
         savefile = outfileName
         renMin = minimumRenewableElec
 
-    def makeSolveAbstractModel(self):
+        # 'pyomo' builds the AbstractModel rule by rule, 'matrix' assembles the same LP as sparse arrays (see MatrixModel.py),
+        # 'clustered' solves representative days or weeks instead of every hour (see RepresentativePeriods.py),
+        # 'benders' decomposes sizing and weekly dispatch (see Benders.py),
+        # 'stochastic' shares one set of sizes between several weighted weather/demand/price scenarios (see StochasticModel.py),
+        # 'hedging' solves the same stochastic model by progressive hedging, one scenario LP at a time (see ProgressiveHedging.py)
+        self.construction = construction
+
+        # settings for 'clustered', 'benders' or 'stochastic', e.g. {'k': 12, 'periodLength': 24, 'method': 'kmedoids'},
+        # {'weekLength': 168, 'maxIterations': 200} or {'shifts': [0, 2184, 4368, 6552], 'weights': [1, 1, 1, 1], 'loadSigma': 0.05}
+        self.constructionOptions = constructionOptions or {}
+
+        # reuse solutions from Result_Cache when nothing that affects the result has changed (see ResultCache.py)
+        self.useCache = useCache
+
+        # number of threads the solver may use, None leaves it to the solver (set by sweeps running several models at once)
+        self.threads = threads
+
+        # solver backend (see Solvers.py) and generic settings for it, e.g. {'method': 'barrier', 'feasTol': 1e-7}
+        self.solver = solver
+        self.solverOptions = solverOptions or {}
+
+        # optional timing of every phase of makeSolveAbstractModel: a json file name and/or a callback (see Instrumentation.py)
+        self.report = Instrumentation.PhaseReport(instrument, {'scenarioFile': scenarioFile, 'renMin': minimumRenewableElec, 'construction': construction, 'solver': solver})
+
+        # Specify the length of time simulated (up to 1 year), in hours from startHour (0 is the start of the year)
+        # timeStep = 2, 3 or 4 models periods of that many hours, with the hourly profiles averaged over each period;
+        # T is the number of periods. Zinc overtime is averaged too, so a period that is partly overtime costs more than the
+        # regular hours in it; the regular window is hours 23-7 of each weekday, which 3 hour steps only match with startHour = 23
+        if timeStep not in [1, 2, 3, 4]:
+            raise ValueError('timeStep must be 1, 2, 3 or 4 hours')
+        if hours % timeStep:
+            raise ValueError('hours (%d) must be a multiple of timeStep (%d)' % (hours, timeStep))
+        if (timeStep != 1 or startHour != 0) and construction in ['clustered', 'benders']:
+            raise ValueError('the ' + construction + ' construction only works in 1 hour steps from the start of the year')
+        self.startHour = startHour
+        self.timeStep = timeStep
+        self.T = hours // timeStep
+
+    # mutable = True makes renMin, the cost Params, Eload and NGPrice changeable on an instance (see PersistentModel.py)
+    # fastObjective = False builds SecondStageCost hour by hour (see benchmarkSecondStageCost)
+    # With timeStep > 1 the dispatch variables are still rates per hour (kW, kg/hr), held for the whole period: storage
+    # changes, ramps, costs, the renewable share and the zinc quota count each period timeStep times, while limits on
+    # rates (C/4 battery charging, zinc production and fuel cell capacity) are unchanged
+    def makeAbstractModel(self, mutable = False, fastObjective = True):
         model = AbstractModel()
 
         # create empty parameters for capital expenses, fixed and variable O&M, efficiencies, prices
-        model.NGCapEx = Param()
-        model.PVCapEx = Param()
-        model.BatCapEx = Param()
-        model.ZnCapEx = Param()
-        model.ZnStorCapEx = Param()
-        model.FCCapEx = Param()
-        model.WindCapEx = Param()
+        model.NGCapEx = Param(mutable = mutable)
+        model.PVCapEx = Param(mutable = mutable)
+        model.BatCapEx = Param(mutable = mutable)
+        model.ZnCapEx = Param(mutable = mutable)
+        model.ZnStorCapEx = Param(mutable = mutable)
+        model.FCCapEx = Param(mutable = mutable)
+        model.WindCapEx = Param(mutable = mutable)
         
-        model.NGeff = Param()
-        model.Bateff = Param()
-        model.Zneff = Param()
-        model.PEMeff = Param()
+        model.NGeff = Param(mutable = mutable)
+        model.Bateff = Param(mutable = mutable)
+        model.Zneff = Param(mutable = mutable)
+        model.PEMeff = Param(mutable = mutable)
         
-        model.NGfom = Param()
-        model.PVfom = Param()
-        model.Windfom = Param()
-        model.ZnProdfom = Param()
-        model.ZnStorfom = Param()
-        model.ZnLaborfom = Param()
-        model.Batfom = Param()
-        model.FCfom = Param()
+        model.NGfom = Param(mutable = mutable)
+        model.PVfom = Param(mutable = mutable)
+        model.Windfom = Param(mutable = mutable)
+        model.ZnProdfom = Param(mutable = mutable)
+        model.ZnStorfom = Param(mutable = mutable)
+        model.ZnLaborfom = Param(mutable = mutable)
+        model.Batfom = Param(mutable = mutable)
+        model.FCfom = Param(mutable = mutable)
         
-        model.elecPriceWholesale = Param()
-        model.elecPriceIndustrial = Param()
-        model.elecPricePremiumStorage = Param()
-        model.refinedZincPremium = Param()
+        model.elecPriceWholesale = Param(mutable = mutable)
+        model.elecPriceIndustrial = Param(mutable = mutable)
+        model.elecPricePremiumStorage = Param(mutable = mutable)
+        model.refinedZincPremium = Param(mutable = mutable)
+
+        model.lostLoadCost = Param(mutable = mutable)
 
-        model.lostLoadCost = Param()
+        model.NGvom = Param(mutable = mutable)
+        model.FCvom = Param(mutable = mutable)
+        model.Batvom = Param(mutable = mutable)
 
-        model.NGvom = Param()
-        model.FCvom = Param()
-        model.Batvom = Param()
+        model.renMin = Param(initialize = renMin, mutable = mutable)
 
         # create variables for the component sizes, add some preliminary upper and lower bounds (additional constraints added specifically later)
         model.NGGenSize = Var(bounds = (0,None), initialize = 1000) # Var(bounds = (0.0, None))
@@ -63,9 +121,11 @@ class SystemBilevelModel:
         model.ZnStorageSize = Var(bounds = (0,None), initialize = 1000) # maximum capacity in kg of zinc 
         model.FCSize = Var(bounds = (0,None), initialize = 20)
 
-        # Specify the length of time simulated (up to 1 year)
-        T = 24*7*51
+        T = self.T
+        dt = self.timeStep
+        hours = T * dt
         model.I = RangeSet(1, T)
+        model.timeStep = Param(initialize = dt)
 
         # Create the state variables (battery and zinc), add some initial upper and lower bounds (specific constraints defined later)
         model.xbat =    Var(model.I, bounds = (0,None), initialize = 1)
@@ -87,35 +147,36 @@ class SystemBilevelModel:
         model.pzn =     Var(model.I, initialize = 0) # power from zinc
         model.ploss =   Var(model.I, bounds = (0,None), initialize = 0) # lost load option, this will be very expensive
 
-        # read csv files
-        solarData = pd.read_csv('CSV_Files/Solar1p5MW.csv')
-        windData = pd.read_csv('CSV_Files/Wind1p5MW.csv')
-        loadData = pd.read_csv('CSV_Files/HourlyTxScenDemand2018-Notional.csv')
-        ngPrice = pd.read_csv('CSV_Files/HourlyNatGasPrices2018.csv')
+        # hourly profiles from the cached store (parsed from the csv files once), averaged over each period
+        profiles = ProfileStore.getProfiles(T, self.startHour, dt)
 
         def initEpv(model, i):
-            return float(solarData['System power generated | (kW)'].iloc[i-1]/1500) # scaled to be per kW of installed solar capacity
+            return float(profiles['Epv'][i-1]) # scaled to be per kW of installed solar capacity
 
         def initEw(model, i):
-            return float(windData['System power generated | (kW)'].iloc[i-1]/1500) # scaled to be per kW of installed wind capacity
+            return float(profiles['Ew'][i-1]) # scaled to be per kW of installed wind capacity
 
         def initLoad(model, i):
-            return float(loadData.demand.iloc[i-1]*1000) # converts from MW to kW
+            return float(profiles['Eload'][i-1]) # in kW (converted from MW in the store)
 
         def calcTotalLoad(T):
-            return sum(loadData.demand[0:T-1]*1000) # converts from MW to kW
+            return dt * float(profiles['Eload'][0:T-1].sum()) # in kWh
         L = calcTotalLoad(T)
         print('Total Load:', L)
 
-        print('Zn Electricity', (101000000 * 4.8 * T/8760))
+        print('Zn Electricity', (101000000 * 4.8 * hours/8760))
 
-        totalElecRen = (L + (101000000 * 4.8 * T/8760)) * renMin
+        totalElecRen = (L + (101000000 * 4.8 * hours/8760)) * renMin
 
         def initNGPrice(model, i):
-            return float(ngPrice.iloc[i-1,1]/297.395) # converts $/cu ft to $/kWh
+            return float(profiles['NGPrice'][i-1]) # in $/kWh (converted from $/cu ft in the store)
 
         #create a matrix that specifies additional overtime labor costs for zinc production or zinc oxidation for electricity 
-        def initZnOT(model, i): 
+        # (averaged over the hours of each period)
+        def initZnOT(model, i):
+            return sum(hourlyZnOT(self.startHour + (i-1)*dt + j + 1) for j in range(dt)) / dt
+
+        def hourlyZnOT(i):
             n = i%168
             if n<144:
                 m = i%24
@@ -130,9 +191,9 @@ class SystemBilevelModel:
         # initialize energy constraints for every hour on pv, wind, load, overtime, and natural gas prices
         model.Epv = Param(model.I, initialize = initEpv)
         model.Ew = Param(model.I, initialize = initEw)
-        model.Eload = Param(model.I, initialize = initLoad)
+        model.Eload = Param(model.I, initialize = initLoad, mutable = mutable)
         model.ZnOT = Param(model.I, initialize = initZnOT)
-        model.NGPrice = Param(model.I, initialize = initNGPrice)
+        model.NGPrice = Param(model.I, initialize = initNGPrice, mutable = mutable)
 
         # define specific constraints
 
@@ -146,7 +207,10 @@ class SystemBilevelModel:
 
         # require a minimum amount of power to come from renewables
         def renewableMinimum(model):
-            return(summation(model.ppv) + summation(model.pw)) >= totalElecRen
+            if mutable:
+                # written with the Params so that changes to renMin or Eload carry through to the constraint
+                return dt * (summation(model.ppv) + summation(model.pw)) >= (dt * sum(model.Eload[t] for t in model.I if t < T) + (101000000 * 4.8 * hours/8760)) * model.renMin
+            return dt * (summation(model.ppv) + summation(model.pw)) >= totalElecRen
         model.renewableMinimum = Constraint(rule = renewableMinimum)
 
         def ngMax(model, t):
@@ -161,11 +225,11 @@ class SystemBilevelModel:
                 return Constraint.Skip
         model.ngTime = Constraint(model.I, rule = ngTime)
 
-        # gas generator ramp rate limits
+        # gas generator ramp rate limits (per hour, so a period of dt hours can ramp dt times as far)
         def ngRampLimit(model, t):
-            return model.ung[t] <= model.NGGenSize
+            return model.ung[t] <= dt * model.NGGenSize
         def ngThrottleLimit(model, t):
-            return model.ung[t] >= -1 * model.NGGenSize
+            return model.ung[t] >= -dt * model.NGGenSize
         model.ngRampLimit = Constraint(model.I, rule = ngRampLimit)
         model.ngThrottleLimit = Constraint(model.I, rule = ngThrottleLimit)
 
@@ -207,12 +271,12 @@ class SystemBilevelModel:
 
         # set minimum production quota for zinc refinery
         def znProdQuota(model):
-            return summation(model.uznsold) - model.uznsold[T] >= (101000000*T/8760)
+            return dt * (summation(model.uznsold) - model.uznsold[T]) >= (101000000*hours/8760)
         model.znProdQuota = Constraint(rule = znProdQuota)
 
         # set maximum production capacity for zinc refinery
         def znProdMax(model):
-            return summation(model.uznsold) <= (200000000*T/8760)
+            return dt * summation(model.uznsold) <= (200000000*hours/8760)
         model.znProdMax = Constraint(rule = znProdMax)
 
         # zinc stored starts at zero
@@ -267,7 +331,7 @@ class SystemBilevelModel:
         # change to zinc stored based on production, "discharge", sale
         def znTime(model, t):
             if t < T:
-                return model.xzn[t+1] == model.xzn[t] - model.uzndc[t] + (model.Zneff * model.uznc[t]) -model.uznsold[t]
+                return model.xzn[t+1] == model.xzn[t] + dt * (- model.uzndc[t] + (model.Zneff * model.uznc[t]) -model.uznsold[t])
             else:
                 return Constraint.Skip
         model.znTime = Constraint(model.I, rule = znTime)
@@ -289,42 +353,112 @@ class SystemBilevelModel:
             return expr
         model.FirstStageCost = Expression(rule = ComputeFirstStageCost_rule)
 
-        # variable operating cost computation
+        # variable operating cost computation, as one linear expression when the prices are fixed numbers
+        # (the loop rule is kept for mutable models, where changed Params have to carry through to the objective)
         def ComputeSecondStageCost_rule(model):
-            expr = summation(model.uznc) * model.elecPriceIndustrial # electrical cost for producing refined zinc
-            expr -= summation(model.uznsold) * model.refinedZincPremium # profits from selling SHG zinc as a commodity
-            expr -= summation(model.uzndc) * model.PEMeff * (model.elecPriceWholesale + model.elecPricePremiumStorage) # profits from zinc oxidation/fuel cell operation
-            expr += summation(model.ubatc) * (1/model.Bateff) * model.elecPriceWholesale # electrical cost for charging batteries
-            #expr += summation(model.ubatdc) * model.Batvom # variable O&M for batteries
-            expr -= summation(model.ubatdc) * model.Bateff * (model.elecPriceWholesale + model.elecPricePremiumStorage) # profits from selling battery power
-            expr += summation(model.ploss) * model.lostLoadCost # starting price of lost load is high
-            for t in model.I:
-                expr += model.png[t] * (model.NGPrice[t] + model.NGvom) # natural gas fuel costs
-                expr += model.uznc[t] * model.ZnOT[t] # overtime for SHG zinc production
-                expr += model.uzndc[t] * model.ZnOT[t] # overtime for zinc oxidation/fuel cell operation
-                expr += model.uznsold[t] * model.ZnOT[t] # restrict commodity SHG zinc sales to regular business hours
-            return expr     
-
+            if mutable or not fastObjective:
+                return loopSecondStageCost(model)
+            return linearSecondStageCost(model)
         model.SecondStageCost = Expression(rule = ComputeSecondStageCost_rule)
 
         def total_cost_rule(model):
             return (model.FirstStageCost + model.SecondStageCost)
         model.Total_Cost_Objective = Objective(rule = total_cost_rule, sense = minimize)
+        return model
+
+    def makeInstance(self, mutable = False, fastObjective = True):
+        with self.report.phase('abstractModel'):
+            model = self.makeAbstractModel(mutable, fastObjective)
+        with self.report.phase('dataLoad'):
+            # the .dat values are evaluated by ScenarioParams and passed as instance data: Pyomo's DataPortal keeps an
+            # expression like ZnLaborfom := 24*20 as the string '24*20', and can't read TOML, JSON or overlay scenarios
+            data = ScenarioParams.pyomoData(ScenarioParams.load(inputfile))
+        return self.report.createInstance(model, data) # create an initial instance of the model
+
+    def makeSolveAbstractModel(self):
+        # skip the solve if this scenario (same .dat contents, csv inputs, renMin, horizon and formulation) was solved before
+        key = None
+        self.report.records = []
+        self.report.info['T'] = self.T
+        if self.useCache:
+            with self.report.phase('cacheLookup') as record:
+                key = ResultCache.scenarioKey(inputfile, renMin, self.T, self.construction, self.constructionOptions, self.startHour, self.timeStep)
+                record['hit'] = ResultCache.fetch(key, savefile)
+            if record['hit']:
+                self.report.finish()
+                return
+
+        outFile = self.solveModel()
+        with self.report.phase('export'):
+            saveSolution(outFile)
+        # a decomposition stopped at its iteration limit is saved, but never reused as the answer to this scenario
+        if key is not None and self.converged:
+            with self.report.phase('cacheStore'):
+                ResultCache.store(key, outFile, {'scenarioFile': inputfile, 'renMin': renMin, 'T': self.T, 'construction': self.construction,
+                    'startHour': self.startHour, 'timeStep': self.timeStep})
+        self.report.finish()
+
+    def solveModel(self):
+        self.converged = True
+        if self.construction == 'hedging':
+            # the solver settings go to solve, the scenario settings (as for 'stochastic') to fromFiles
+            solveKeys = ['workers', 'rhoFactor', 'maxIterations', 'tolerance', 'segments']
+            options = {k: v for k, v in self.constructionOptions.items() if k not in solveKeys}
+            with self.report.phase('build'):
+                m = ProgressiveHedging.ProgressiveHedgingModel.fromFiles(inputfile, renMin, self.T, self.startHour, self.timeStep, **options)
+            with self.report.phase('solverTotal') as record:
+                outFile = m.solve(threads = self.threads or 1, **{k: v for k, v in self.constructionOptions.items() if k in solveKeys})
+                record.update(converged = m.converged, convergence = m.convergence)
+            self.converged = m.converged
+            print('solved')
+            return outFile
+
+        if self.construction == 'benders':
+            solveKeys = ['workers', 'maxIterations', 'tolerance']
+            with self.report.phase('build'):
+                m = Benders.BendersBilevelModel.fromFiles(inputfile, renMin, self.T,
+                    **{k: v for k, v in self.constructionOptions.items() if k not in solveKeys})
+            with self.report.phase('solverTotal') as record:
+                outFile = m.solve(threads = self.threads or 1, **{k: v for k, v in self.constructionOptions.items() if k in solveKeys})
+                record.update(converged = m.converged, gap = m.gap)
+            self.converged = m.converged
+            print('solved')
+            return outFile
+
+        if self.construction in ['matrix', 'clustered', 'stochastic']:
+            with self.report.phase('build') as record:
+                if self.construction == 'matrix':
+                    m = MatrixModel.MatrixBilevelModel.fromFiles(inputfile, renMin, self.T, self.startHour, self.timeStep)
+                elif self.construction == 'stochastic':
+                    m = StochasticModel.StochasticBilevelModel.fromFiles(inputfile, renMin, self.T, self.startHour, self.timeStep, **self.constructionOptions)
+                else:
+                    m = RepresentativePeriods.ReducedBilevelModel.fromFiles(inputfile, renMin, self.T, **self.constructionOptions)
+                record.update(variables = m.nCols, constraints = m.nRows, nonzeros = int(m.A.nnz))
+            # the matrix model is always passed to HiGHS; constructionOptions = {'reduce': True} solves it after LPReduction
+            with self.report.phase('solverTotal') as record:
+                options = Solvers.optionsFor('highs', threads = self.threads, **self.solverOptions)
+                if self.construction == 'matrix' and self.constructionOptions.get('reduce'):
+                    outFile = m.solve(options, reduce = True)
+                    record['reduction'] = m.reduced.report()
+                else:
+                    outFile = m.solve(options)
+            print('solved')
+            return outFile
 
         # run the model
-        instance = model.create_instance(inputfile) # create an initial instance of the model
+        instance = self.makeInstance()
+        if self.report.enabled:
+            self.report.info['counts'] = Instrumentation.componentCounts(instance)
         #print(instance.ZnCapEx.value, instance.ZnStorCapEx.value, instance.BatCapEx.value, instance.WindCapEx.value, instance.PVCapEx.value, instance.NGCapEx.value)
 
         # this version of cplex didn't work on Rebecca's computer, I don't think the community version will handle this many variables
         #opt = SolverFactory("cplex", executable = "/Applications/CPLEX_Studio_Community129/cplex/bin/x86-64_osx/cplex")
-        
-        # copied from previous version
-        opt = SolverFactory("cplex", executable = "/Applications/CPLEX_Studio129/cplex/bin/x86-64_osx/cplex")
-        # solve locally
-        solver_manager = SolverManagerFactory('serial')
 
-        # tee = True displays solver conditions from cplex
-        results = solver_manager.solve(instance, opt = opt, tee = True)
+        # 'auto' uses CPLEX where it is installed (CPLEX_EXECUTABLE or the previous macOS path), otherwise gurobi, highs, cbc or glpk
+        opt = Solvers.makeSolver(self.solver, threads = self.threads, **self.solverOptions)
+
+        # tee = True displays solver conditions
+        results = self.report.solve(opt, instance, tee = True)
         print('solved')
 
         # display results
@@ -332,14 +466,108 @@ class SystemBilevelModel:
 
         results.write(num = 1)
 
-        # save a json file with dictionary data to make plots in a separate file
-        outFile = {}
-        for v in instance.component_objects(Var, active = True):
-            a = []
-            for index in v:
-                a.append(v[index].value)
-            b = {str(v): a}
-            outFile.update(b)
-
-        with open(savefile, 'w') as fp:
-            json.dump(outFile, fp)
+        return solutionDict(instance)
+
+# variable operating cost, adding the hourly gas and overtime terms one hour at a time
+def loopSecondStageCost(model):
+    expr = summation(model.uznc) * model.elecPriceIndustrial # electrical cost for producing refined zinc
+    expr -= summation(model.uznsold) * model.refinedZincPremium # profits from selling SHG zinc as a commodity
+    expr -= summation(model.uzndc) * model.PEMeff * (model.elecPriceWholesale + model.elecPricePremiumStorage) # profits from zinc oxidation/fuel cell operation
+    expr += summation(model.ubatc) * (1/model.Bateff) * model.elecPriceWholesale # electrical cost for charging batteries
+    #expr += summation(model.ubatdc) * model.Batvom # variable O&M for batteries
+    expr -= summation(model.ubatdc) * model.Bateff * (model.elecPriceWholesale + model.elecPricePremiumStorage) # profits from selling battery power
+    expr += summation(model.ploss) * model.lostLoadCost # starting price of lost load is high
+    for t in model.I:
+        expr += model.png[t] * (model.NGPrice[t] + model.NGvom) # natural gas fuel costs
+        expr += model.uznc[t] * model.ZnOT[t] # overtime for SHG zinc production
+        expr += model.uzndc[t] * model.ZnOT[t] # overtime for zinc oxidation/fuel cell operation
+        expr += model.uznsold[t] * model.ZnOT[t] # restrict commodity SHG zinc sales to regular business hours
+    return expr * model.timeStep # hourly rates held for timeStep hours
+
+# the same cost built from coefficient vectors: one coefficient per hourly variable, passed to a single LinearExpression
+def linearSecondStageCost(model):
+    T = len(model.I)
+    ngPrice = np.fromiter((value(model.NGPrice[t]) for t in model.I), float, T)
+    znOT = np.fromiter((value(model.ZnOT[t]) for t in model.I), float, T)
+    sellPrice = value(model.elecPriceWholesale + model.elecPricePremiumStorage)
+    coefs = {
+        'png': ngPrice + value(model.NGvom), # natural gas fuel costs
+        'uznc': value(model.elecPriceIndustrial) + znOT, # electricity and overtime for SHG zinc production
+        'uznsold': znOT - value(model.refinedZincPremium), # zinc sales, only during regular business hours
+        'uzndc': znOT - value(model.PEMeff) * sellPrice, # fuel cell sales less overtime
+        'ubatc': np.full(T, value(model.elecPriceWholesale / model.Bateff)), # charging batteries
+        'ubatdc': np.full(T, -value(model.Bateff) * sellPrice), # selling battery power
+        'ploss': np.full(T, value(model.lostLoadCost)), # lost load
+    }
+    linearVars = []
+    for name in coefs:
+        linearVars.extend(getattr(model, name).values())
+    linearCoefs = value(model.timeStep) * np.concatenate(list(coefs.values())) # hourly rates held for timeStep hours
+    return LinearExpression(constant = 0, linear_coefs = linearCoefs.tolist(), linear_vars = linearVars)
+
+# time both SecondStageCost rules for a few horizons and check they give the same coefficients: each build, and
+# create_instance end to end with each rule, is the minimum over `repeats` runs with the garbage collector off
+def benchmarkSecondStageCost(scenarioFile, horizons = [168, 24*7*4, 24*7*13, 24*7*51], tol = 1e-9, repeats = 5):
+    import gc
+    import time
+    from pyomo.repn import generate_standard_repn
+
+    # the fastest of `repeats` calls of f, and its last result
+    def best(f):
+        times = []
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for k in range(repeats):
+                t0 = time.perf_counter()
+                result = f()
+                times.append(time.perf_counter() - t0)
+        finally:
+            if enabled:
+                gc.enable()
+        return min(times), result
+
+    print('%8s %12s %12s %8s %14s %14s %8s' % ('hours', 'loop [s]', 'linear [s]', 'speedup', 'loop inst [s]', 'linear inst [s]', 'speedup'))
+    report = []
+    for T in horizons:
+        s = SystemBilevelModel('benchmark', scenarioFile, None, 0.2, hours = T)
+        loopInstance, _ = best(lambda: s.makeInstance(fastObjective = False))
+        linearInstance, instance = best(lambda: s.makeInstance(fastObjective = True))
+
+        loop, loopExpr = best(lambda: loopSecondStageCost(instance))
+        linear, linearExpr = best(lambda: linearSecondStageCost(instance))
+
+        loopRepn = generate_standard_repn(loopExpr, compute_values = True)
+        linearRepn = generate_standard_repn(linearExpr, compute_values = True)
+        loopCoefs = {id(v): c for v, c in zip(loopRepn.linear_vars, loopRepn.linear_coefs)}
+        linearCoefs = {id(v): c for v, c in zip(linearRepn.linear_vars, linearRepn.linear_coefs)}
+        same = loopCoefs.keys() == linearCoefs.keys() and all(abs(loopCoefs[k] - linearCoefs[k]) <= tol * max(1, abs(loopCoefs[k])) for k in loopCoefs)
+
+        print('%8d %12.3f %12.3f %7.1fx %14.3f %14.3f %7.2fx %s' % (T, loop, linear, loop/linear, loopInstance, linearInstance,
+            loopInstance/linearInstance, '' if same else 'MISMATCH'))
+        report.append({'T': T, 'loop': loop, 'linear': linear, 'loopInstance': loopInstance, 'linearInstance': linearInstance, 'same': same})
+    return report
+
+# collect the value of every variable, as {variable name: list of values}
+def solutionDict(instance):
+    outFile = {}
+    for v in instance.component_objects(Var, active = True):
+        a = []
+        for index in v:
+            a.append(v[index].value)
+        b = {str(v): a}
+        outFile.update(b)
+    return outFile
+
+# save a json file with dictionary data to make plots in a separate file
+# (a .npz file name saves the columnar format of SolutionFile.py instead)
+def saveSolution(outFile, fileName = None):
+    fileName = fileName or savefile
+    if fileName.endswith('.npz'):
+        SolutionFile.write(fileName, outFile)
+        return
+    with open(fileName, 'w') as fp:
+        json.dump(outFile, fp)
+
+if __name__ == '__main__':
+    benchmarkSecondStageCost('Cost_Baselines/BaselineScenario.dat')
@@ -0,0 +1,257 @@
+# A long-lived local worker that keeps Pyomo, the profiles, parsed scenario files and built models in memory
+# Every run of RunScenarios.py pays for importing Pyomo, loading the csv profiles and building the model before the
+# solver starts. The worker pays that once: it listens on a Unix socket, and each job (the SystemBilevelModel inputs:
+# scenario file, renMin, construction, horizon, plus optional parameter overrides) is solved on a model kept from the
+# previous job with the same construction and horizon:
+# - matrix: the LP stays loaded in HiGHS; renMin only moves the bound of the renewableMinimum row and the cost
+#   parameters only change the objective, so the solve starts from the previous optimal basis (a change of Bateff,
+#   PEMeff or Zneff, which appear in constraints, rebuilds the LP)
+# - pyomo: a PersistentBilevelModel, whose mutable Params are set for each job
+# - other constructions are built for every job, still without the import and profile loading
+# Messages are json, one per line. The worker answers each job with an 'accepted' event, a 'built' event when it had
+# to build a model, and a 'result' (objective, status, sizes, timings and the solution file if one was asked for) or an
+# 'error'. Jobs run one at a time, in the order they arrive.
+#
+#   python WorkerService.py serve &                                    # or: serve --preload Cost_Baselines/BaselineScenario.dat
+#   python WorkerService.py solve Cost_Baselines/BaselineScenario.dat --renmin 0.9 --set WindCapEx=0.15
+#   python WorkerService.py solve Cost_Baselines/HighBaselineScenario.dat --renmin 0.5 --output json_Files/High50.json
+#   python WorkerService.py status
+#   python WorkerService.py shutdown
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import traceback
+import socketserver
+import numpy as np
+
+defaultSocket = os.environ.get('WORKER_SOCKET', os.path.join(tempfile.gettempdir(), 'powerx-worker.sock'))
+
+# scenario parameters that appear in constraints, so changing them needs a new matrix LP
+constraintParams = ['Bateff', 'PEMeff', 'Zneff']
+
+# a matrix LP kept in HiGHS, built at renMin = 1 so the renewableMinimum bound at any renMin is renMin times its own
+class WarmMatrixModel:
+    def __init__(self, params, T, startHour, timeStep, threads):
+        import MatrixModel
+        self.m = m = MatrixModel.MatrixBilevelModel(params, MatrixModel.loadProfiles(T, startHour, timeStep), 1.0, T, timeStep)
+        self.row = next(start for name, start, n in m.rowBlocks if name == 'renewableMinimum')
+        self.energy = m.rowLower[self.row]
+        self.cols = np.arange(m.nCols, dtype = np.int32)
+        self.h = MatrixModel.highsModel(m.c, m.A, m.rowLower, m.rowUpper, m.colLower, m.colUpper, {'threads': threads})
+
+    def accepts(self, params):
+        return all(params[name] == self.m.params[name] for name in constraintParams)
+
+    def solve(self, params, renMin):
+        self.m.params = params
+        self.h.changeColsCost(len(self.cols), self.cols, self.m.objective())
+        self.h.changeRowBounds(self.row, renMin * self.energy, np.inf)
+        self.h.run()
+        info = self.h.getInfo()
+        x = np.array(self.h.getSolution().col_value)
+        return self.m.toSolutionDict(x), info.objective_function_value, self.h.modelStatusToString(self.h.getModelStatus())
+
+# a Pyomo instance with mutable Params in a persistent solver
+class WarmPyomoModel:
+    def __init__(self, scenarioFile, params, renMin, T, startHour, timeStep):
+        import PersistentModel
+        self.p = PersistentModel.PersistentBilevelModel(scenarioFile, renMin, T = T, startHour = startHour, timeStep = timeStep)
+
+    def accepts(self, params):
+        return True
+
+    def solve(self, params, renMin):
+        from pyomo.environ import value
+        self.p.setParams(params)
+        self.p.setRenewableMinimum(renMin)
+        outFile = self.p.solve()
+        return outFile, value(self.p.instance.Total_Cost_Objective), str(self.p.results.solver.termination_condition)
+
+class Worker:
+    def __init__(self, threads = 1):
+        # imported here so the client doesn't pay for them
+        import SystemModel
+        import ScenarioParams
+        self.SystemModel, self.ScenarioParams = SystemModel, ScenarioParams
+        self.threads = threads
+        self.models = {} # (construction, T, startHour, timeStep) -> warm model
+        self.jobs = 0
+        self.started = time.time()
+
+    # solve one job, calling emit with each event; returns the result event
+    def run(self, job, emit):
+        from MatrixModel import sizeVars
+        self.jobs += 1
+        start = time.perf_counter()
+        construction = job.get('construction', 'matrix')
+        startHour, timeStep = int(job.get('startHour', 0)), int(job.get('timeStep', 1))
+        hours = int(job.get('hours', 24*7*51))
+        if hours % timeStep:
+            raise ValueError('hours (%d) must be a multiple of timeStep (%d)' % (hours, timeStep))
+        T = hours // timeStep
+        renMin = float(job['renMin'])
+        params = self.ScenarioParams.load(job['scenarioFile'], job.get('params'))
+        emit({'event': 'accepted', 'job': job.get('id', self.jobs)})
+
+        key = (construction, T, startHour, timeStep)
+        built = False
+        if construction in ['matrix', 'pyomo']:
+            model = self.models.get(key)
+            if model is None or not model.accepts(params):
+                if construction == 'matrix':
+                    model = WarmMatrixModel(params, T, startHour, timeStep, self.threads)
+                else:
+                    model = WarmPyomoModel(job['scenarioFile'], params, renMin, T, startHour, timeStep)
+                self.models[key] = model
+                built = True
+                emit({'event': 'built', 'construction': construction, 'T': T, 'seconds': time.perf_counter() - start})
+            solveStart = time.perf_counter()
+            outFile, objective, status = model.solve(params, renMin)
+        else:
+            if job.get('params'):
+                raise ValueError('parameter overrides need the matrix or pyomo construction')
+            solveStart = time.perf_counter()
+            s = self.SystemModel.SystemBilevelModel(job.get('name', 'worker'), job['scenarioFile'], None, renMin, construction = construction,
+                threads = self.threads, constructionOptions = job.get('constructionOptions'), startHour = startHour, hours = T * timeStep, timeStep = timeStep)
+            outFile = s.solveModel()
+            objective, status = None, 'solved' if s.converged else 'not converged'
+            built = True
+
+        if job.get('outfileName'):
+            self.SystemModel.saveSolution(outFile, job['outfileName'])
+        result = {'event': 'result', 'job': job.get('id', self.jobs), 'objective': objective, 'status': status,
+            'sizes': {name: outFile[name][0] for name in sizeVars}, 'built': built, 'outfileName': job.get('outfileName'),
+            'solveSeconds': time.perf_counter() - solveStart, 'seconds': time.perf_counter() - start}
+        if job.get('hourly'):
+            result['solution'] = outFile
+        return result
+
+    def status(self):
+        return {'event': 'status', 'pid': os.getpid(), 'jobs': self.jobs, 'uptime': time.time() - self.started,
+            'models': [dict(zip(['construction', 'T', 'startHour', 'timeStep'], key)) for key in self.models]}
+
+# one connection: any number of json lines, each answered before the next is read
+class JobHandler(socketserver.StreamRequestHandler):
+    def emit(self, message):
+        self.wfile.write((json.dumps(message) + '\n').encode())
+        self.wfile.flush()
+
+    def handle(self):
+        worker = self.server.worker
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+                command = job.get('command', 'solve')
+                if command == 'solve':
+                    self.emit(worker.run(job, self.emit))
+                elif command == 'status':
+                    self.emit(worker.status())
+                elif command == 'shutdown':
+                    self.emit({'event': 'shutdown'})
+                    self.server.stopping = True
+                    return
+                else:
+                    raise ValueError('unknown command ' + command)
+            except Exception as e:
+                traceback.print_exc()
+                self.emit({'event': 'error', 'message': '%s: %s' % (type(e).__name__, e)})
+
+class WorkerServer(socketserver.UnixStreamServer):
+    def __init__(self, socketPath, worker):
+        if os.path.exists(socketPath):
+            if ping(socketPath):
+                raise RuntimeError('a worker is already listening on ' + socketPath)
+            os.remove(socketPath) # left behind by a worker that didn't shut down
+        super().__init__(socketPath, JobHandler)
+        self.worker = worker
+        self.stopping = False
+
+    def serve(self):
+        try:
+            while not self.stopping:
+                self.handle_request()
+        finally:
+            self.server_close()
+            os.remove(self.server_address)
+
+# start a worker; preload builds the matrix models of these scenario files (and the default horizon) up front
+def serve(socketPath = defaultSocket, threads = 1, preload = None, hours = 24*7*51):
+    worker = Worker(threads)
+    for scenarioFile in preload or []:
+        worker.run({'scenarioFile': scenarioFile, 'renMin': 0.5, 'hours': hours}, lambda message: None)
+    server = WorkerServer(socketPath, worker)
+    print('worker %d listening on %s' % (os.getpid(), socketPath))
+    server.serve()
+
+# send messages to the worker and yield every event it sends back, until each message has its final answer
+def submit(messages, socketPath = defaultSocket):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socketPath)
+        f = s.makefile('rw')
+        for message in messages:
+            f.write(json.dumps(message) + '\n')
+            f.flush()
+            for line in f:
+                event = json.loads(line)
+                yield event
+                if event['event'] in ['result', 'error', 'status', 'shutdown']:
+                    break
+
+def ping(socketPath = defaultSocket):
+    try:
+        return next(submit([{'command': 'status'}], socketPath))['event'] == 'status'
+    except (OSError, StopIteration):
+        return False
+
+# a solve job for the worker, with file names made absolute (the worker may run in another directory)
+def makeJob(scenarioFile, renMin, construction = 'matrix', hours = 24*7*51, startHour = 0, timeStep = 1, params = None, outfileName = None, **extra):
+    job = dict(extra, scenarioFile = os.path.abspath(scenarioFile), renMin = renMin, construction = construction,
+        hours = hours, startHour = startHour, timeStep = timeStep, params = params or {})
+    if outfileName:
+        job['outfileName'] = os.path.abspath(outfileName)
+    return job
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Keep a solver worker warm, or send it jobs')
+    parser.add_argument('--socket', default = defaultSocket, help = 'Unix socket path (default: $WORKER_SOCKET or %(default)s)')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    p = commands.add_parser('serve', help = 'run the worker')
+    p.add_argument('--threads', type = int, default = 1)
+    p.add_argument('--preload', nargs = '*', default = [], help = 'scenario files to build matrix models for at start')
+    p.add_argument('--hours', type = int, default = 24*7*51, help = 'horizon of the preloaded models')
+    p = commands.add_parser('solve', help = 'solve scenarios on the worker')
+    p.add_argument('scenarioFile')
+    p.add_argument('--renmin', type = float, nargs = '+', default = [0.5], help = 'one job per value')
+    p.add_argument('--construction', default = 'matrix')
+    p.add_argument('--hours', type = int, default = 24*7*51)
+    p.add_argument('--start-hour', type = int, default = 0)
+    p.add_argument('--time-step', type = int, default = 1)
+    p.add_argument('--set', nargs = '*', default = [], metavar = 'NAME=VALUE', help = 'override scenario parameters')
+    p.add_argument('--output', default = None, help = 'solution file (json or npz), with {} replaced by the renMin percent')
+    commands.add_parser('status', help = 'show the jobs served and the models kept')
+    commands.add_parser('shutdown', help = 'stop the worker')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.socket, args.threads, args.preload, args.hours)
+        sys.exit(0)
+    if args.command == 'solve':
+        params = {}
+        for item in args.set:
+            name, val = item.split('=')
+            params[name] = float(val)
+        messages = [makeJob(args.scenarioFile, r, args.construction, args.hours, args.start_hour, args.time_step, params,
+            args.output.format(int(round(r*100))) if args.output else None) for r in args.renmin]
+    else:
+        messages = [{'command': args.command}]
+    failed = False
+    for event in submit(messages, args.socket):
+        print(json.dumps(event))
+        failed = failed or event['event'] == 'error'
+    sys.exit(1 if failed else 0)
\ No newline at end of file
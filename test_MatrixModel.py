@@ -0,0 +1,19 @@
+# The matrix construction must build the same LP as SystemModel's Pyomo model: same size, same objective and row
+# residuals at a random point, and the same optimum and capital asset sizes
+#
+#   python -m pytest -q test_MatrixModel.py
+import os
+import pytest
+
+import MatrixModel
+
+@pytest.fixture(autouse = True)
+def repoDir(monkeypatch):
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__))) # the scenario and csv paths are relative to the repo
+
+@pytest.mark.parametrize('renMin', [0.2, 0.9])
+def test_matchesPyomoWeek(renMin):
+    assert MatrixModel.compareWithPyomo('Cost_Baselines/BaselineScenario.dat', renMin, T = 168)
+
+def test_matchesPyomoTimeStep():
+    assert MatrixModel.compareWithPyomo('Cost_Baselines/BaselineScenario.dat', 0.5, T = 56, startHour = 24, timeStep = 3)